@@ -0,0 +1,139 @@
+"""
+Shared helpers for the benchmark scripts in this directory.
+
+The Lambda handler files have hyphenated names, so they cannot be imported with a plain import statement; load_handler
+loads them from a lambda directory (the working tree by default) the same way the Lambda runtime does.
+"""
+
+import contextlib
+import importlib.util
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDA_DIR = os.path.join(REPO_ROOT, 'lambda')
+
+# A deployment has to name the approvals store it shares with the SMS gateway; these runs are all in one process.
+os.environ.setdefault('APPROVAL_STORE', 'memory')
+# Verifying a friend's number refuses to run without a secret; any will do for local runs.
+os.environ.setdefault('OTP_SECRET', 'local-only')
+
+HANDLERS = {
+    'motherbot': 'lex-motherbot-python',
+    'booktrip': 'lex-booktrip-python',
+    'gateway': 'twilio-gateway-python',
+}
+
+
+def load_handler(name, lambda_dir=LAMBDA_DIR):
+    """
+    Import one of the handler files (by key in HANDLERS or by file stem) and return the module.
+    """
+    stem = HANDLERS.get(name, name)
+    if lambda_dir not in sys.path:
+        sys.path.insert(0, lambda_dir)
+
+    spec = importlib.util.spec_from_file_location(stem.replace('-', '_'), os.path.join(lambda_dir, stem + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def export_revision(revision, target):
+    """
+    Extract the lambda directory as it was at a git revision into target and return its path.
+    """
+    archive = subprocess.check_output(['git', 'archive', revision, 'lambda'], cwd=REPO_ROOT)
+    subprocess.run(['tar', '-x', '-C', target], input=archive, check=True)
+    return os.path.join(target, 'lambda')
+
+
+def compare_trees(script, baseline=None, args=()):
+    """
+    Run script with --child LAMBDA_DIR for the working tree, and first for the baseline revision if one is given.
+
+    Each run happens in its own interpreter so that one tree's motherbot package cannot leak into the other's.  The
+    child prints a JSON object on its last line of output; return a list of (tree label, decoded object).
+    """
+    trees = [('working tree', LAMBDA_DIR)]
+    scratch = None
+    if baseline:
+        scratch = tempfile.mkdtemp(prefix='bench-')
+        trees.insert(0, (baseline, export_revision(baseline, scratch)))
+
+    results = []
+    try:
+        for label, lambda_dir in trees:
+            output = subprocess.check_output([sys.executable, os.path.abspath(script), '--child', lambda_dir] + list(args))
+            results.append((label, json.loads(output.decode('utf-8').strip().splitlines()[-1])))
+    finally:
+        if scratch:
+            shutil.rmtree(scratch)
+    return results
+
+
+@contextlib.contextmanager
+def discard_stdout():
+    """
+    Drop what the handlers write to stdout (EMF metric lines) while they are being timed.
+    """
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def lex_event(intent_name, slots, source='DialogCodeHook', session_attributes=None, confirmation_status='None',
+              user_id='bench-user', bot_name='BenchBot', request_attributes=None):
+    """
+    Build a minimal Lex V1 code hook event.
+    """
+    return {
+        'messageVersion': '1.0',
+        'invocationSource': source,
+        'userId': user_id,
+        'sessionAttributes': session_attributes,
+        'requestAttributes': request_attributes,
+        'bot': {'name': bot_name, 'alias': '$LATEST', 'version': '$LATEST'},
+        'outputDialogMode': 'Text',
+        'currentIntent': {
+            'name': intent_name,
+            'slots': dict(slots),
+            'confirmationStatus': confirmation_status
+        },
+        'inputTranscript': ''
+    }
+
+
+def measure(func, number=1000, repeat=5):
+    """
+    Time func() and return the per-call cost in microseconds as (best, median) over repeat batches of number calls.
+    """
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) * 1e6 / number)
+    return min(samples), statistics.median(samples)
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return float('nan')
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(value)) for value in column) for column in zip(headers, *rows)]
+    line = '  '.join('{:<%d}' % width for width in widths)
+    print(line.format(*headers))
+    print(line.format(*['-' * width for width in widths]))
+    for row in rows:
+        print(line.format(*row))
@@ -0,0 +1,170 @@
+"""
+Elicitation turns saved by carrying slot values over between MotherBot requests (motherbot.carryover).
+
+Plays --users scripted conversations through the handler, standing in for Lex: an ElicitSlot response is answered
+with the value the user meant, a ConfirmIntent offering a carried value is answered yes if it is what the user meant
+and no otherwise, a Delegate goes on to fulfillment, and a gap longer than the bot's idleSessionTTLInSeconds starts a
+new session.  Each conversation follows one of the scripts below, some of which carry a friend, place or event over
+to a later request, some of which carry the wrong one, and some of which wait too long.  The report counts code hook
+invocations, elicitation turns, confirmation turns and requests that ended up with a different value than the user
+meant, with carry-over turned off and on, e.g.
+
+    python benchmarks/bench_carryover.py --users 2000
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+
+import _support
+
+BOT = os.path.join(_support.REPO_ROOT, 'config', 'bot.json')
+FRIEND = 'Sam'
+FRIEND_PHONE = '+12015550100'
+
+# (seconds since the previous request, intent, slots said up front, (slot, value) the user means).
+SCRIPTS = {
+    'call then visit': [
+        (0, 'CanICall', {'Calling': FRIEND}, ('Calling', FRIEND)),
+        (60, 'CanIGOTO', {}, ('FriendHouse', FRIEND)),
+    ],
+    'visit then call': [
+        (0, 'CanIGOTO', {'FriendHouse': FRIEND}, ('FriendHouse', FRIEND)),
+        (90, 'CanICall', {}, ('Calling', FRIEND)),
+    ],
+    'show then place then show': [
+        (0, 'CanISee', {'Concerts': 'Music Hall'}, ('Concerts', 'Music Hall')),
+        (30, 'CanIGOTO', {'PublicPlaces': 'Mall'}, ('PublicPlaces', 'Mall')),
+        (120, 'CanISee', {}, ('Concerts', 'Music Hall')),
+    ],
+    'place then show': [
+        (0, 'CanIGOTO', {'PublicPlaces': 'Mall'}, ('PublicPlaces', 'Mall')),
+        (45, 'CanISee', {}, ('Movies', 'Movie List')),
+    ],
+    'call then somewhere else': [
+        (0, 'CanICall', {'Calling': FRIEND}, ('Calling', FRIEND)),
+        (60, 'CanIGOTO', {}, ('PublicPlaces', 'Library')),
+    ],
+    'call, later visit': [
+        (0, 'CanICall', {'Calling': FRIEND}, ('Calling', FRIEND)),
+        (600, 'CanIGOTO', {}, ('FriendHouse', FRIEND)),
+    ],
+}
+
+
+INTENT_SLOTS = {
+    'CanICall': ('Calling',),
+    'CanIGOTO': ('FriendHouse', 'PublicPlaces'),
+    'CanISee': ('Events', 'Movies', 'Concerts'),
+}
+
+
+def idle_session_ttl():
+    with open(BOT) as f:
+        return json.load(f)['idleSessionTTLInSeconds']
+
+
+class Conversations(object):
+    """
+    Plays scripts through the handler module, counting what Lex would have done.
+    """
+
+    def __init__(self, module, session_ttl):
+        self._module = module
+        self._session_ttl = session_ttl
+        self.invocations = 0
+        self.elicitations = 0
+        self.confirmations = 0
+        self.requests = 0
+        self.mismatched = 0
+
+    def _invoke(self, intent, slots, source, session_attributes, user_id, confirmation_status='None'):
+        self.invocations += 1
+        event = _support.lex_event(intent, slots, source=source, session_attributes=session_attributes,
+                                   confirmation_status=confirmation_status, user_id=user_id)
+        return self._module.lambda_handler(event, None)
+
+    def request(self, user_id, intent, said, meant, session_attributes):
+        """
+        Play one request to its end and return the session attributes Lex would keep.
+        """
+        self.requests += 1
+        slots = {name: said.get(name) for name in INTENT_SLOTS[intent]}
+        confirmation_status = 'None'
+        while True:
+            response = self._invoke(intent, slots, 'DialogCodeHook', session_attributes, user_id, confirmation_status)
+            session_attributes = response.get('sessionAttributes')
+            action = response['dialogAction']
+            if action['type'] == 'ConfirmIntent':
+                self.confirmations += 1
+                slots = dict(action['slots'])
+                confirmation_status = 'Confirmed' if slots.get(meant[0]) == meant[1] else 'Denied'
+                continue
+            if action['type'] == 'ElicitSlot':
+                self.elicitations += 1
+                # They answer with what they meant, which Lex puts in the slot whose type it matches.
+                slots = dict(action['slots'])
+                slots[meant[0]] = meant[1]
+                continue
+            break
+
+        if action['type'] == 'Delegate':
+            if action['slots'].get(meant[0]) != meant[1]:
+                self.mismatched += 1
+            if intent != 'CanICall':
+                response = self._invoke(intent, action['slots'], 'FulfillmentCodeHook', session_attributes, user_id)
+                session_attributes = response.get('sessionAttributes')
+        return session_attributes
+
+    def play(self, user_id, script, clock):
+        session_attributes = None
+        for gap, intent, said, meant in script:
+            clock[0] += gap
+            if gap >= self._session_ttl:
+                session_attributes = None
+            session_attributes = self.request(user_id, intent, said, meant, session_attributes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000, help='conversations, one user each')
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    # Hold CanICall to the directory the scripts' friend is added to.
+    os.environ.setdefault('CONTACTS_STORE', 'memory')
+    session_ttl = idle_session_ttl()
+    rng = random.Random(args.seed)
+    plan = [rng.choice(sorted(SCRIPTS)) for _ in range(args.users)]
+
+    rows = []
+    with _support.discard_stdout():
+        module = _support.load_handler('motherbot')
+        for label, ttl in (('asked every time', 0), ('carried over', session_ttl)):
+            clock = [0.0]
+            module.carryover._shared = module.carryover.CarryOver(ttl=ttl, clock=lambda: clock[0])
+            conversations = Conversations(module, session_ttl)
+            for index, name in enumerate(plan):
+                user_id = 'bench-{}-{}'.format(label.replace(' ', '-'), index)
+                household = module.tenants.shared().household(user_id).household_id
+                module.contacts.shared().add(household, FRIEND, FRIEND_PHONE, approved=True, contact_id='bench-friend')
+                conversations.play(user_id, SCRIPTS[name], clock)
+            rows.append((label, conversations.requests, conversations.invocations, conversations.elicitations,
+                         conversations.confirmations,
+                         '{:.2f}'.format(conversations.elicitations / float(conversations.requests)),
+                         conversations.mismatched))
+        module.approvals.shared().drain()
+
+    _support.print_table(
+        ['slots', 'requests', 'invocations', 'elicitations', 'confirmations', 'elicited per request', 'wrong value'], rows
+    )
+    print('\ncarry-over TTL {:.0f}s, idleSessionTTLInSeconds {}s; {}'.format(
+        module.carryover.TTL_SECONDS, session_ttl,
+        'aligned' if module.carryover.TTL_SECONDS == session_ttl else 'NOT aligned'))
+
+
+if __name__ == '__main__':
+    main()
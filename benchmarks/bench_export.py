@@ -0,0 +1,114 @@
+"""
+Exporting many bot versions: tools/lexexport.py against the request pattern of config/exportlexbot.js.
+
+Serves --versions versions of MotherBot (copies of config/bot.json sharing its intents and slot types, as successive
+bot versions mostly do) from the model building API stub, with --latency seconds per request and requests beyond
+--rate-limit a second throttled.  The "exportlexbot.js" row replays what the JavaScript exporter does: every
+request of a version at once with no limit, get_slot_type once per slot referring to a type, and no retries, so an
+export with a throttled request fails.  The "lexexport" row is the Python exporter with its defaults, e.g.
+
+    python benchmarks/bench_export.py --versions 24 --latency 0.05 --rate-limit 50
+"""
+
+import argparse
+import copy
+import json
+import os
+import sys
+import threading
+import time
+
+import _support
+
+sys.path.insert(0, _support.LAMBDA_DIR)
+sys.path.insert(0, os.path.join(_support.REPO_ROOT, 'tools'))
+
+import lexexport  # noqa: E402
+from motherbot.fakes.lexmodels import FakeLexModelsClient  # noqa: E402
+
+BOT = os.path.join(_support.REPO_ROOT, 'config', 'bot.json')
+
+
+def bot_versions(count):
+    with open(BOT) as f:
+        definition = json.load(f)
+    for version in range(1, count + 1):
+        copied = copy.deepcopy(definition)
+        copied['version'] = str(version)
+        yield copied
+
+
+def export_like_javascript(client, name, versions):
+    """
+    Number of versions whose export failed, fetching the way exportlexbot.js does.
+    """
+    failed = []
+
+    def run_all(calls):
+        results = [None] * len(calls)
+
+        def run(index, call):
+            try:
+                results[index] = call()
+            except Exception as e:
+                results[index] = e
+
+        threads = [threading.Thread(target=run, args=(index, call)) for index, call in enumerate(calls)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if any(isinstance(result, Exception) for result in results):
+            raise RuntimeError('request failed')
+        return results
+
+    def export(version):
+        try:
+            bot = client.get_bot(name=name, versionOrAlias=version)
+            intents = run_all([
+                (lambda intent=intent: client.get_intent(name=intent['intentName'], version=intent['intentVersion']))
+                for intent in bot['intents']
+            ])
+            run_all([
+                (lambda slot=slot: client.get_slot_type(name=slot['slotType'], version=slot['slotTypeVersion']))
+                for intent in intents for slot in intent['slots'] if slot.get('slotTypeVersion')
+            ])
+        except Exception:
+            failed.append(version)
+
+    threads = [threading.Thread(target=export, args=(version,)) for version in versions]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return len(failed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--versions', type=int, default=24)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds per request')
+    parser.add_argument('--rate-limit', type=int, default=50, help='requests per second before throttling (0 for none)')
+    args = parser.parse_args()
+
+    definitions = list(bot_versions(args.versions))
+    versions = [definition['version'] for definition in definitions]
+    rows = []
+
+    client = FakeLexModelsClient(definitions, latency=args.latency, rate_limit=args.rate_limit)
+    start = time.perf_counter()
+    failed = export_like_javascript(client, 'MotherBot', versions)
+    rows.append(('exportlexbot.js', '{:.2f}'.format(time.perf_counter() - start), sum(client.calls.values()), failed))
+
+    client = FakeLexModelsClient(definitions, latency=args.latency, rate_limit=args.rate_limit)
+    exporter = lexexport.Exporter(client)
+    start = time.perf_counter()
+    exported = exporter.export('MotherBot', versions)
+    rows.append(('lexexport', '{:.2f}'.format(time.perf_counter() - start), exporter.requests,
+                 len(versions) - len(exported)))
+
+    _support.print_table(['exporter', 'seconds', 'requests', 'failed versions'], rows)
+
+
+if __name__ == '__main__':
+    main()
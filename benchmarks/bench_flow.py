@@ -0,0 +1,112 @@
+"""
+BookCar dialog turns through the handler, over every state the auto-populate flow can be in, checked for identical
+responses.
+
+Each case is one DialogCodeHook turn: with and without an auto-populate offer outstanding, for each confirmation
+status, with the user's last reservation a hotel, a car or nothing, and every combination of filled slots.  The report
+gives the mean cost per turn and a digest of the responses.  The flow state is written to a different session attribute
+since motherbot.flow, so it is mapped back to confirmationContext before digesting, e.g.
+
+    python benchmarks/bench_flow.py --baseline HEAD~1
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import logging
+import sys
+
+import _support
+
+SLOTS = {
+    'PickUpCity': 'chicago',
+    'PickUpDate': '2030-06-03',
+    'ReturnDate': '2030-06-05',
+    'DriverAge': '30',
+    'CarType': 'midsize',
+}
+HOTEL = '1:{"t":"Hotel","l":"chicago","d":"2030-06-03","n":2,"r":"king"}'
+CAR = '1:{"t":"Car","c":"boston","p":"2030-06-03","e":"2030-06-04","k":"economy"}'
+
+
+def cases():
+    names = sorted(SLOTS)
+    for context, confirmation, last, filled in itertools.product(
+            (None, 'AutoPopulate'), ('None', 'Confirmed', 'Denied'), (None, HOTEL, CAR),
+            itertools.product((False, True), repeat=len(names))):
+        session_attributes = {}
+        if context:
+            session_attributes['confirmationContext'] = context
+        if last:
+            session_attributes['lastConfirmedReservation'] = last
+        slots = {name: SLOTS[name] if fill else None for name, fill in zip(names, filled)}
+        yield session_attributes, confirmation, slots
+
+
+def comparable(response):
+    """
+    The response with the flow state written the way the handler wrote it before motherbot.flow.
+    """
+    session_attributes = response.get('sessionAttributes') or {}
+    if session_attributes.get('carFlow') == 'auto':
+        session_attributes = dict(session_attributes)
+        del session_attributes['carFlow']
+        session_attributes['confirmationContext'] = 'AutoPopulate'
+        response = dict(response, sessionAttributes=session_attributes)
+    return response
+
+
+def run_child(lambda_dir, repeat):
+    logging.disable(logging.CRITICAL)
+    turns = list(cases())
+    with _support.discard_stdout():
+        module = _support.load_handler('booktrip', lambda_dir)
+
+        def event(session_attributes, confirmation, slots):
+            return _support.lex_event('BookCar', slots, session_attributes=dict(session_attributes),
+                                      confirmation_status=confirmation)
+
+        responses = [comparable(module.lambda_handler(event(*turn), None)) for turn in turns]
+        events = [event(*turn) for turn in turns]
+
+        def run_all():
+            # The events are reused across passes; the handler only ever rewrites them to the same values.
+            for turn, built in zip(turns, events):
+                built['sessionAttributes'] = dict(turn[0])
+                built['currentIntent']['slots'] = dict(turn[2])
+                module.lambda_handler(built, None)
+
+        best, median = _support.measure(run_all, number=1, repeat=repeat)
+    digest = hashlib.sha1(json.dumps(responses, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    print(json.dumps([len(turns), best / len(turns), median / len(turns), digest]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20, help='passes over the cases')
+    parser.add_argument('--baseline', help='git revision to compare the working tree against')
+    parser.add_argument('--child', metavar='LAMBDA_DIR', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.repeat)
+        return
+
+    rows = []
+    digests = set()
+    for label, (count, best, median, digest) in _support.compare_trees(__file__, args.baseline,
+                                                                        ['--repeat', str(args.repeat)]):
+        digests.add(digest)
+        rows.append((label, count, '{:.2f}'.format(best), '{:.2f}'.format(median), digest))
+
+    _support.print_table(['tree', 'turns', 'best us/turn', 'median us/turn', 'responses digest'], rows)
+    if args.baseline:
+        print('\nresponses differ from {}'.format(args.baseline) if len(digests) > 1
+              else '\nresponses identical to {}'.format(args.baseline))
+        if len(digests) > 1:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
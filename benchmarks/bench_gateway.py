@@ -0,0 +1,122 @@
+"""
+SMS gateway throughput: Twilio webhooks per second through motherbot.smsgateway against the local Lex runtime stand-in.
+
+Sends --messages texts from --senders numbers, each split into --parts webhooks arriving back to back the way a long
+SMS arrives, to --containers workers each standing in for one warm Lambda container.  The runtime stand-in answers
+after --latency seconds and takes --handshake seconds to accept a new connection, for the TCP and TLS setup.  Rows:
+
+    new connection per SMS   a client per webhook, as the Node integration connected per request
+    pooled keep-alive        one client per container, its connection kept open between webhooks
+    pooled, bursts collapsed the same, with the parts of a text collapsed into one PostText (--window seconds)
+
+e.g.
+
+    python benchmarks/bench_gateway.py --messages 200 --parts 3 --containers 8
+"""
+
+import argparse
+import logging
+import queue
+import sys
+import threading
+import time
+from urllib.parse import urlencode
+
+import _support
+
+sys.path.insert(0, _support.LAMBDA_DIR)
+
+from motherbot import lexruntime, smsgateway  # noqa: E402
+from motherbot.fakes.lexruntime import FakeLexRuntimeServer  # noqa: E402
+
+
+# Webhooks are signed as Twilio signs them, so each one pays for the signature check as it would in a deployment.
+AUTH_TOKEN = 'bench-token'
+WEBHOOK_URL = 'https://sms.example.com/twilio'
+
+
+def webhooks(messages, senders, parts):
+    for index in range(messages):
+        sender = '+1201555{:04d}'.format(index % senders)
+        for part in range(parts):
+            params = {
+                'From': sender, 'To': '+12014317268', 'MessageSid': 'SM{:08d}{:02d}'.format(index, part),
+                'Body': 'part {} of message {}'.format(part + 1, index),
+            }
+            signature = smsgateway.expected_signature(WEBHOOK_URL, params, AUTH_TOKEN)
+            yield {'body': urlencode(params), 'headers': {'X-Twilio-Signature': signature}}
+
+
+def run(server, events, containers, per_webhook_client, window):
+    """
+    (seconds, latencies) to handle events on containers workers.
+    """
+    bursts = smsgateway.InMemoryBursts()
+
+    def client():
+        return lexruntime.LexRuntimeClient('us-east-1', 'AKIDBENCH', 'secret', endpoint=server.url, pool_size=1)
+
+    pending = queue.Queue()
+    for event in events:
+        pending.put(event)
+    latencies = []
+    lock = threading.Lock()
+
+    def gateway_for(lex):
+        return smsgateway.SmsGateway(lex, bursts=bursts, window=window, auth_token=AUTH_TOKEN, url=WEBHOOK_URL)
+
+    def container():
+        gateway = gateway_for(client())
+        while True:
+            try:
+                event = pending.get_nowait()
+            except queue.Empty:
+                break
+            if per_webhook_client:
+                gateway = gateway_for(client())
+            start = time.perf_counter()
+            gateway.handle(event)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+            if per_webhook_client:
+                gateway._lex.close()
+
+    workers = [threading.Thread(target=container) for _ in range(containers)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - start, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--messages', type=int, default=200)
+    parser.add_argument('--senders', type=int, default=50)
+    parser.add_argument('--parts', type=int, default=3, help='webhooks per text')
+    parser.add_argument('--containers', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds the runtime takes per PostText')
+    parser.add_argument('--handshake', type=float, default=0.03, help='seconds to accept a new connection')
+    parser.add_argument('--window', type=float, default=0.3, help='burst window in seconds')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    events = list(webhooks(args.messages, args.senders, args.parts))
+    rows = []
+    for label, per_webhook_client, window in (
+            ('new connection per SMS', True, 0),
+            ('pooled keep-alive', False, 0),
+            ('pooled, bursts collapsed', False, args.window)):
+        with FakeLexRuntimeServer(latency=args.latency, handshake=args.handshake) as server:
+            seconds, latencies = run(server, events, args.containers, per_webhook_client, window)
+            rows.append((label, len(events), '{:.1f}'.format(len(events) / seconds), len(server.texts),
+                         server.connections, '{:.1f}'.format(_support.percentile(latencies, 50) * 1000),
+                         '{:.1f}'.format(_support.percentile(latencies, 99) * 1000)))
+
+    _support.print_table(['gateway', 'webhooks', 'webhooks/s', 'PostText calls', 'connections', 'p50 ms', 'p99 ms'],
+                         rows)
+
+
+if __name__ == '__main__':
+    main()
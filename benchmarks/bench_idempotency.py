@@ -0,0 +1,121 @@
+"""
+Retried fulfillments through motherbot.idempotency: what a retry costs, and whether the backends see it twice.
+
+Sends --requests FulfillmentCodeHook events to each handler (BookCar and BookHotel, CanIGOTO and CanISee, from
+different users, each with its own turnId request attribute) and then --retries copies of each, as Lex does when an
+invocation times out.  Fulfillment runs with the cache off, with the in-container LRU, and with a cold LRU in front of
+a SQLite store standing in for a retry that lands on another container.  The report gives the cost per first
+fulfillment and per retry, and how many approvals were queued for the guardians, e.g.
+
+    python benchmarks/bench_idempotency.py --requests 500 --retries 2
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import _support
+
+sys.path.insert(0, _support.LAMBDA_DIR)
+
+from motherbot import idempotency  # noqa: E402
+
+
+def turn(index):
+    # The client's id for the turn, which Lex passes through unchanged on a retry.
+    return {'turnId': 'turn-{}'.format(index)}
+
+
+def booktrip_events(count):
+    for index in range(count):
+        if index % 2:
+            yield _support.lex_event('BookHotel', {
+                'Location': 'chicago', 'CheckInDate': '2030-06-03', 'Nights': str(1 + index % 7), 'RoomType': 'king'
+            }, source='FulfillmentCodeHook', user_id='bench-{}'.format(index), request_attributes=turn(index))
+        else:
+            yield _support.lex_event('BookCar', {
+                'PickUpCity': 'boston', 'PickUpDate': '2030-06-03', 'ReturnDate': '2030-06-05',
+                'DriverAge': str(20 + index % 50), 'CarType': 'midsize'
+            }, source='FulfillmentCodeHook', user_id='bench-{}'.format(index), request_attributes=turn(index),
+                session_attributes={'currentReservationPrice': '120', 'currentReservation': '1:{"t":"Car"}'})
+
+
+def motherbot_events(count):
+    for index in range(count):
+        if index % 2:
+            yield _support.lex_event('CanISee', {'Events': 'Movie', 'Movies': None, 'Concerts': None},
+                                     source='FulfillmentCodeHook', user_id='bench-{}'.format(index),
+                                     request_attributes=turn(index))
+        else:
+            yield _support.lex_event('CanIGOTO', {'FriendHouse': None, 'PublicPlaces': 'Mall'},
+                                     source='FulfillmentCodeHook', user_id='bench-{}'.format(index),
+                                     request_attributes=turn(index))
+
+
+def copy_event(event):
+    # Each delivery is decoded afresh from the same JSON, so retries share nothing with the first copy.
+    return dict(event, sessionAttributes=dict(event['sessionAttributes'] or {}),
+                currentIntent=dict(event['currentIntent'], slots=dict(event['currentIntent']['slots'])))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--retries', type=int, default=2, help='copies of each request after the first')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    scratch = tempfile.mkdtemp(prefix='bench-')
+    rows = []
+    try:
+        with _support.discard_stdout():
+            modules = {'booktrip': _support.load_handler('booktrip'), 'motherbot': _support.load_handler('motherbot')}
+            service = modules['motherbot'].approvals.shared()
+            queued = []
+            request = service.request
+            service.request = lambda *a: queued.append(a) or request(*a)
+
+            store = idempotency.SQLiteFulfillments(os.path.join(scratch, 'fulfillments.db'))
+            modes = [
+                ('no cache', lambda: idempotency.Fulfillments(ttl=0), False),
+                ('LRU', lambda: idempotency.Fulfillments(), False),
+                ('LRU + SQLite, other container', lambda: idempotency.Fulfillments(store), True),
+            ]
+            for name, events in (('booktrip', booktrip_events), ('motherbot', motherbot_events)):
+                module = modules[name]
+                for label, make, cold in modes:
+                    batch = list(events(args.requests))
+                    idempotency._shared = make()
+                    del queued[:]
+                    start = time.perf_counter()
+                    for event in batch:
+                        module.lambda_handler(copy_event(event), None)
+                    first = (time.perf_counter() - start) * 1e6 / len(batch)
+                    if cold:
+                        idempotency._shared = make()
+                    failed = 0
+                    start = time.perf_counter()
+                    for _ in range(args.retries):
+                        for event in batch:
+                            try:
+                                module.lambda_handler(copy_event(event), None)
+                            except Exception:
+                                failed += 1
+                    retry = (time.perf_counter() - start) * 1e6 / (len(batch) * args.retries)
+                    rows.append((name, label, '{:.1f}'.format(first), '{:.1f}'.format(retry),
+                                 len(queued) if name == 'motherbot' else '-', failed))
+            service.request = request
+            service.drain()
+    finally:
+        shutil.rmtree(scratch)
+
+    _support.print_table(['handler', 'fulfillments', 'first us', 'retry us', 'approvals queued', 'retries raised'],
+                         rows)
+
+
+if __name__ == '__main__':
+    main()
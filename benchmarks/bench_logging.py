@@ -0,0 +1,81 @@
+"""
+Per-invocation logging overhead of the Lex code hooks.
+
+Times warm lambda_handler calls with log output going to a byte counting sink, for each LOG_LEVEL given, and reports
+the cost per invocation alongside the bytes logged per invocation (a proxy for CloudWatch ingestion).  Pass --baseline
+with a git revision to compare against the handlers as they were at that revision, e.g.
+
+    python benchmarks/bench_logging.py --baseline HEAD~1
+
+Trees from before motherbot.logs existed ignore LOG_LEVEL and always log at DEBUG.
+"""
+
+import argparse
+import json
+import logging
+import os
+
+import _support
+
+CASES = [
+    ('motherbot', 'CanICall', {'Calling': 'friends'}),
+    ('booktrip', 'BookHotel', {'Location': 'chicago', 'CheckInDate': '2030-06-03', 'Nights': '2', 'RoomType': 'king'}),
+]
+
+
+class CountingSink(object):
+    def __init__(self):
+        self.bytes = 0
+
+    def write(self, text):
+        self.bytes += len(text)
+
+    def flush(self):
+        pass
+
+
+def run_child(lambda_dir, number):
+    sink = CountingSink()
+    logging.getLogger().addHandler(logging.StreamHandler(sink))
+
+    results = {}
+    modules = {}
+    with _support.discard_stdout():
+        for handler, intent_name, slots in CASES:
+            module = modules.get(handler) or modules.setdefault(handler, _support.load_handler(handler, lambda_dir))
+            event = _support.lex_event(intent_name, slots)
+
+            def invoke():
+                module.lambda_handler(event, None)
+
+            invoke()
+            before = sink.bytes
+            best, median = _support.measure(invoke, number=number)
+            results['{} {}'.format(handler, intent_name)] = (best, median, (sink.bytes - before) / (5.0 * number))
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000, help='invocations per timing batch')
+    parser.add_argument('--levels', default='DEBUG,INFO,WARNING', help='comma separated LOG_LEVEL values to run')
+    parser.add_argument('--baseline', help='git revision to compare the working tree against')
+    parser.add_argument('--child', metavar='LAMBDA_DIR', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.number)
+        return
+
+    rows = []
+    for level in args.levels.split(','):
+        os.environ['LOG_LEVEL'] = level
+        for label, results in _support.compare_trees(__file__, args.baseline, ['--number', str(args.number)]):
+            for case, (best, median, logged) in results.items():
+                rows.append((level, label, case, '{:.2f}'.format(best), '{:.2f}'.format(median), '{:.0f}'.format(logged)))
+
+    _support.print_table(['LOG_LEVEL', 'tree', 'case', 'best us/invoke', 'median us/invoke', 'bytes/invoke'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Response card options for appointment elicitations, built per turn against the day cache.
+
+Replays an elicitation heavy conversation - appointment type, then date, then time, each turn building its response
+card - and reports the cost per turn of the options and the card.  The report includes a digest of every card built,
+so comparing against an earlier revision also confirms that the cached options are the same, e.g.
+
+    python benchmarks/bench_options.py --baseline HEAD~1
+"""
+
+import argparse
+import hashlib
+import json
+
+import _support
+
+BOOKING_MAP = {
+    '2030-06-03': ['10:00', '10:30', '11:00', '13:00', '13:30', '14:00', '16:00'],
+    '2030-06-04': ['9:00', '9:30', '15:30', '16:00', '16:30'],
+    '2030-06-05': [],
+}
+
+# (slot, appointment type, date) for each elicitation turn of the conversation.
+TURNS = [
+    ('AppointmentType', None, None),
+    ('Date', 'cleaning', None),
+    ('Time', 'cleaning', '2030-06-03'),
+    ('Date', 'root canal', None),
+    ('Time', 'root canal', '2030-06-03'),
+    ('Time', 'root canal', '2030-06-04'),
+    ('Time', 'whitening', '2030-06-05'),
+    ('Date', 'whitening', None),
+]
+
+
+def run_child(lambda_dir, number):
+    with _support.discard_stdout():
+        module = _support.load_handler('motherbot', lambda_dir)
+
+    def conversation():
+        cards = []
+        for slot, appointment_type, date in TURNS:
+            options = module.build_options(slot, appointment_type, date, BOOKING_MAP)
+            cards.append(module.build_response_card('Specify {}'.format(slot), 'Choose one', options))
+        return cards
+
+    digest = hashlib.sha1(json.dumps(conversation(), sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    best, median = _support.measure(conversation, number=number)
+    print(json.dumps({'best': best / len(TURNS), 'median': median / len(TURNS), 'digest': digest}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=5000, help='conversations per timing batch')
+    parser.add_argument('--baseline', help='git revision to compare the working tree against')
+    parser.add_argument('--child', metavar='LAMBDA_DIR', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.number)
+        return
+
+    rows = []
+    digests = set()
+    for label, result in _support.compare_trees(__file__, args.baseline, ['--number', str(args.number)]):
+        digests.add(result['digest'])
+        rows.append((label, len(TURNS), '{:.2f}'.format(result['best']), '{:.2f}'.format(result['median']),
+                     result['digest']))
+
+    _support.print_table(['tree', 'turns', 'best us/turn', 'median us/turn', 'cards digest'], rows)
+    if args.baseline:
+        print('\ncards differ from {}'.format(args.baseline) if len(digests) > 1
+              else '\ncards identical to {}'.format(args.baseline))
+
+
+if __name__ == '__main__':
+    main()
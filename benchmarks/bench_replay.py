@@ -0,0 +1,43 @@
+"""
+Throughput benchmark for both code hooks, driven by the replay harness in tools/lexreplay.py.
+
+Replays the same generated event stream through each handler at every requested concurrency and tabulates latency
+percentiles, events per second and peak RSS.
+"""
+
+import argparse
+import os
+import sys
+
+import _support
+
+sys.path.insert(0, os.path.join(_support.REPO_ROOT, 'tools'))
+
+import lexreplay  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=5000, help='events per handler and concurrency level')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4], help='concurrency levels to run')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = []
+    for handler in sorted(lexreplay.HANDLERS):
+        events = lexreplay.EventGenerator(lexreplay.load_definition(handler), seed=args.seed).events(args.events)
+        for concurrency in args.concurrency:
+            report = lexreplay.replay(handler, events, concurrency)
+            rows.append((
+                handler, concurrency, '{:.0f}'.format(report['eventsPerSecond']),
+                '{:.3f}'.format(report['p50Ms']), '{:.3f}'.format(report['p95Ms']), '{:.3f}'.format(report['p99Ms']),
+                report['peakRssKb'], report['failures']
+            ))
+
+    _support.print_table(
+        ['handler', 'concurrency', 'events/s', 'p50 ms', 'p95 ms', 'p99 ms', 'peak RSS KB', 'failures'], rows
+    )
+
+
+if __name__ == '__main__':
+    main()
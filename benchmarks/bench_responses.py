@@ -0,0 +1,98 @@
+"""
+Building and serialising code hook responses: fresh dicts and json.dumps against motherbot.responses.
+
+Each case builds the response one dialog turn returns and then serialises it to the compact wire form.  The "dicts"
+column does that the way the handlers used to, with new message dicts and json.dumps; "responses" uses the
+motherbot.responses builders with interned prompts and responses.dumps.  Every case is also checked to serialise to
+exactly the same bytes both ways, e.g.
+
+    python benchmarks/bench_responses.py --number 20000
+"""
+
+import argparse
+import json
+import sys
+
+import _support
+
+sys.path.insert(0, _support.LAMBDA_DIR)
+
+from motherbot import responses  # noqa: E402
+
+SESSION = {'userId': 'bench-user', 'lastConfirmedReservation': '{"ReservationType": "Hotel", "Nights": "2"}'}
+SLOTS = {'PickUpCity': 'chicago', 'PickUpDate': '2030-06-03', 'ReturnDate': None, 'DriverAge': None, 'CarType': None}
+PROMPT = 'How old is the driver of this car rental?'
+CARD_OPTIONS = [{'text': 'Cleaning (30 min)', 'value': 'cleaning'}, {'text': 'Root canal (60 min)', 'value': 'root canal'}]
+
+responses.constant(PROMPT)
+
+
+def old_message(content):
+    return {'contentType': 'PlainText', 'content': content}
+
+
+def old_card(title, subtitle, options):
+    return {
+        'contentType': 'application/vnd.amazonaws.card.generic',
+        'version': 1,
+        'genericAttachments': [{'title': title, 'subTitle': subtitle, 'buttons': options[:5]}]
+    }
+
+
+CASES = [
+    ('ElicitSlot', lambda: {
+        'sessionAttributes': SESSION,
+        'dialogAction': {'type': 'ElicitSlot', 'intentName': 'BookCar', 'slots': SLOTS, 'slotToElicit': 'DriverAge',
+                         'message': old_message(PROMPT)}
+    }, lambda: responses.elicit_slot(SESSION, 'BookCar', SLOTS, 'DriverAge', responses.message(PROMPT))),
+    ('ElicitSlot with card', lambda: {
+        'sessionAttributes': SESSION,
+        'dialogAction': {'type': 'ElicitSlot', 'intentName': 'MakeAppointment', 'slots': SLOTS,
+                         'slotToElicit': 'AppointmentType', 'message': old_message(PROMPT),
+                         'responseCard': old_card('Specify Appointment Type', 'What type of appointment?', CARD_OPTIONS)}
+    }, lambda: responses.elicit_slot(SESSION, 'MakeAppointment', SLOTS, 'AppointmentType', responses.message(PROMPT),
+                                     responses.response_card('Specify Appointment Type', 'What type of appointment?',
+                                                             CARD_OPTIONS))),
+    ('ConfirmIntent', lambda: {
+        'sessionAttributes': SESSION,
+        'dialogAction': {'type': 'ConfirmIntent', 'intentName': 'BookCar', 'slots': SLOTS,
+                         'message': old_message('Is this car rental for your {} night stay?'.format(2))}
+    }, lambda: responses.confirm_intent(SESSION, 'BookCar', SLOTS,
+                                        responses.message('Is this car rental for your {} night stay?'.format(2)))),
+    ('Close', lambda: {
+        'sessionAttributes': SESSION,
+        'dialogAction': {'type': 'Close', 'fulfillmentState': 'Fulfilled', 'message': old_message(PROMPT)}
+    }, lambda: responses.close(SESSION, 'Fulfilled', responses.message(PROMPT))),
+    ('Delegate', lambda: {
+        'sessionAttributes': SESSION,
+        'dialogAction': {'type': 'Delegate', 'slots': SLOTS}
+    }, lambda: responses.delegate(SESSION, SLOTS)),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000, help='turns per timing batch')
+    args = parser.parse_args()
+
+    compact = json.JSONEncoder(separators=(',', ':')).encode
+    rows = []
+    mismatched = []
+    for name, old, new in CASES:
+        if compact(old()) != responses.dumps(new()):
+            mismatched.append(name)
+
+        old_best, _ = _support.measure(lambda: json.dumps(old(), separators=(',', ':')), number=args.number)
+        new_best, _ = _support.measure(lambda: responses.dumps(new()), number=args.number)
+        rows.append((name, '{:.2f}'.format(old_best), '{:.2f}'.format(new_best),
+                     '{:.0f}%'.format(100.0 * (old_best - new_best) / old_best)))
+
+    _support.print_table(['dialog action', 'dicts us/turn', 'responses us/turn', 'saved'], rows)
+    print('\nserialised output differs for: {}'.format(', '.join(mismatched)) if mismatched
+          else '\nserialised output identical for every case')
+    if mismatched:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""
+Compares the session attribute codec in motherbot.session with the plain json.dumps format it replaced.
+
+Reports the stored size of typical reservations and the cost of encoding, fully decoding, and carrying a record
+across a turn without reading it (which the lazy decoder makes free).
+"""
+
+import argparse
+import json
+import sys
+
+import _support
+
+sys.path.insert(0, _support.LAMBDA_DIR)
+
+from motherbot import session  # noqa: E402
+
+RECORDS = {
+    'hotel': {'ReservationType': 'Hotel', 'Location': 'san francisco', 'RoomType': 'deluxe',
+              'CheckInDate': '2030-06-03', 'Nights': 4},
+    'car': {'ReservationType': 'Car', 'PickUpCity': 'washington dc', 'PickUpDate': '2030-06-03',
+            'ReturnDate': '2030-06-07', 'CarType': 'full size'},
+    'car, partly filled': {'ReservationType': 'Car', 'PickUpCity': 'boston', 'PickUpDate': None,
+                           'ReturnDate': None, 'CarType': None},
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000, help='calls per timing batch')
+    args = parser.parse_args()
+
+    formats = [
+        ('json.dumps', json.dumps, json.loads, json.loads),
+        ('codec', session.encode, session.decode_now, session.decode),
+        ('codec+zlib', lambda record: session.encode(record, compress=True), session.decode_now, session.decode),
+    ]
+
+    rows = []
+    for name, record in RECORDS.items():
+        for label, encode, decode, carry in formats:
+            encoded = encode(record)
+            assert dict((key, value) for key, value in decode(encoded).items() if value is not None) == \
+                dict((key, value) for key, value in record.items() if value is not None)
+            rows.append((
+                name, label, len(encoded.encode('utf-8')),
+                '{:.2f}'.format(_support.measure(lambda: encode(record), number=args.number)[0]),
+                '{:.2f}'.format(_support.measure(lambda: decode(encoded), number=args.number)[0]),
+                '{:.2f}'.format(_support.measure(lambda: carry(encoded), number=args.number)[0]),
+            ))
+
+    _support.print_table(['record', 'format', 'bytes', 'encode us', 'decode us', 'carry unread us'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Cold start benchmark for the Lex code hooks.
+
+Every sample runs in a fresh interpreter, imports a handler file and sends it a single event, recording the module
+import time and the latency of that first invocation.  Pass --baseline with a git revision to measure the handlers as
+they were at that revision alongside the working tree, e.g.
+
+    python benchmarks/bench_startup.py --baseline HEAD~1
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import _support
+
+CASES = [
+    ('motherbot', 'CanICall', {'Calling': 'friends'}),
+    ('motherbot', 'MeetAFriend', {'Friend': 'Website', 'FriendName': None, 'FriendPhone': None, 'FriendCode': None}),
+    ('booktrip', 'BookHotel', {'Location': 'chicago', 'CheckInDate': '2030-06-03', 'Nights': '2', 'RoomType': 'king'}),
+]
+
+
+def run_sample(lambda_dir, handler, intent_name):
+    slots = next(slots for name, intent, slots in CASES if (name, intent) == (handler, intent_name))
+    event = _support.lex_event(intent_name, slots)
+
+    start = time.perf_counter()
+    module = _support.load_handler(handler, lambda_dir)
+    imported = time.perf_counter()
+    module.lambda_handler(event, None)
+    invoked = time.perf_counter()
+
+    print(json.dumps({'importMs': (imported - start) * 1000.0, 'firstInvokeMs': (invoked - imported) * 1000.0}))
+
+
+def run_child(lambda_dir, runs):
+    """
+    Sample every case runs times for one tree, each sample in a fresh interpreter, and print the results as JSON.
+    """
+    results = {}
+    for handler, intent_name, _ in CASES:
+        samples = results['{} {}'.format(handler, intent_name)] = []
+        for _ in range(runs):
+            output = subprocess.check_output(
+                [sys.executable, os.path.abspath(__file__), '--sample', lambda_dir, handler, intent_name],
+                stderr=subprocess.DEVNULL
+            )
+            samples.append(json.loads(output.decode('utf-8').strip().splitlines()[-1]))
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=15, help='fresh interpreters per case')
+    parser.add_argument('--baseline', help='git revision to compare the working tree against')
+    parser.add_argument('--child', metavar='LAMBDA_DIR', help=argparse.SUPPRESS)
+    parser.add_argument('--sample', nargs=3, metavar=('LAMBDA_DIR', 'HANDLER', 'INTENT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.sample:
+        run_sample(*args.sample)
+        return
+    if args.child:
+        run_child(args.child, args.runs)
+        return
+
+    rows = []
+    for label, results in _support.compare_trees(__file__, args.baseline, ['--runs', str(args.runs)]):
+        for handler, intent_name, _ in CASES:
+            samples = results['{} {}'.format(handler, intent_name)]
+            imports = [sample['importMs'] for sample in samples]
+            invokes = [sample['firstInvokeMs'] for sample in samples]
+            rows.append((
+                label, handler, intent_name,
+                '{:.2f}'.format(statistics.median(imports)),
+                '{:.2f}'.format(_support.percentile(imports, 90)),
+                '{:.2f}'.format(statistics.median(invokes)),
+                '{:.2f}'.format(statistics.median(imports) + statistics.median(invokes))
+            ))
+
+    _support.print_table(
+        ['tree', 'handler', 'intent', 'import p50 ms', 'import p90 ms', 'first invoke p50 ms', 'total p50 ms'], rows
+    )
+
+
+if __name__ == '__main__':
+    main()
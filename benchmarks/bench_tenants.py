@@ -0,0 +1,70 @@
+"""
+Resolving each turn's household through motherbot.tenants, cached against going to the store every turn.
+
+Spreads turns from --users users over --households households held in a SQLite tenant store, and reports the cost
+per lookup straight from the store (two queries and building the Household) and through TenantCache, e.g.
+
+    python benchmarks/bench_tenants.py --users 5000 --households 1000
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+
+import _support
+
+sys.path.insert(0, _support.LAMBDA_DIR)
+
+from motherbot import tenants  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--households', type=int, default=1000)
+    parser.add_argument('--turns', type=int, default=20000, help='lookups per timing batch')
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix='bench-')
+    try:
+        store = tenants.SQLiteTenantStore(os.path.join(scratch, 'tenants.db'))
+        zones = ['America/New_York', 'America/Chicago', 'America/Los_Angeles', 'Europe/London']
+        for index in range(args.households):
+            store.put_household('household-{}'.format(index), {
+                'timezone': zones[index % len(zones)],
+                'places': ['Mall', 'Library', 'Pool Club'],
+                'guardians': ['+1201431{:04d}'.format(index)],
+            })
+        users = ['user-{}'.format(index) for index in range(args.users)]
+        for index, user in enumerate(users):
+            store.assign(user, 'household-{}'.format(index % args.households))
+
+        turns = [random.choice(users) for _ in range(args.turns)]
+        defaults = tenants.default_config()
+
+        def uncached():
+            for user in turns:
+                household_id = store.household_id(user)
+                tenants.build_household(household_id, store.config(household_id) or {}, defaults)
+
+        cache = tenants.TenantCache(store, size=args.users)
+
+        def cached():
+            for user in turns:
+                cache.household(user)
+
+        rows = []
+        for label, func in (('store every turn', uncached), ('TenantCache', cached)):
+            best, median = _support.measure(func, number=1, repeat=5)
+            rows.append((label, '{:.3f}'.format(best / args.turns), '{:.3f}'.format(median / args.turns)))
+        _support.print_table(['lookup', 'best us/turn', 'median us/turn'], rows)
+        print('\ncache: {} users held, {} hits, {} misses'.format(len(cache), cache.hits, cache.misses))
+    finally:
+        shutil.rmtree(scratch)
+
+
+if __name__ == '__main__':
+    main()
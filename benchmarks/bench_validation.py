@@ -0,0 +1,110 @@
+"""
+Slot validators over a grid of valid, invalid and missing slot values, checked for identical results.
+
+Every combination of the values below is validated; the report gives the mean cost per call and a digest of all the
+results, so comparing against the hand-written validators of an earlier revision also confirms that the compiled ones
+answer exactly the same way, e.g.
+
+    python benchmarks/bench_validation.py --baseline HEAD~1
+"""
+
+import argparse
+import hashlib
+import itertools
+import json
+import logging
+
+import _support
+
+DATES = [None, '2030-06-03', '2030-06-10', '2030-08-01', '2030-06-08', '2001-01-01', 'soon', '2030-13-01']
+
+GRIDS = {
+    ('booktrip', 'validate_book_car'): {
+        'PickUpCity': [None, 'boston', 'CHICAGO', 'Springfield'],
+        'PickUpDate': DATES,
+        'ReturnDate': DATES,
+        'DriverAge': [None, '17', '30', 'old'],
+        'CarType': [None, 'midsize', 'Luxury', 'spaceship'],
+    },
+    ('booktrip', 'validate_hotel'): {
+        'Location': [None, 'seattle', 'Springfield'],
+        'CheckInDate': DATES,
+        'Nights': [None, '0', '2', '31', 'two'],
+        'RoomType': [None, 'king', 'Deluxe', 'closet'],
+    },
+    ('motherbot', 'validate_book_appointment'): {
+        'AppointmentType': [None, 'cleaning', 'Root Canal', 'haircut'],
+        'Date': DATES,
+        'Time': [None, '10:00', '16:30', '09:30', '17:00', '10:15', '1:000', 'noon', '10:3x'],
+    },
+}
+
+
+def combinations(grid):
+    names = sorted(grid)
+    for values in itertools.product(*[grid[name] for name in names]):
+        yield dict(zip(names, values))
+
+
+def caller(module, name):
+    func = getattr(module, name)
+    if name == 'validate_book_appointment':
+        return lambda slots: func(slots['AppointmentType'], slots['Date'], slots['Time'])
+    return func
+
+
+def outcome(call, slots):
+    try:
+        return call(slots)
+    except Exception as e:
+        return {'error': type(e).__name__}
+
+
+def run_child(lambda_dir, repeat):
+    logging.disable(logging.CRITICAL)
+    results = {}
+    modules = {}
+    with _support.discard_stdout():
+        for (handler, name), grid in GRIDS.items():
+            module = modules.get(handler) or modules.setdefault(handler, _support.load_handler(handler, lambda_dir))
+            call = caller(module, name)
+            cases = list(combinations(grid))
+            outcomes = [outcome(call, dict(slots)) for slots in cases]
+            digest = hashlib.sha1(json.dumps(outcomes, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+            def run_all():
+                for slots in cases:
+                    outcome(call, slots)
+
+            best, median = _support.measure(run_all, number=1, repeat=repeat)
+            results[name] = (len(cases), best / len(cases), median / len(cases), digest)
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20, help='passes over the grid')
+    parser.add_argument('--baseline', help='git revision to compare the working tree against')
+    parser.add_argument('--child', metavar='LAMBDA_DIR', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.repeat)
+        return
+
+    rows = []
+    digests = {}
+    for label, results in _support.compare_trees(__file__, args.baseline, ['--repeat', str(args.repeat)]):
+        for name, (cases, best, median, digest) in sorted(results.items()):
+            digests.setdefault(name, set()).add(digest)
+            rows.append((label, name, cases, '{:.3f}'.format(best), '{:.3f}'.format(median), digest))
+
+    _support.print_table(['tree', 'validator', 'cases', 'best us/call', 'median us/call', 'results digest'], rows)
+    if args.baseline:
+        mismatched = sorted(name for name, seen in digests.items() if len(seen) > 1)
+        print('\nresults differ from {} for: {}'.format(args.baseline, ', '.join(mismatched)) if mismatched
+              else '\nresults identical to {}'.format(args.baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Microbenchmarks for the slot validators and pricing helpers of the BookTrip code hook.
+
+Helpers the handler file no longer imports are taken from motherbot.core, where they moved.  Pass --baseline with a
+git revision to compare against the helpers as they were at that revision, e.g.
+
+    python benchmarks/bench_validators.py --baseline HEAD~1
+"""
+
+import argparse
+import importlib
+import json
+
+import _support
+
+CASES = [
+    ('isvalid_city hit', 'isvalid_city', ('San Francisco',)),
+    ('isvalid_city miss', 'isvalid_city', ('Springfield',)),
+    ('isvalid_car_type', 'isvalid_car_type', ('Luxury',)),
+    ('isvalid_room_type', 'isvalid_room_type', ('deluxe',)),
+    ('isvalid_date', 'isvalid_date', ('2030-06-03',)),
+    ('generate_car_price', 'generate_car_price', ('washington dc', 7, 30, 'full size')),
+    ('generate_hotel_price', 'generate_hotel_price', ('washington dc', 7, 'king')),
+    ('validate_book_car', 'validate_book_car', ({'PickUpCity': 'boston', 'PickUpDate': '2030-06-03',
+                                                 'ReturnDate': '2030-06-07', 'DriverAge': '30',
+                                                 'CarType': 'midsize'},)),
+    ('validate_hotel', 'validate_hotel', ({'Location': 'chicago', 'CheckInDate': '2030-06-03', 'Nights': '2',
+                                           'RoomType': 'king'},)),
+]
+
+
+def lookup(module, name):
+    if hasattr(module, name):
+        return getattr(module, name)
+    for shared in ('motherbot.core.travel', 'motherbot.core.helpers'):
+        shared = importlib.import_module(shared)
+        if hasattr(shared, name):
+            return getattr(shared, name)
+    raise AttributeError(name)
+
+
+def run_child(lambda_dir, number):
+    module = _support.load_handler('booktrip', lambda_dir)
+    results = {}
+    for label, name, call_args in CASES:
+        func = lookup(module, name)
+        results[label] = _support.measure(lambda: func(*call_args), number=number)
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=20000, help='calls per timing batch')
+    parser.add_argument('--baseline', help='git revision to compare the working tree against')
+    parser.add_argument('--child', metavar='LAMBDA_DIR', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.number)
+        return
+
+    rows = []
+    for label, results in _support.compare_trees(__file__, args.baseline, ['--number', str(args.number)]):
+        for case, (best, median) in results.items():
+            rows.append((label, case, '{:.3f}'.format(best), '{:.3f}'.format(median)))
+
+    _support.print_table(['tree', 'case', 'best us/call', 'median us/call'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""
+Warm invocation benchmark for the Lex code hooks.
+
+Loads each handler once and then times repeated lambda_handler calls, which is the steady state of a warm container.
+Pass --baseline with a git revision to compare against the handlers as they were at that revision, e.g.
+
+    python benchmarks/bench_warm_invoke.py --baseline HEAD~1
+"""
+
+import argparse
+import json
+import logging
+import os
+import time
+
+import _support
+
+CASES = [
+    ('motherbot', 'CanICall', {'Calling': 'friends'}),
+    ('motherbot', 'CanIGOTO', {'FriendHouse': None, 'PublicPlaces': 'Library'}),
+    ('booktrip', 'BookHotel', {'Location': 'chicago', 'CheckInDate': '2030-06-03', 'Nights': '2', 'RoomType': 'king'}),
+    ('booktrip', 'BookCar', {'PickUpCity': 'boston', 'PickUpDate': '2030-06-03', 'ReturnDate': '2030-06-07',
+                             'DriverAge': '30', 'CarType': 'midsize'}),
+]
+
+
+def tzset_per_invoke():
+    os.environ['TZ'] = 'America/New_York'
+    time.tzset()
+
+
+def run_child(lambda_dir, number):
+    # Keep the handlers' DEBUG logging from dominating the measurement.
+    logging.disable(logging.CRITICAL)
+    results = {}
+    modules = {}
+    with _support.discard_stdout():
+        for handler, intent_name, slots in CASES:
+            module = modules.get(handler) or modules.setdefault(handler, _support.load_handler(handler, lambda_dir))
+
+            def invoke():
+                module.lambda_handler(_support.lex_event(intent_name, slots), None)
+
+            invoke()
+            results['{} {}'.format(handler, intent_name)] = _support.measure(invoke, number=number)
+
+        results['TZ write + time.tzset()'] = _support.measure(tzset_per_invoke, number=number)
+    print(json.dumps(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000, help='invocations per timing batch')
+    parser.add_argument('--baseline', help='git revision to compare the working tree against')
+    parser.add_argument('--child', metavar='LAMBDA_DIR', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args.child, args.number)
+        return
+
+    rows = []
+    for label, results in _support.compare_trees(__file__, args.baseline, ['--number', str(args.number)]):
+        for case, (best, median) in results.items():
+            rows.append((label, case, '{:.2f}'.format(best), '{:.2f}'.format(median)))
+
+    _support.print_table(['tree', 'case', 'best us/invoke', 'median us/invoke'], rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,256 +8,24 @@ For instructions on how to set up and test this bot, as well as additional sampl
 visit the Lex Getting Started documentation http://docs.aws.amazon.com/lex/latest/dg/getting-started.html.
 """
 
-import json
-import datetime
-import time
-import os
-import dateutil.parser
 import logging
 
-logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
+from motherbot import flow, idempotency, logs, metrics, responses, session
+from motherbot.core.dialog import close, confirm_intent, delegate, elicit_slot
+from motherbot.core.helpers import add_days, get_day_difference, safe_int, try_ex
+from motherbot.core.travel import generate_car_price, generate_hotel_price, validate_book_car, validate_hotel
+from motherbot.dates import DateMemo
+from motherbot.router import IntentRouter
 
+logger = logs.configure()
 
-# --- Helpers that build all of the responses ---
-
-
-def elicit_slot(session_attributes, intent_name, slots, slot_to_elicit, message):
-    return {
-        'sessionAttributes': session_attributes,
-        'dialogAction': {
-            'type': 'ElicitSlot',
-            'intentName': intent_name,
-            'slots': slots,
-            'slotToElicit': slot_to_elicit,
-            'message': message
-        }
-    }
-
-
-def confirm_intent(session_attributes, intent_name, slots, message):
-    return {
-        'sessionAttributes': session_attributes,
-        'dialogAction': {
-            'type': 'ConfirmIntent',
-            'intentName': intent_name,
-            'slots': slots,
-            'message': message
-        }
-    }
-
-
-def close(session_attributes, fulfillment_state, message):
-    response = {
-        'sessionAttributes': session_attributes,
-        'dialogAction': {
-            'type': 'Close',
-            'fulfillmentState': fulfillment_state,
-            'message': message
-        }
-    }
-
-    return response
-
-
-def delegate(session_attributes, slots):
-    return {
-        'sessionAttributes': session_attributes,
-        'dialogAction': {
-            'type': 'Delegate',
-            'slots': slots
-        }
-    }
-
-
-# --- Helper Functions ---
-
-
-def safe_int(n):
-    """
-    Safely convert n value to int.
-    """
-    if n is not None:
-        return int(n)
-    return n
-
-
-def try_ex(func):
-    """
-    Call passed in function in try block. If KeyError is encountered return None.
-    This function is intended to be used to safely access dictionary.
-
-    Note that this function would have negative impact on performance.
-    """
-
-    try:
-        return func()
-    except KeyError:
-        return None
-
-
-def generate_car_price(location, days, age, car_type):
-    """
-    Generates a number within a reasonable range that might be expected for a flight.
-    The price is fixed for a given pair of locations.
-    """
-
-    car_types = ['economy', 'standard', 'midsize', 'full size', 'minivan', 'luxury']
-    base_location_cost = 0
-    for i in range(len(location)):
-        base_location_cost += ord(location.lower()[i]) - 97
-
-    age_multiplier = 1.10 if age < 25 else 1
-    # Select economy is car_type is not found
-    if car_type not in car_types:
-        car_type = car_types[0]
-
-    return days * ((100 + base_location_cost) + ((car_types.index(car_type.lower()) * 50) * age_multiplier))
-
-
-def generate_hotel_price(location, nights, room_type):
-    """
-    Generates a number within a reasonable range that might be expected for a hotel.
-    The price is fixed for a pair of location and roomType.
-    """
-
-    room_types = ['queen', 'king', 'deluxe']
-    cost_of_living = 0
-    for i in range(len(location)):
-        cost_of_living += ord(location.lower()[i]) - 97
-
-    return nights * (100 + cost_of_living + (100 + room_types.index(room_type.lower())))
-
-
-def isvalid_car_type(car_type):
-    car_types = ['economy', 'standard', 'midsize', 'full size', 'minivan', 'luxury']
-    return car_type.lower() in car_types
-
-
-def isvalid_city(city):
-    valid_cities = ['new york', 'los angeles', 'chicago', 'houston', 'philadelphia', 'phoenix', 'san antonio',
-                    'san diego', 'dallas', 'san jose', 'austin', 'jacksonville', 'san francisco', 'indianapolis',
-                    'columbus', 'fort worth', 'charlotte', 'detroit', 'el paso', 'seattle', 'denver', 'washington dc',
-                    'memphis', 'boston', 'nashville', 'baltimore', 'portland']
-    return city.lower() in valid_cities
-
-
-def isvalid_room_type(room_type):
-    room_types = ['queen', 'king', 'deluxe']
-    return room_type.lower() in room_types
-
-
-def isvalid_date(date):
-    try:
-        dateutil.parser.parse(date)
-        return True
-    except ValueError:
-        return False
-
-
-def get_day_difference(later_date, earlier_date):
-    later_datetime = dateutil.parser.parse(later_date).date()
-    earlier_datetime = dateutil.parser.parse(earlier_date).date()
-    return abs(later_datetime - earlier_datetime).days
-
-
-def add_days(date, number_of_days):
-    new_date = dateutil.parser.parse(date).date()
-    new_date += datetime.timedelta(days=number_of_days)
-    return new_date.strftime('%Y-%m-%d')
-
-
-def build_validation_result(isvalid, violated_slot, message_content):
-    return {
-        'isValid': isvalid,
-        'violatedSlot': violated_slot,
-        'message': {'contentType': 'PlainText', 'content': message_content}
-    }
-
-
-def validate_book_car(slots):
-    pickup_city = try_ex(lambda: slots['PickUpCity'])
-    pickup_date = try_ex(lambda: slots['PickUpDate'])
-    return_date = try_ex(lambda: slots['ReturnDate'])
-    driver_age = safe_int(try_ex(lambda: slots['DriverAge']))
-    car_type = try_ex(lambda: slots['CarType'])
-
-    if pickup_city and not isvalid_city(pickup_city):
-        return build_validation_result(
-            False,
-            'PickUpCity',
-            'We currently do not support {} as a valid destination.  Can you try a different city?'.format(pickup_city)
-        )
-
-    if pickup_date:
-        if not isvalid_date(pickup_date):
-            return build_validation_result(False, 'PickUpDate', 'I did not understand your departure date.  When would you like to pick up your car rental?')
-        if datetime.datetime.strptime(pickup_date, '%Y-%m-%d').date() <= datetime.date.today():
-            return build_validation_result(False, 'PickUpDate', 'Reservations must be scheduled at least one day in advance.  Can you try a different date?')
-
-    if return_date:
-        if not isvalid_date(return_date):
-            return build_validation_result(False, 'ReturnDate', 'I did not understand your return date.  When would you like to return your car rental?')
-
-    if pickup_date and return_date:
-        if dateutil.parser.parse(pickup_date) >= dateutil.parser.parse(return_date):
-            return build_validation_result(False, 'ReturnDate', 'Your return date must be after your pick up date.  Can you try a different return date?')
-
-        if get_day_difference(pickup_date, return_date) > 30:
-            return build_validation_result(False, 'ReturnDate', 'You can reserve a car for up to thirty days.  Can you try a different return date?')
-
-    if driver_age is not None and driver_age < 18:
-        return build_validation_result(
-            False,
-            'DriverAge',
-            'Your driver must be at least eighteen to rent a car.  Can you provide the age of a different driver?'
-        )
-
-    if car_type and not isvalid_car_type(car_type):
-        return build_validation_result(
-            False,
-            'CarType',
-            'I did not recognize that model.  What type of car would you like to rent?  '
-            'Popular cars are economy, midsize, or luxury')
-
-    return {'isValid': True}
-
-
-def validate_hotel(slots):
-    location = try_ex(lambda: slots['Location'])
-    checkin_date = try_ex(lambda: slots['CheckInDate'])
-    nights = safe_int(try_ex(lambda: slots['Nights']))
-    room_type = try_ex(lambda: slots['RoomType'])
-
-    if location and not isvalid_city(location):
-        return build_validation_result(
-            False,
-            'Location',
-            'We currently do not support {} as a valid destination.  Can you try a different city?'.format(location)
-        )
-
-    if checkin_date:
-        if not isvalid_date(checkin_date):
-            return build_validation_result(False, 'CheckInDate', 'I did not understand your check in date.  When would you like to check in?')
-        if datetime.datetime.strptime(checkin_date, '%Y-%m-%d').date() <= datetime.date.today():
-            return build_validation_result(False, 'CheckInDate', 'Reservations must be scheduled at least one day in advance.  Can you try a different date?')
-
-    if nights is not None and (nights < 1 or nights > 30):
-        return build_validation_result(
-            False,
-            'Nights',
-            'You can make a reservations for from one to thirty nights.  How many nights would you like to stay for?'
-        )
-
-    if room_type and not isvalid_room_type(room_type):
-        return build_validation_result(False, 'RoomType', 'I did not recognize that room type.  Would you like to stay in a queen, king, or deluxe room?')
-
-    return {'isValid': True}
+router = IntentRouter()
 
 
 """ --- Functions that control the bot's behavior --- """
 
 
+@router.intent('BookHotel')
 def book_hotel(intent_request):
     """
     Performs dialog management and fulfillment for booking a hotel.
@@ -273,9 +41,10 @@ def book_hotel(intent_request):
 
     room_type = try_ex(lambda: intent_request['currentIntent']['slots']['RoomType'])
     session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
+    dates = DateMemo()
 
     # Load confirmation history and track the current reservation.
-    reservation = json.dumps({
+    reservation = session.encode({
         'ReservationType': 'Hotel',
         'Location': location,
         'RoomType': room_type,
@@ -287,7 +56,7 @@ def book_hotel(intent_request):
 
     if intent_request['invocationSource'] == 'DialogCodeHook':
         # Validate any slots which have been specified.  If any are invalid, re-elicit for their value
-        validation_result = validate_hotel(intent_request['currentIntent']['slots'])
+        validation_result = validate_hotel(intent_request['currentIntent']['slots'], dates)
         if not validation_result['isValid']:
             slots = intent_request['currentIntent']['slots']
             slots[validation_result['violatedSlot']] = None
@@ -313,7 +82,7 @@ def book_hotel(intent_request):
         return delegate(session_attributes, intent_request['currentIntent']['slots'])
 
     # Booking the hotel.  In a real application, this would likely involve a call to a backend service.
-    logger.debug('bookHotel under={}'.format(reservation))
+    logger.debug('bookHotel under=%s', reservation)
 
     try_ex(lambda: session_attributes.pop('currentReservationPrice'))
     try_ex(lambda: session_attributes.pop('currentReservation'))
@@ -322,14 +91,105 @@ def book_hotel(intent_request):
     return close(
         session_attributes,
         'Fulfilled',
+        responses.constant('Thanks, I have placed your reservation.   Please let me know if you would like to book a car '
+            'rental, or another hotel.')
+    )
+
+
+car_flow = flow.Flow(
+    'BookCar', ('PickUpCity', 'PickUpDate', 'ReturnDate', 'DriverAge', 'CarType'), attribute='carFlow',
+    states=(flow.INITIAL, 'auto'), validator=validate_book_car, legacy=('confirmationContext', {'AutoPopulate': 'auto'})
+)
+
+
+@car_flow.on(state='auto', confirmation='None')
+@car_flow.on(state=flow.INITIAL, confirmation='None', empty=car_flow.slot_names)
+def offer_auto_populate(turn):
+    """
+    Offer a rental matching the user's last reservation when it was a hotel; the state stays 'auto' until they answer.
+    """
+    # Only this transition reads the last reservation, so other turns never decode it.
+    last_confirmed_reservation = session.decode(turn.session_attributes.get('lastConfirmedReservation'))
+    if not last_confirmed_reservation or last_confirmed_reservation['ReservationType'] != 'Hotel':
+        # Otherwise, let native DM rules determine how to elicit for slots and/or drive confirmation.
+        return delegate(turn.session_attributes, turn.slots)
+
+    turn.state = 'auto'
+    return confirm_intent(
+        turn.session_attributes,
+        turn.intent_name,
+        {
+            'PickUpCity': last_confirmed_reservation['Location'],
+            'PickUpDate': last_confirmed_reservation['CheckInDate'],
+            'ReturnDate': add_days(last_confirmed_reservation['CheckInDate'], last_confirmed_reservation['Nights']),
+            'CarType': None,
+            'DriverAge': None
+        },
+        responses.message('Is this car rental for your {} night stay in {} on {}?'.format(
+            last_confirmed_reservation['Nights'],
+            last_confirmed_reservation['Location'],
+            last_confirmed_reservation['CheckInDate']
+        ))
+    )
+
+
+@car_flow.on(state='auto', confirmation='Denied', to=flow.INITIAL)
+def restart_car_reservation(turn):
+    """
+    The user turned down the auto-populated rental: start the reservation over from the pick up city.
+    """
+    try_ex(lambda: turn.session_attributes.pop('currentReservation'))
+    return elicit_slot(
+        turn.session_attributes,
+        turn.intent_name,
         {
-            'contentType': 'PlainText',
-            'content': 'Thanks, I have placed your reservation.   Please let me know if you would like to book a car '
-                       'rental, or another hotel.'
-        }
+            'PickUpCity': None,
+            'PickUpDate': None,
+            'ReturnDate': None,
+            'DriverAge': None,
+            'CarType': None
+        },
+        'PickUpCity',
+        responses.constant('Where would you like to make your car reservation?')
     )
 
 
+@car_flow.on(confirmation='Denied', to=flow.INITIAL)
+def drop_car_reservation(turn):
+    try_ex(lambda: turn.session_attributes.pop('currentReservation'))
+    return delegate(turn.session_attributes, turn.slots)
+
+
+@car_flow.on(state='auto', confirmation='Confirmed', empty=('DriverAge',), to=flow.INITIAL)
+def elicit_driver_age(turn):
+    return elicit_slot(
+        turn.session_attributes,
+        turn.intent_name,
+        turn.slots,
+        'DriverAge',
+        responses.constant('How old is the driver of this car rental?')
+    )
+
+
+@car_flow.on(state='auto', confirmation='Confirmed', empty=('CarType',), to=flow.INITIAL)
+def elicit_car_type(turn):
+    return elicit_slot(
+        turn.session_attributes,
+        turn.intent_name,
+        turn.slots,
+        'CarType',
+        responses.constant('What type of car would you like? Popular models are economy, midsize, and luxury.')
+    )
+
+
+@car_flow.on(confirmation='Confirmed', to=flow.INITIAL)
+@car_flow.on(confirmation='None')
+def delegate_car_reservation(turn):
+    # Let native DM rules determine how to elicit for slots and/or drive confirmation, or pass to fulfillment.
+    return delegate(turn.session_attributes, turn.slots)
+
+
+@router.intent('BookCar')
 def book_car(intent_request):
     """
     Performs dialog management and fulfillment for booking a car.
@@ -337,6 +197,9 @@ def book_car(intent_request):
     Beyond fulfillment, the implementation for this intent demonstrates the following:
     1) Use of elicitSlot in slot validation and re-prompting
     2) Use of sessionAttributes to pass information that can be used to guide conversation
+
+    Dialog turns are driven by car_flow: a user whose last reservation was a hotel is offered a rental matching it
+    (the 'auto' state), and is asked for the driver's age and car type once they accept.
     """
     slots = intent_request['currentIntent']['slots']
     pickup_city = slots['PickUpCity']
@@ -344,15 +207,11 @@ def book_car(intent_request):
     return_date = slots['ReturnDate']
     driver_age = slots['DriverAge']
     car_type = slots['CarType']
-    confirmation_status = intent_request['currentIntent']['confirmationStatus']
     session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
-    last_confirmed_reservation = try_ex(lambda: session_attributes['lastConfirmedReservation'])
-    if last_confirmed_reservation:
-        last_confirmed_reservation = json.loads(last_confirmed_reservation)
-    confirmation_context = try_ex(lambda: session_attributes['confirmationContext'])
+    dates = DateMemo()
 
     # Load confirmation history and track the current reservation.
-    reservation = json.dumps({
+    reservation = session.encode({
         'ReservationType': 'Car',
         'PickUpCity': pickup_city,
         'PickUpDate': pickup_date,
@@ -363,124 +222,36 @@ def book_car(intent_request):
 
     if pickup_city and pickup_date and return_date and driver_age and car_type:
         # Generate the price of the car in case it is necessary for future steps.
-        price = generate_car_price(pickup_city, get_day_difference(pickup_date, return_date), driver_age, car_type)
+        price = generate_car_price(pickup_city, get_day_difference(pickup_date, return_date, dates), safe_int(driver_age), car_type)
         session_attributes['currentReservationPrice'] = price
 
     if intent_request['invocationSource'] == 'DialogCodeHook':
-        # Validate any slots which have been specified.  If any are invalid, re-elicit for their value
-        validation_result = validate_book_car(intent_request['currentIntent']['slots'])
-        if not validation_result['isValid']:
-            slots[validation_result['violatedSlot']] = None
-            return elicit_slot(
-                session_attributes,
-                intent_request['currentIntent']['name'],
-                slots,
-                validation_result['violatedSlot'],
-                validation_result['message']
-            )
-
-        # Determine if the intent (and current slot settings) has been denied.  The messaging will be different
-        # if the user is denying a reservation he initiated or an auto-populated suggestion.
-        if confirmation_status == 'Denied':
-            # Clear out auto-population flag for subsequent turns.
-            try_ex(lambda: session_attributes.pop('confirmationContext'))
-            try_ex(lambda: session_attributes.pop('currentReservation'))
-            if confirmation_context == 'AutoPopulate':
-                return elicit_slot(
-                    session_attributes,
-                    intent_request['currentIntent']['name'],
-                    {
-                        'PickUpCity': None,
-                        'PickUpDate': None,
-                        'ReturnDate': None,
-                        'DriverAge': None,
-                        'CarType': None
-                    },
-                    'PickUpCity',
-                    {
-                        'contentType': 'PlainText',
-                        'content': 'Where would you like to make your car reservation?'
-                    }
-                )
-
-            return delegate(session_attributes, intent_request['currentIntent']['slots'])
-
-        if confirmation_status == 'None':
-            # If we are currently auto-populating but have not gotten confirmation, keep requesting for confirmation.
-            if (not pickup_city and not pickup_date and not return_date and not driver_age and not car_type)\
-                    or confirmation_context == 'AutoPopulate':
-                if last_confirmed_reservation and try_ex(lambda: last_confirmed_reservation['ReservationType']) == 'Hotel':
-                    # If the user's previous reservation was a hotel - prompt for a rental with
-                    # auto-populated values to match this reservation.
-                    session_attributes['confirmationContext'] = 'AutoPopulate'
-                    return confirm_intent(
-                        session_attributes,
-                        intent_request['currentIntent']['name'],
-                        {
-                            'PickUpCity': last_confirmed_reservation['Location'],
-                            'PickUpDate': last_confirmed_reservation['CheckInDate'],
-                            'ReturnDate': add_days(
-                                last_confirmed_reservation['CheckInDate'], last_confirmed_reservation['Nights']
-                            ),
-                            'CarType': None,
-                            'DriverAge': None
-                        },
-                        {
-                            'contentType': 'PlainText',
-                            'content': 'Is this car rental for your {} night stay in {} on {}?'.format(
-                                last_confirmed_reservation['Nights'],
-                                last_confirmed_reservation['Location'],
-                                last_confirmed_reservation['CheckInDate']
-                            )
-                        }
-                    )
-
-            # Otherwise, let native DM rules determine how to elicit for slots and/or drive confirmation.
-            return delegate(session_attributes, intent_request['currentIntent']['slots'])
-
-        # If confirmation has occurred, continue filling any unfilled slot values or pass to fulfillment.
-        if confirmation_status == 'Confirmed':
-            # Remove confirmationContext from sessionAttributes so it does not confuse future requests
-            try_ex(lambda: session_attributes.pop('confirmationContext'))
-            if confirmation_context == 'AutoPopulate':
-                if not driver_age:
-                    return elicit_slot(
-                        session_attributes,
-                        intent_request['currentIntent']['name'],
-                        intent_request['currentIntent']['slots'],
-                        'DriverAge',
-                        {
-                            'contentType': 'PlainText',
-                            'content': 'How old is the driver of this car rental?'
-                        }
-                    )
-                elif not car_type:
-                    return elicit_slot(
-                        session_attributes,
-                        intent_request['currentIntent']['name'],
-                        intent_request['currentIntent']['slots'],
-                        'CarType',
-                        {
-                            'contentType': 'PlainText',
-                            'content': 'What type of car would you like? Popular models are '
-                                       'economy, midsize, and luxury.'
-                        }
-                    )
-
-            return delegate(session_attributes, intent_request['currentIntent']['slots'])
+        return car_flow.run(intent_request, session_attributes, dates)
 
     # Booking the car.  In a real application, this would likely involve a call to a backend service.
-    logger.debug('bookCar at={}'.format(reservation))
-    del session_attributes['currentReservationPrice']
-    del session_attributes['currentReservation']
+    logger.debug('bookCar at=%s', reservation)
+    # A fulfillment can arrive without the price, e.g. a retry served by a container that never saw this booking.
+    session_attributes.pop('currentReservationPrice', None)
+    session_attributes.pop('currentReservation', None)
     session_attributes['lastConfirmedReservation'] = reservation
     return close(
         session_attributes,
         'Fulfilled',
-        {
-            'contentType': 'PlainText',
-            'content': 'Thanks, I have placed your reservation.'
-        }
+        responses.constant('Thanks, I have placed your reservation.')
+    )
+
+
+@router.fallback
+def unsupported_intent(intent_request):
+    """
+    Close out requests for intents this code hook does not serve instead of failing the invocation.
+    """
+    logger.warning('unsupported intentName=%s', intent_request['currentIntent']['name'])
+    session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
+    return close(
+        session_attributes,
+        'Failed',
+        responses.constant('Sorry, I am not able to help with that request.')
     )
 
 
@@ -492,30 +263,27 @@ def dispatch(intent_request):
     Called when the user specifies an intent for this bot.
     """
 
-    logger.debug('dispatch userId={}, intentName={}'.format(intent_request['userId'], intent_request['currentIntent']['name']))
-
-    intent_name = intent_request['currentIntent']['name']
+    logger.debug('dispatch userId=%s, intentName=%s', intent_request['userId'], intent_request['currentIntent']['name'])
 
     # Dispatch to your bot's intent handlers
-    if intent_name == 'BookHotel':
-        return book_hotel(intent_request)
-    elif intent_name == 'BookCar':
-        return book_car(intent_request)
-
-    raise Exception('Intent with name ' + intent_name + ' not supported')
+    with metrics.timer('dispatch'):
+        response = idempotency.shared().fulfill(intent_request, router.dispatch)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('dispatch timings=%s', router.stats())
+    return response
 
 
 # --- Main handler ---
 
 
+@logs.logged
+@metrics.flushed
 def lambda_handler(event, context):
     """
     Route the incoming request based on intent.
     The JSON body of the request is provided in the event slot.
     """
-    # By default, treat the user request as coming from the America/New_York time zone.
-    os.environ['TZ'] = 'America/New_York'
-    time.tzset()
-    logger.debug('event.bot.name={}'.format(event['bot']['name']))
+    # Requests are treated as coming from the household time zone, resolved once per container by motherbot.clock.
+    logger.debug('event.bot.name=%s', event['bot']['name'])
 
     return dispatch(event)
@@ -4,162 +4,53 @@
 
 """
 
-import json
-import dateutil.parser
 import datetime
-import time
-import os
-import math
-import random
 import logging
+import math
+import time
 
-logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)
-
-
-""" --- Helpers to build responses which match the structure of the necessary dialog actions --- """
-
-
-def elicit_slot(session_attributes, intent_name, slots, slot_to_elicit, message, response_card):
-    return {
-        'sessionAttributes': session_attributes,
-        'dialogAction': {
-            'type': 'ElicitSlot',
-            'intentName': intent_name,
-            'slots': slots,
-            'slotToElicit': slot_to_elicit,
-            'message': message,
-            'responseCard': response_card
-        }
-    }
-
-
-def confirm_intent(session_attributes, intent_name, slots, message, response_card):
-    return {
-        'sessionAttributes': session_attributes,
-        'dialogAction': {
-            'type': 'ConfirmIntent',
-            'intentName': intent_name,
-            'slots': slots,
-            'message': message,
-            'responseCard': response_card
-        }
-    }
-
-
-def close(session_attributes, fulfillment_state, message):
-    response = {
-        'sessionAttributes': session_attributes,
-        'dialogAction': {
-            'type': 'Close',
-            'fulfillmentState': fulfillment_state,
-            'message': message
-        }
-    }
+from motherbot import availability, carryover, catalog, clock, daycache, logs, metrics, responses, validation
+from motherbot.core.dialog import (
+    build_response_card, build_validation_result, close, confirm_intent, delegate, elicit_slot
+)
+from motherbot.core.helpers import try_ex
+from motherbot.dates import parse_date
+from motherbot.lazy import lazy_import
+from motherbot.router import IntentRouter
 
-    return response
+# CanICall and MeetAFriend never touch random; defer loading it until first use to keep cold starts short.
+random = lazy_import('random')
+# Only fulfilling CanIGOTO/CanISee and verifying a friend need these, and they bring in asyncio, sqlite3 and the SMS
+# client's http.client and ssl.
+approvals = lazy_import('motherbot.approvals')
+otp = lazy_import('motherbot.otp')
+# The household, its calendar and contacts are looked up on the first turn that needs them (uuid, the stores), and
+# only fulfillment turns are checked for retries (hashlib).
+calendar_store = lazy_import('motherbot.calendar_store')
+contacts = lazy_import('motherbot.contacts')
+idempotency = lazy_import('motherbot.idempotency')
+tenants = lazy_import('motherbot.tenants')
 
+logger = logs.configure()
 
-def delegate(session_attributes, slots):
-    return {
-        'sessionAttributes': session_attributes,
-        'dialogAction': {
-            'type': 'Delegate',
-            'slots': slots
-        }
-    }
+router = IntentRouter()
 
+# Appointments start between 10:00 and 16:30; Wednesdays and Fridays always have 10:00, 16:00 and 16:30 free.
+BUSINESS_HOURS = availability.window('10:00', '17:00')
+FIXED_AVAILABILITY = availability.mask_from_times(['10:00', '16:00', '16:30'])
 
-def build_response_card(title, subtitle, options):
-    """
-    Build a responseCard with a title, subtitle, and an optional set of options which should be displayed as buttons.
-    """
-    buttons = None
-    if options is not None:
-        buttons = []
-        for i in range(min(5, len(options))):
-            buttons.append(options[i])
+# How carry_over asks whether the user means a value they resolved earlier, by the slot it goes into.
+CARRY_OVER_QUESTIONS = {'FriendHouse': 'Do you mean {}\'s house?'}
 
-    return {
-        'contentType': 'application/vnd.amazonaws.card.generic',
-        'version': 1,
-        'genericAttachments': [{
-            'title': title,
-            'subTitle': subtitle,
-            'buttons': buttons
-        }]
-    }
+# Said instead of asking the guardians when this deployment has no APPROVAL_STORE.
+APPROVALS_UNAVAILABLE = 'I cannot reach your parents right now.  Please ask them yourself.'
 
 
 """ --- Helper Functions --- """
 
 
-def safe_int(n):
-    """
-    Safely convert n value to int.
-    """
-    if n is not None:
-        return int(n)
-    return n
-
-
-def parse_int(n):
-    try:
-        return int(n)
-    except ValueError:
-        return float('nan')
-
-
-def try_ex(func):
-    """
-    Call passed in function in try block. If KeyError is encountered return None.
-    This function is intended to be used to safely access dictionary.
-
-    Note that this function would have negative impact on performance.
-    """
-
-    try:
-        return func()
-    except KeyError:
-        return None
-
-
 def increment_time_by_thirty_mins(appointment_time):
-    hour, minute = map(int, appointment_time.split(':'))
-    return '{}:00'.format(hour + 1) if minute == 30 else '{}:30'.format(hour)
-
-
-def generate_car_price(location, days, age, car_type):
-    """
-    Generates a number within a reasonable range that might be expected for a flight.
-    The price is fixed for a given pair of locations.
-    """
-
-    car_types = ['economy', 'standard', 'midsize', 'full size', 'minivan', 'luxury']
-    base_location_cost = 0
-    for i in range(len(location)):
-        base_location_cost += ord(location.lower()[i]) - 97
-
-    age_multiplier = 1.10 if age < 25 else 1
-    # Select economy is car_type is not found
-    if car_type not in car_types:
-        car_type = car_types[0]
-
-    return days * ((100 + base_location_cost) + ((car_types.index(car_type.lower()) * 50) * age_multiplier))
-
-
-def generate_hotel_price(location, nights, room_type):
-    """
-    Generates a number within a reasonable range that might be expected for a hotel.
-    The price is fixed for a pair of location and roomType.
-    """
-
-    room_types = ['queen', 'king', 'deluxe']
-    cost_of_living = 0
-    for i in range(len(location)):
-        cost_of_living += ord(location.lower()[i]) - 97
-
-    return nights * (100 + cost_of_living + (100 + room_types.index(room_type.lower())))
+    return availability.slot_time(availability.slot_index(appointment_time) + 1)
 
 
 def get_random_int(minimum, maximum):
@@ -175,7 +66,7 @@ def get_random_int(minimum, maximum):
 def get_availabilities(date):
     """
     Helper function which in a full implementation would  feed into a backend API to provide query schedule availability.
-    The output of this function is an array of 30 minute periods of availability, expressed in ISO-8601 time format.
+    The output of this function is a motherbot.availability bitmap of the free 30 minute periods on that date.
 
     In order to enable quick demonstration of all possible conversation paths supported in this example, the function
     returns a mixture of fixed and randomized results.
@@ -183,118 +74,68 @@ def get_availabilities(date):
     On Mondays, availability is randomized; otherwise there is no availability on Tuesday / Thursday and availability at
     10:00 - 10:30 and 4:00 - 5:00 on Wednesday / Friday.
     """
-    day_of_week = dateutil.parser.parse(date).weekday()
-    availabilities = []
+    day_of_week = parse_date(date).weekday()
+    availabilities = 0
     available_probability = 0.3
     if day_of_week == 0:
         start_hour = 10
         while start_hour <= 16:
             if random.random() < available_probability:
                 # Add an availability window for the given hour, with duration determined by another random number.
+                on_the_hour = 1 << (start_hour * 2)
                 appointment_type = get_random_int(1, 4)
                 if appointment_type == 1:
-                    availabilities.append('{}:00'.format(start_hour))
+                    availabilities |= on_the_hour
                 elif appointment_type == 2:
-                    availabilities.append('{}:30'.format(start_hour))
+                    availabilities |= on_the_hour << 1
                 else:
-                    availabilities.append('{}:00'.format(start_hour))
-                    availabilities.append('{}:30'.format(start_hour))
+                    availabilities |= on_the_hour | on_the_hour << 1
             start_hour += 1
 
     if day_of_week == 2 or day_of_week == 4:
-        availabilities.append('10:00')
-        availabilities.append('16:00')
-        availabilities.append('16:30')
+        availabilities |= FIXED_AVAILABILITY
 
     return availabilities
 
 
-def isvalid_car_type(car_type):
-    car_types = ['economy', 'standard', 'midsize', 'full size', 'minivan', 'luxury']
-    return car_type.lower() in car_types
-
-
-def isvalid_city(city):
-    valid_cities = ['new york', 'los angeles', 'chicago', 'houston', 'philadelphia', 'phoenix', 'san antonio',
-                    'san diego', 'dallas', 'san jose', 'austin', 'jacksonville', 'san francisco', 'indianapolis',
-                    'columbus', 'fort worth', 'charlotte', 'detroit', 'el paso', 'seattle', 'denver', 'washington dc',
-                    'memphis', 'boston', 'nashville', 'baltimore', 'portland']
-    return city.lower() in valid_cities
-
-
-def isvalid_room_type(room_type):
-    room_types = ['queen', 'king', 'deluxe']
-    return room_type.lower() in room_types
-
-
-def isvalid_date(date):
-    try:
-        dateutil.parser.parse(date)
-        return True
-    except ValueError:
-        return False
-
-
 def is_available(appointment_time, duration, availabilities):
     """
     Helper function to check if the given time and duration fits within a known set of availability windows.
-    Duration is assumed to be one of 30, 60 (meaning minutes).  Availabilities is expected to contain entries of the format HH:MM.
+    Duration is assumed to be one of 30, 60 (meaning minutes).  Availabilities is an availability bitmap, or a list of
+    HH:MM entries.
     """
-    if duration == 30:
-        return appointment_time in availabilities
-    elif duration == 60:
-        second_half_hour_time = increment_time_by_thirty_mins(appointment_time)
-        return appointment_time in availabilities and second_half_hour_time in availabilities
+    if duration not in (30, 60):
+        # Invalid duration ; throw error.  We should not have reached this branch due to earlier validation.
+        raise ValueError('Was not able to understand duration {}'.format(duration))
 
-    # Invalid duration ; throw error.  We should not have reached this branch due to earlier validation.
-    raise Exception('Was not able to understand duration {}'.format(duration))
+    return availability.fits(availability.as_mask(availabilities), appointment_time, duration)
 
 
 def get_duration(appointment_type):
-    appointment_duration_map = {'cleaning': 30, 'root canal': 60, 'whitening': 30}
-    return try_ex(lambda: appointment_duration_map[appointment_type.lower()])
+    return catalog.APPOINTMENT_DURATIONS.get(appointment_type.lower())
 
 
 def get_availabilities_for_duration(duration, availabilities):
     """
     Helper function to return the windows of availability of the given duration, when provided a set of 30 minute windows.
     """
-    duration_availabilities = []
-    start_time = '10:00'
-    while start_time != '17:00':
-        if start_time in availabilities:
-            if duration == 30:
-                duration_availabilities.append(start_time)
-            elif increment_time_by_thirty_mins(start_time) in availabilities:
-                duration_availabilities.append(start_time)
+    starts = availability.starts_for_duration(availability.as_mask(availabilities), duration)
+    return availability.times_from_mask(starts & BUSINESS_HOURS)
 
-        start_time = increment_time_by_thirty_mins(start_time)
 
-    return duration_availabilities
-
-
-def get_day_difference(later_date, earlier_date):
-    later_datetime = dateutil.parser.parse(later_date).date()
-    earlier_datetime = dateutil.parser.parse(earlier_date).date()
-    return abs(later_datetime - earlier_datetime).days
-
-
-def add_days(date, number_of_days):
-    new_date = dateutil.parser.parse(date).date()
-    new_date += datetime.timedelta(days=number_of_days)
-    return new_date.strftime('%Y-%m-%d')
+def find_calendar_conflict(household, member):
+    """
+    Return the first event on member's calendar over the household's activity window, or None if it is clear.
+    """
+    start = clock.now(household.timezone)
+    conflicts = calendar_store.shared().conflicts(
+        household.household_id, [member], start, start + datetime.timedelta(minutes=household.activity_window_minutes)
+    )
+    return conflicts[0] if conflicts else None
 
 
 """ --- Functions that build for the controller for dialog actions --- """
 
-def build_validation_result(is_valid, violated_slot, message_content):
-    return {
-        'isValid': is_valid,
-        'violatedSlot': violated_slot,
-        'message': {'contentType': 'PlainText', 'content': message_content}
-    }
-
-
 def build_time_output_string(appointment_time):
     hour, minute = appointment_time.split(':')  # no conversion to int in order to have original string form. for eg) 10:00 instead of 10:0
     if int(hour) > 12:
@@ -322,193 +163,271 @@ def build_available_time_string(availabilities):
     return '{}, {} and {}'.format(prefix, build_time_output_string(availabilities[1]), build_time_output_string(availabilities[2]))
 
 
-def build_options(slot, appointment_type, date, booking_map):
-    """
-    Build a list of potential options for a given slot, to be used in responseCard generation.
-    """
-    day_strings = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
-    if slot == 'AppointmentType':
-        return [
-            {'text': 'cleaning (30 min)', 'value': 'cleaning'},
-            {'text': 'root canal (60 min)', 'value': 'root canal'},
-            {'text': 'whitening (30 min)', 'value': 'whitening'}
-        ]
-    elif slot == 'Date':
-        # Return the next five weekdays.
-        options = []
-        potential_date = datetime.date.today()
-        while len(options) < 5:
-            potential_date = potential_date + datetime.timedelta(days=1)
-            if potential_date.weekday() < 5:
-                options.append({'text': '{}-{} ({})'.format((potential_date.month), potential_date.day, day_strings[potential_date.weekday()]),
-                                'value': potential_date.strftime('%A, %B %d, %Y')})
-        return options
-    elif slot == 'Time':
-        # Return the availabilities on the given date.
-        if not appointment_type or not date:
-            return None
+def build_calendar_conflict_message(household, event):
+    until = calendar_store.from_epoch(event.end, household.timezone).strftime('%H:%M')
+    return responses.message('You have {} on your calendar until {}, ask me again after that.'.format(
+        event.title or 'something', build_time_output_string(until)
+    ))
 
-        availabilities = try_ex(lambda: booking_map[date])
-        if not availabilities:
-            return None
 
-        availabilities = get_availabilities_for_duration(get_duration(appointment_type), availabilities)
-        if len(availabilities) == 0:
-            return None
+DAY_STRINGS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
 
-        options = []
-        for i in range(min(len(availabilities), 5)):
-            options.append({'text': build_time_output_string(availabilities[i]), 'value': build_time_output_string(availabilities[i])})
+# Response card options only change when the household's date does.  One cache per time zone, each shared by every
+# invocation in a warm container.
+options_caches = {}
 
-        return options
 
-""" --- Functions that validate the controller methods --- """
+def options_cache(tz):
+    cache = options_caches.get(tz)
+    if cache is None:
+        cache = options_caches[tz] = daycache.DayCache(tz=tz)
+    return cache
 
-def validate_book_appointment(appointment_type, date, appointment_time):
-    if appointment_type and not get_duration(appointment_type):
-        return build_validation_result(False, 'AppointmentType', 'I did not recognize that, can I book you a root canal, cleaning, or whitening?')
-
-    if appointment_time:
-        if len(appointment_time) != 5:
-            return build_validation_result(False, 'Time', 'I did not recognize that, what time would you like to book your appointment?')
-
-        hour, minute = appointment_time.split(':')
-        hour = parse_int(hour)
-        minute = parse_int(minute)
-        if math.isnan(hour) or math.isnan(minute):
-            return build_validation_result(False, 'Time', 'I did not recognize that, what time would you like to book your appointment?')
-
-        if hour < 10 or hour > 16:
-            # Outside of business hours
-            return build_validation_result(False, 'Time', 'Our business hours are ten a.m. to five p.m.  What time works best for you?')
-
-        if minute not in [30, 0]:
-            # Must be booked on the hour or half hour
-            return build_validation_result(False, 'Time', 'We schedule appointments every half hour, what time works best for you?')
-
-    if date:
-        if not isvalid_date(date):
-            return build_validation_result(False, 'Date', 'I did not understand that, what date works best for you?')
-        elif datetime.datetime.strptime(date, '%Y-%m-%d').date() <= datetime.date.today():
-            return build_validation_result(False, 'Date', 'Appointments must be scheduled a day in advance.  Can you try a different date?')
-        elif dateutil.parser.parse(date).weekday() == 5 or dateutil.parser.parse(date).weekday() == 6:
-            return build_validation_result(False, 'Date', 'Our office is not open on the weekends, can you provide a work day?')
-
-    return build_validation_result(True, None, None)
-
-
-def validate_book_car(slots):
-    pickup_city = try_ex(lambda: slots['PickUpCity'])
-    pickup_date = try_ex(lambda: slots['PickUpDate'])
-    return_date = try_ex(lambda: slots['ReturnDate'])
-    driver_age = safe_int(try_ex(lambda: slots['DriverAge']))
-    car_type = try_ex(lambda: slots['CarType'])
-
-    if pickup_city and not isvalid_city(pickup_city):
-        return build_validation_result(
-            False,
-            'PickUpCity',
-            'We currently do not support {} as a valid destination.  Can you try a different city?'.format(pickup_city)
-        )
 
-    if pickup_date:
-        if not isvalid_date(pickup_date):
-            return build_validation_result(False, 'PickUpDate', 'I did not understand your departure date.  When would you like to pick up your car rental?')
-        if datetime.datetime.strptime(pickup_date, '%Y-%m-%d').date() <= datetime.date.today():
-            return build_validation_result(False, 'PickUpDate', 'Reservations must be scheduled at least one day in advance.  Can you try a different date?')
+def build_appointment_type_options():
+    return [
+        {'text': 'cleaning (30 min)', 'value': 'cleaning'},
+        {'text': 'root canal (60 min)', 'value': 'root canal'},
+        {'text': 'whitening (30 min)', 'value': 'whitening'}
+    ]
 
-    if return_date:
-        if not isvalid_date(return_date):
-            return build_validation_result(False, 'ReturnDate', 'I did not understand your return date.  When would you like to return your car rental?')
 
-    if pickup_date and return_date:
-        if dateutil.parser.parse(pickup_date) >= dateutil.parser.parse(return_date):
-            return build_validation_result(False, 'ReturnDate', 'Your return date must be after your pick up date.  Can you try a different return date?')
+def build_date_options(tz=None):
+    # The next five weekdays.
+    options = []
+    potential_date = clock.today(tz)
+    while len(options) < 5:
+        potential_date = potential_date + datetime.timedelta(days=1)
+        if potential_date.weekday() < 5:
+            options.append({'text': '{}-{} ({})'.format((potential_date.month), potential_date.day, DAY_STRINGS[potential_date.weekday()]),
+                            'value': potential_date.strftime('%A, %B %d, %Y')})
+    return options
 
-        if get_day_difference(pickup_date, return_date) > 30:
-            return build_validation_result(False, 'ReturnDate', 'You can reserve a car for up to thirty days.  Can you try a different return date?')
 
-    if driver_age is not None and driver_age < 18:
-        return build_validation_result(
-            False,
-            'DriverAge',
-            'Your driver must be at least eighteen to rent a car.  Can you provide the age of a different driver?'
-        )
+def build_time_options(duration, availabilities):
+    availabilities = get_availabilities_for_duration(duration, availabilities)
+    if len(availabilities) == 0:
+        return None
 
-    if car_type and not isvalid_car_type(car_type):
-        return build_validation_result(
-            False,
-            'CarType',
-            'I did not recognize that model.  What type of car would you like to rent?  '
-            'Popular cars are economy, midsize, or luxury')
+    options = []
+    for i in range(min(len(availabilities), 5)):
+        options.append({'text': build_time_output_string(availabilities[i]), 'value': build_time_output_string(availabilities[i])})
 
-    return {'isValid': True}
+    return options
 
 
-def validate_hotel(slots):
-    location = try_ex(lambda: slots['Location'])
-    checkin_date = try_ex(lambda: slots['CheckInDate'])
-    nights = safe_int(try_ex(lambda: slots['Nights']))
-    room_type = try_ex(lambda: slots['RoomType'])
+def build_options(slot, appointment_type, date, booking_map, tz=None):
+    """
+    Build a list of potential options for a given slot, to be used in responseCard generation.  Dates are counted in
+    tz, the household zone by default.  The lists come from options_cache and are shared, so they must not be modified.
+    """
+    cache = options_cache(tz or clock.HOUSEHOLD_TIMEZONE)
+    if slot == 'AppointmentType':
+        return cache.get('AppointmentType', build_appointment_type_options)
+    elif slot == 'Date':
+        return cache.get('Date', lambda: build_date_options(tz))
+    elif slot == 'Time':
+        # Return the availabilities on the given date.
+        if not appointment_type or not date:
+            return None
 
-    if location and not isvalid_city(location):
-        return build_validation_result(
-            False,
-            'Location',
-            'We currently do not support {} as a valid destination.  Can you try a different city?'.format(location)
-        )
+        availabilities = try_ex(lambda: booking_map[date])
+        if not availabilities:
+            return None
 
-    if checkin_date:
-        if not isvalid_date(checkin_date):
-            return build_validation_result(False, 'CheckInDate', 'I did not understand your check in date.  When would you like to check in?')
-        if datetime.datetime.strptime(checkin_date, '%Y-%m-%d').date() <= datetime.date.today():
-            return build_validation_result(False, 'CheckInDate', 'Reservations must be scheduled at least one day in advance.  Can you try a different date?')
-
-    if nights is not None and (nights < 1 or nights > 30):
-        return build_validation_result(
-            False,
-            'Nights',
-            'You can make a reservations for from one to thirty nights.  How many nights would you like to stay for?'
-        )
+        # The options depend only on the duration and the free slots, whatever the date.  Booking maps hold masks,
+        # or the 'H:MM' lists they used to, which are keyed as tuples rather than converted on every turn.
+        duration = get_duration(appointment_type)
+        key = availabilities if isinstance(availabilities, int) else tuple(availabilities)
+        return cache.get(('Time', duration, key), lambda: build_time_options(duration, availabilities))
 
-    if room_type and not isvalid_room_type(room_type):
-        return build_validation_result(False, 'RoomType', 'I did not recognize that room type.  Would you like to stay in a queen, king, or deluxe room?')
+""" --- Functions that validate the controller methods --- """
 
-    return {'isValid': True}
+BOOK_APPOINTMENT_RULES = [
+    validation.member(
+        'AppointmentType', catalog.APPOINTMENT_DURATIONS,
+        'I did not recognize that, can I book you a root canal, cleaning, or whitening?'
+    ),
+    validation.clock_time('Time', 'I did not recognize that, what time would you like to book your appointment?'),
+    # Outside of business hours
+    validation.hour_range('Time', 10, 16, 'Our business hours are ten a.m. to five p.m.  What time works best for you?'),
+    # Must be booked on the hour or half hour
+    validation.minute_in('Time', (0, 30), 'We schedule appointments every half hour, what time works best for you?'),
+    validation.date('Date', 'I did not understand that, what date works best for you?'),
+    validation.future('Date', 'Appointments must be scheduled a day in advance.  Can you try a different date?'),
+    validation.weekday('Date', 'Our office is not open on the weekends, can you provide a work day?'),
+]
+
+_validate_book_appointment = validation.compile_validator(
+    'validate_book_appointment', BOOK_APPOINTMENT_RULES, build_validation_result,
+    lambda: build_validation_result(True, None, None)
+)
+
+
+@metrics.timed('validate_book_appointment')
+def validate_book_appointment(appointment_type, date, appointment_time, dates=None):
+    return _validate_book_appointment(
+        {'AppointmentType': appointment_type, 'Date': date, 'Time': appointment_time}, dates
+    )
 
 
 """ --- Functions that act as controllers of the bot's behavior --- """
 
+@router.intent('MeetAFriend')
 def meet_a_friend(intent_request):
     """
     Performs dialog management and fulfillment for registering contact information known as friends.
+
+    New friends are verified with a one time passcode: once we know how to get to know them we ask for their name and
+    mobile number, text a code to it, and check the code the user reads back on the following turn.  A verified
+    friend is added to the household's contacts and the guardians are asked to approve them.
     """
-    friend_info = intent_request['currentIntent']['slots']['Friend']
+    slots = intent_request['currentIntent']['slots']
     source = intent_request['invocationSource']
     output_session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
 
     if source == 'DialogCodeHook':
         # Perform basic validation on the supplied input slots.
-        slots = intent_request['currentIntent']['slots']
+        if not slots.get('Friend'):
+            clear_friend_verification(output_session_attributes)
+            return delegate(output_session_attributes, slots)
+
+        name = slots.get('FriendName')
+        if not name:
+            return elicit_friend(intent_request, output_session_attributes, 'FriendName', 'What is your friend\'s name?')
+
+        if not slots.get('FriendPhone'):
+            return elicit_friend(
+                intent_request, output_session_attributes, 'FriendPhone',
+                'What is {}\'s mobile number?  I will text them a code to make sure it is really them.'.format(name)
+            )
+        try:
+            phone = contacts.normalize_phone(slots.get('FriendPhone'))
+        except ValueError:
+            return elicit_friend(
+                intent_request, output_session_attributes, 'FriendPhone',
+                'That does not look like a phone number.  What is {}\'s mobile number?'.format(name)
+            )
+
+        if output_session_attributes.get('friendPhone') != phone:
+            # The code is texted before we answer; the token to check it against travels in the session.
+            outcome, token = otp.shared().start(phone)
+            if outcome != otp.SENT:
+                clear_friend_verification(output_session_attributes)
+                return close(
+                    output_session_attributes,
+                    'Failed',
+                    responses.constant(
+                        'I have sent too many codes to that number, please try again later.'
+                        if outcome == otp.RATE_LIMITED else 'I could not text that number, please try again later.'
+                    )
+                )
+            output_session_attributes['friendPhone'] = phone
+            output_session_attributes['friendCode'] = token
+            return elicit_friend(
+                intent_request, output_session_attributes, 'FriendCode',
+                'I have texted a code to {}.  What code did {} get?'.format(phone, name)
+            )
+
+        if not slots.get('FriendCode'):
+            return elicit_friend(
+                intent_request, output_session_attributes, 'FriendCode', 'What code did {} get?'.format(name)
+            )
+        result, token = otp.shared().verify(phone, slots.get('FriendCode'), output_session_attributes.get('friendCode'))
+        if result == otp.INVALID:
+            output_session_attributes['friendCode'] = token
+            return elicit_friend(
+                intent_request, output_session_attributes, 'FriendCode',
+                'That code did not match.  What code did {} get?'.format(name)
+            )
+
+        clear_friend_verification(output_session_attributes)
+        if result == otp.VERIFIED:
+            # Verified contacts still need a parent's approval before they can be called.
+            household = tenants.shared().household(intent_request['userId'])
+            contact = contacts.shared().add(household.household_id, name, phone, approved=False)
+            approval_id = ask_guardians(
+                intent_request, household, 'can I add {} ({}) to my contacts'.format(name, phone), contact.contact_id
+            )
+            if approval_id is None:
+                return close(
+                    output_session_attributes,
+                    'Fulfilled',
+                    responses.message('Thanks, {} is verified.  A parent needs to approve them before you can call '
+                                      'them.'.format(name))
+                )
+            return close(
+                output_session_attributes,
+                'Fulfilled',
+                responses.message('Thanks, {} is verified.  I have asked your parents to approve them.'.format(name))
+            )
+
+        return close(
+            output_session_attributes,
+            'Failed',
+            responses.constant('That code is no longer valid.  Ask me to meet a friend to start again.')
+        )
 
-        return delegate(output_session_attributes, slots)
+    return close(
+        output_session_attributes,
+        'Fulfilled',
+        responses.constant('Thanks for introducing your friend.')
+    )
+
+
+def elicit_friend(intent_request, session_attributes, slot, content):
+    slots = intent_request['currentIntent']['slots']
+    slots[slot] = None
+    return elicit_slot(
+        session_attributes,
+        intent_request['currentIntent']['name'],
+        slots,
+        slot,
+        responses.message(content),
+        None
+    )
 
 
+def clear_friend_verification(session_attributes):
+    session_attributes.pop('friendPhone', None)
+    session_attributes.pop('friendCode', None)
+
+
+@router.intent('CanICall')
 def can_i_call(intent_request):
     """
     Performs dialog management and fulfillment for approval tasks of mobile permissions.
     """
     call_info = intent_request['currentIntent']['slots']['Calling']
     source = intent_request['invocationSource']
+    household = tenants.shared().household(intent_request['userId'])
     output_session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
 
     if source == 'DialogCodeHook':
         # Perform basic validation on the supplied input slots.
         slots = intent_request['currentIntent']['slots']
 
+        prompt = carry_over(intent_request, output_session_attributes, ('Calling',), 'Who would you like to call?')
+        if prompt:
+            return prompt
+        call_info = slots['Calling']
+
+        if call_info.lower() not in household.call_categories and contacts.configured():
+            match = contacts.shared().resolve(household.household_id, call_info)
+            if match is None or not match.contact.approved:
+                return close(
+                    output_session_attributes,
+                    'Failed',
+                    responses.message('{} is not one of your approved contacts yet.  Ask a parent to add them first.'.format(call_info))
+                )
+            # Use the name from the directory so the confirmation reads right even if the request was misheard.
+            slots['Calling'] = match.contact.name
+            carryover.shared().remember(intent_request['userId'], {'Calling': match.contact.name})
+
         return delegate(output_session_attributes, slots)
 
 
+@router.intent('CanIGOTO')
 def can_i_goto(intent_request):
     """
     Performs dialog management and fulfillment for approval tasks of places to visit.
@@ -516,15 +435,46 @@ def can_i_goto(intent_request):
     friend_home_info = intent_request['currentIntent']['slots']['FriendHouse']
     public_places = intent_request['currentIntent']['slots']['PublicPlaces']
     source = intent_request['invocationSource']
+    household = tenants.shared().household(intent_request['userId'])
     output_session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
 
     if source == 'DialogCodeHook':
         # Perform basic validation on the supplied input slots.
         slots = intent_request['currentIntent']['slots']
 
+        answer = report_approval(intent_request, output_session_attributes, friend_home_info or public_places)
+        if answer:
+            return answer
+
+        prompt = carry_over(
+            intent_request, output_session_attributes, ('PublicPlaces', 'FriendHouse'), 'Where would you like to go?'
+        )
+        if prompt:
+            return prompt
+        friend_home_info = slots['FriendHouse']
+        public_places = slots['PublicPlaces']
+
+        if public_places and household.places is not None and public_places.lower() not in household.places:
+            return close(
+                output_session_attributes,
+                'Failed',
+                responses.message('{} is not one of your approved places yet.  Ask a parent to add it first.'.format(public_places))
+            )
+
+        carryover.shared().remember(intent_request['userId'], {'FriendHouse': friend_home_info, 'PublicPlaces': public_places})
+
+        # Once we know where they want to go, make sure nothing is already on their calendar.
+        conflict = find_calendar_conflict(household, intent_request['userId'])
+        if conflict:
+            return close(output_session_attributes, 'Failed', build_calendar_conflict_message(household, conflict))
+
         return delegate(output_session_attributes, slots)
 
+    place = friend_home_info or public_places
+    return request_approval(intent_request, household, output_session_attributes, place, 'can I go to {}'.format(place))
 
+
+@router.intent('CanISee')
 def can_i_see(intent_request):
     """
     Performs dialog management and fulfillment for for approval tasks of events to attend.
@@ -533,14 +483,189 @@ def can_i_see(intent_request):
     movie_info = intent_request['currentIntent']['slots']['Movies']
     concert_info = intent_request['currentIntent']['slots']['Concerts']
     source = intent_request['invocationSource']
+    household = tenants.shared().household(intent_request['userId'])
     output_session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
 
     if source == 'DialogCodeHook':
         # Perform basic validation on the supplied input slots.
         slots = intent_request['currentIntent']['slots']
 
+        answer = report_approval(intent_request, output_session_attributes, event_info or movie_info or concert_info)
+        if answer:
+            return answer
+
+        prompt = carry_over(
+            intent_request, output_session_attributes, ('Events', 'Movies', 'Concerts'), 'Is it a movie or concert?'
+        )
+        if prompt:
+            return prompt
+
+        carryover.shared().remember(
+            intent_request['userId'], {name: slots[name] for name in ('Events', 'Movies', 'Concerts')}
+        )
+
+        # Once we know what they want to see, make sure nothing is already on their calendar.
+        conflict = find_calendar_conflict(household, intent_request['userId'])
+        if conflict:
+            return close(output_session_attributes, 'Failed', build_calendar_conflict_message(household, conflict))
+
         return delegate(output_session_attributes, slots)
 
+    subject = event_info or movie_info or concert_info
+    return request_approval(intent_request, household, output_session_attributes, subject, 'can I see {}'.format(subject))
+
+
+def carry_over(intent_request, session_attributes, slot_names, question):
+    """
+    Offer what the user resolved recently (motherbot.carryover) when none of slot_names is filled.
+
+    Returns a ConfirmIntent asking whether they mean the recalled value, or a response eliciting the first of
+    slot_names with question when there is nothing to recall or they said no.  Returns None once one of slot_names is
+    filled, by the user or by a value they confirmed.
+    """
+    slots = intent_request['currentIntent']['slots']
+    offered = session_attributes.pop('carriedOver', None)
+    if offered in slot_names and intent_request['currentIntent'].get('confirmationStatus') == 'Denied':
+        slots[offered] = None
+    elif any(slots.get(name) for name in slot_names):
+        return None
+    else:
+        recalled = carryover.shared().recall(intent_request['userId'], slot_names)
+        if recalled:
+            slot, value = recalled
+            slots[slot] = value
+            session_attributes['carriedOver'] = slot
+            return confirm_intent(
+                session_attributes,
+                intent_request['currentIntent']['name'],
+                slots,
+                responses.message(CARRY_OVER_QUESTIONS.get(slot, 'Do you mean {}?').format(value))
+            )
+    return elicit_slot(
+        session_attributes,
+        intent_request['currentIntent']['name'],
+        slots,
+        slot_names[0],
+        responses.constant(question)
+    )
+
+
+def request_approval(intent_request, household, session_attributes, subject, question):
+    """
+    Queue the activity for the guardians' approval and close straight away; the answer is given on a later turn.
+    """
+    approval_id = ask_guardians(intent_request, household, question)
+    if approval_id is None:
+        return close(session_attributes, 'Failed', responses.constant(APPROVALS_UNAVAILABLE))
+    session_attributes['approvalId'] = approval_id
+    session_attributes['approvalIntent'] = intent_request['currentIntent']['name']
+    session_attributes['approvalSubject'] = subject
+    session_attributes['approvalStatus'] = approvals.PENDING
+    session_attributes['approvalRequested'] = str(int(time.time()))
+    return close(
+        session_attributes,
+        'Fulfilled',
+        responses.message('I have asked your parents about {}.  Ask me again in a little while and I will tell you what they said.'.format(subject))
+    )
+
+
+def ask_guardians(intent_request, household, question, contact=None):
+    """
+    Queue question for the household's guardians and return the approval's id once they have been texted, or None
+    when approvals are not configured.
+    """
+    service = approval_service()
+    if service is None:
+        return None
+    approval_id = service.request(
+        household.household_id, intent_request['userId'], intent_request['currentIntent']['name'], question, contact
+    )
+    # The worker texting the guardians only runs while this invocation does; let it finish before answering.
+    if not service.drain(approvals.DRAIN_SECONDS):
+        logger.warning('approval %s: guardians not all texted within %ss', approval_id, approvals.DRAIN_SECONDS)
+    return approval_id
+
+
+def report_approval(intent_request, session_attributes, subject):
+    """
+    Answer with the guardians' decision when the user asks again about an activity already sent for approval.
+    """
+    if session_attributes.get('approvalIntent') != intent_request['currentIntent']['name']:
+        return None
+    if subject and subject != session_attributes.get('approvalSubject'):
+        return None
+
+    status = session_attributes['approvalStatus']
+    subject = session_attributes['approvalSubject']
+    if status == approvals.PENDING and approval_service() is None:
+        for key in ('approvalId', 'approvalIntent', 'approvalSubject', 'approvalStatus', 'approvalRequested'):
+            session_attributes.pop(key, None)
+        return close(session_attributes, 'Failed', responses.constant(APPROVALS_UNAVAILABLE))
+    if status == approvals.PENDING:
+        return close(
+            session_attributes,
+            'Fulfilled',
+            responses.message('Your parents have not answered about {} yet.'.format(subject))
+        )
+
+    for key in ('approvalId', 'approvalIntent', 'approvalSubject', 'approvalStatus', 'approvalRequested'):
+        session_attributes.pop(key, None)
+    if status == approvals.APPROVED:
+        return close(
+            session_attributes,
+            'Fulfilled',
+            responses.message('Good news, your parents said yes to {}.'.format(subject))
+        )
+    if status == approvals.DENIED:
+        return close(
+            session_attributes,
+            'Failed',
+            responses.message('Sorry, your parents said no to {}.'.format(subject))
+        )
+    return close(
+        session_attributes,
+        'Failed',
+        responses.message('Your parents did not answer about {} in time.  Ask me again to send them a new request.'.format(subject))
+    )
+
+
+def refresh_approval(session_attributes):
+    """
+    Copy the guardians' decision on an outstanding approval into the session.
+    """
+    if session_attributes and 'approvalStatus' in session_attributes \
+            and session_attributes['approvalStatus'] == approvals.PENDING:
+        service = approval_service()
+        if service is not None:
+            session_attributes['approvalStatus'] = service.status(
+                session_attributes['approvalId'], int(session_attributes['approvalRequested'])
+            )
+
+
+def approval_service():
+    """
+    The container's approval service, or None when APPROVAL_STORE is unset or unusable.
+    """
+    try:
+        return approvals.shared()
+    except ValueError as e:
+        logger.error('approvals are not available: %s', e)
+        return None
+
+
+@router.fallback
+def unsupported_intent(intent_request):
+    """
+    Close out requests for intents MotherBot does not serve instead of failing the invocation.
+    """
+    logger.warning('unsupported intentName=%s', intent_request['currentIntent']['name'])
+    output_session_attributes = intent_request['sessionAttributes'] if intent_request['sessionAttributes'] is not None else {}
+    return close(
+        output_session_attributes,
+        'Failed',
+        responses.constant('Sorry, I am not able to help with that request.')
+    )
+
 """ --- Intents --- """
 
 
@@ -549,33 +674,34 @@ def dispatch(intent_request):
     Called when the user specifies an intent for this bot.
     """
 
-    logger.debug('dispatch userId={}, intentName={}'.format(intent_request['userId'], intent_request['currentIntent']['name']))
+    logger.debug('dispatch userId=%s, intentName=%s', intent_request['userId'], intent_request['currentIntent']['name'])
 
-    intent_name = intent_request['currentIntent']['name']
+    # Dispatch to your bot's intent handlers; a retried fulfillment gets the first one's response back.
+    with metrics.timer('dispatch'):
+        if intent_request['invocationSource'] == 'FulfillmentCodeHook':
+            response = idempotency.shared().fulfill(intent_request, route)
+        else:
+            response = route(intent_request)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('dispatch timings=%s', router.stats())
+    return response
 
-    # Dispatch to your bot's intent handlers
-    if intent_name == 'CanICall':
-        return can_i_call(intent_request)
-    elif intent_name == 'CanIGOTO':
-        return can_i_goto(intent_request)
-    elif intent_name == 'CanISee':
-        return can_i_see(intent_request)
-    elif intent_name == 'MeetAFriend':
-        return meet_a_friend(intent_request)
 
-    raise Exception('Intent with name ' + intent_name + ' not supported')
+def route(intent_request):
+    refresh_approval(intent_request['sessionAttributes'])
+    return router.dispatch(intent_request)
 
 """ --- Main handler --- """
 
 
+@logs.logged
+@metrics.flushed
 def lambda_handler(event, context):
     """
     Route the incoming request based on intent.
     The JSON body of the request is provided in the event slot.
     """
-    # By default, treat the user request as coming from the America/New_York time zone.
-    os.environ['TZ'] = 'America/New_York'
-    time.tzset()
-    logger.debug('event.bot.name={}'.format(event['bot']['name']))
+    # Requests are treated as coming from the household time zone, resolved once per container by motherbot.clock.
+    logger.debug('event.bot.name=%s', event['bot']['name'])
 
     return dispatch(event)
@@ -0,0 +1,8 @@
+"""
+Shared building blocks for the MotherBot and BookTrip Lex code hooks.
+
+The Lambda entry points live next to this package in lex-motherbot-python.py and lex-booktrip-python.py;
+deploy the contents of the lambda directory so that both the handler file and this package are importable, or
+build a package per function holding only what its handler imports with tools/bundle.py.  Code the two handlers
+share lives in motherbot.core.
+"""
@@ -0,0 +1,559 @@
+"""
+Parent approval of activities asked for through CanIGOTO and CanISee, and of friends added through MeetAFriend.
+
+The code hook calls request(), which records the approval with the household's guardians, puts it on a queue and
+returns its id.  A worker takes it off the queue and texts every guardian at once; each text asks them to reply YES or
+NO with the id.  Only the guardians the approval was sent to can answer it, the first reply recorded wins and later
+ones are ignored.  The handler copies the decision into the session on the user's next turn, so no code hook ever
+waits on a parent's phone.  An approval naming a contact marks that contact approved (motherbot.contacts) when the
+winning reply is YES, so the gateway needs the same CONTACTS_STORE as the code hook.
+
+Queues (APPROVAL_QUEUE):
+
+    memory           an asyncio queue drained by a worker thread in this container (the default)
+    sqlite:<path>    a table polled by a worker in this container, or by `python -m motherbot.approvals`
+    sqs:<queue url>  an SQS queue, usually drained by a separate worker; see motherbot.fakes.sqs
+
+Approvals and their decisions are kept in APPROVAL_STORE, sqlite:<path> or dynamodb:<table>.  Replies reach the SMS
+gateway function rather than the code hook, so the store must be one both can see; there is no default, and memory
+(this process only) is for local runs.  Guardians are those in the household's settings (motherbot.tenants), which
+default to the comma separated numbers in GUARDIAN_PHONES.
+
+Lambda freezes the process between invocations, so a worker in the container only fans out while an invocation is
+running; the code hook calls drain() before it answers, which waits up to APPROVAL_DRAIN_SECONDS for the texts to go.
+drain() only waits for approvals the worker in this container is sending: everything queued on the memory queue,
+which no one else reads, but on a shared SQLite or SQS queue only those it has claimed, since another worker may take
+the rest.
+"""
+
+import collections
+import json
+import logging
+import os
+import re
+import secrets
+import threading
+import time
+
+from motherbot import contacts, tenants
+from motherbot.lazy import lazy_import
+
+asyncio = lazy_import('asyncio')
+sqlite3 = lazy_import('sqlite3')
+sms = lazy_import('motherbot.sms')
+
+logger = logging.getLogger(__name__)
+
+APPROVAL_TIMEOUT_SECONDS = int(os.environ.get('APPROVAL_TIMEOUT_SECONDS', '1800'))
+DRAIN_SECONDS = float(os.environ.get('APPROVAL_DRAIN_SECONDS', '2'))
+POLL_SECONDS = 1.0
+FAN_OUT_CONCURRENCY = 8
+
+# Approval states.
+PENDING = 'pending'
+APPROVED = 'approved'
+DENIED = 'denied'
+EXPIRED = 'expired'
+
+MESSAGE = '{user} is asking: {summary}?  Reply YES {id} or NO {id}.'
+
+ID_BYTES = 8
+_REPLY = re.compile(r'^\s*(yes|y|ok|okay|no|n)\b[\s:,.-]*([0-9a-f]{%d})\b' % (ID_BYTES * 2), re.IGNORECASE)
+
+# An approval as recorded by request(); status stays PENDING and decided_by None until a guardian answers.  contact is
+# the id of the contact a YES approves, if any.
+Approval = collections.namedtuple(
+    'Approval', 'approval_id household user intent summary guardians status decided_by contact'
+)
+
+
+def parse_reply(text):
+    """
+    Read a guardian's reply such as 'YES 1f0c93ab52d7e640'.  Returns (approval id, APPROVED or DENIED), or None.
+    """
+    match = _REPLY.match(text or '')
+    if not match:
+        return None
+    status = DENIED if match.group(1).lower() in ('no', 'n') else APPROVED
+    return match.group(2).lower(), status
+
+
+""" --- Queues --- """
+
+
+class AsyncioQueue(object):
+    """
+    In-process queue living on the worker's event loop; send() is safe to call from any thread.
+    """
+
+    asynchronous = True
+    # Only this container's worker reads it.
+    exclusive = True
+
+    def __init__(self, loop):
+        self._loop = loop
+        # Created on the loop itself: older Pythons bind a Queue to the loop current where it is constructed.
+        self._queue = asyncio.run_coroutine_threadsafe(self._create(), loop).result()
+
+    async def _create(self):
+        return asyncio.Queue()
+
+    def send(self, body):
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, body)
+
+    async def receive(self, wait):
+        try:
+            return None, await asyncio.wait_for(self._queue.get(), wait)
+        except asyncio.TimeoutError:
+            return None
+
+    def delete(self, receipt):
+        self._queue.task_done()
+
+    async def join(self):
+        await self._queue.join()
+
+
+class SQLiteQueue(object):
+    """
+    Queue table with SQS-like visibility: a received message is hidden for visibility_timeout seconds and comes back
+    unless it is deleted, so an approval survives a worker dying mid fan out.
+    """
+
+    asynchronous = False
+    exclusive = False
+
+    def __init__(self, path, visibility_timeout=60):
+        self._visibility_timeout = visibility_timeout
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS approval_queue ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT, body TEXT NOT NULL,'
+            ' visible_at REAL NOT NULL, receipt TEXT)'
+        )
+
+    def send(self, body):
+        with self._lock:
+            self._connection.execute(
+                'INSERT INTO approval_queue (body, visible_at) VALUES (?, ?)', (body, time.time())
+            )
+
+    def _claim(self):
+        with self._lock:
+            connection = self._connection
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                now = time.time()
+                row = connection.execute(
+                    'SELECT id, body FROM approval_queue WHERE visible_at <= ? ORDER BY id LIMIT 1', (now,)
+                ).fetchone()
+                if row is None:
+                    return None
+                receipt = secrets.token_hex(8)
+                connection.execute(
+                    'UPDATE approval_queue SET visible_at = ?, receipt = ? WHERE id = ?',
+                    (now + self._visibility_timeout, receipt, row[0])
+                )
+                return receipt, row[1]
+            finally:
+                connection.execute('COMMIT')
+
+    def receive(self, wait):
+        deadline = time.monotonic() + wait
+        while True:
+            claimed = self._claim()
+            if claimed is not None or time.monotonic() >= deadline:
+                return claimed
+            time.sleep(0.05)
+
+    def delete(self, receipt):
+        with self._lock:
+            self._connection.execute('DELETE FROM approval_queue WHERE receipt = ?', (receipt,))
+
+
+class SqsQueue(object):
+    """
+    SQS queue through a boto3 client (or motherbot.fakes.sqs.FakeSqsClient), long polling on receive.
+    """
+
+    asynchronous = False
+    exclusive = False
+
+    def __init__(self, client, queue_url):
+        self._client = client
+        self._queue_url = queue_url
+
+    def send(self, body):
+        self._client.send_message(QueueUrl=self._queue_url, MessageBody=body)
+
+    def receive(self, wait):
+        response = self._client.receive_message(
+            QueueUrl=self._queue_url, MaxNumberOfMessages=1, WaitTimeSeconds=int(max(wait, 1))
+        )
+        messages = response.get('Messages')
+        if not messages:
+            return None
+        return messages[0]['ReceiptHandle'], messages[0]['Body']
+
+    def delete(self, receipt):
+        self._client.delete_message(QueueUrl=self._queue_url, ReceiptHandle=receipt)
+
+
+def queue_from_env(loop=None):
+    spec = os.environ.get('APPROVAL_QUEUE', 'memory')
+    kind, _, target = spec.partition(':')
+    if kind == 'memory':
+        return AsyncioQueue(loop)
+    if kind == 'sqlite':
+        return SQLiteQueue(target)
+    if kind == 'sqs':
+        boto3 = lazy_import('boto3')
+        return SqsQueue(boto3.client('sqs'), target)
+    raise ValueError('Unsupported APPROVAL_QUEUE {}'.format(spec))
+
+
+""" --- Stores --- """
+
+
+class InMemoryApprovals(object):
+    def __init__(self):
+        self._approvals = {}
+        self._lock = threading.Lock()
+
+    def create(self, approval):
+        with self._lock:
+            self._approvals[approval.approval_id] = approval
+
+    def decide(self, approval_id, status, decided_by):
+        """
+        Record a decision unless one already exists.  Returns True if this one won.
+        """
+        with self._lock:
+            approval = self._approvals.get(approval_id)
+            if approval is None or approval.decided_by is not None:
+                return False
+            self._approvals[approval_id] = approval._replace(status=status, decided_by=decided_by)
+            return True
+
+    def get(self, approval_id):
+        return self._approvals.get(approval_id)
+
+
+class SQLiteApprovals(object):
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS approvals ('
+                ' approval_id TEXT PRIMARY KEY, household TEXT NOT NULL, user TEXT, intent TEXT, summary TEXT,'
+                ' guardians TEXT NOT NULL, status TEXT NOT NULL, decided_by TEXT, contact TEXT)'
+            )
+
+    def create(self, approval):
+        with self._connection:
+            self._connection.execute(
+                'INSERT INTO approvals (approval_id, household, user, intent, summary, guardians, status, contact)'
+                ' VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                approval[:5] + (','.join(approval.guardians), approval.status, approval.contact)
+            )
+
+    def decide(self, approval_id, status, decided_by):
+        with self._connection:
+            cursor = self._connection.execute(
+                'UPDATE approvals SET status = ?, decided_by = ? WHERE approval_id = ? AND decided_by IS NULL',
+                (status, decided_by, approval_id)
+            )
+        return cursor.rowcount == 1
+
+    def get(self, approval_id):
+        row = self._connection.execute(
+            'SELECT approval_id, household, user, intent, summary, guardians, status, decided_by, contact'
+            ' FROM approvals WHERE approval_id = ?', (approval_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return Approval(*row[:5] + (tuple(phone for phone in row[5].split(',') if phone),) + row[6:])
+
+
+class DynamoDBApprovals(object):
+    """
+    Approvals table keyed on approval_id; a conditional update lets exactly one reply win across containers.
+    """
+
+    def __init__(self, table):
+        self._table = table
+
+    def create(self, approval):
+        item = {key: value for key, value in approval._asdict().items() if value is not None}
+        item['guardians'] = list(approval.guardians)
+        self._table.put_item(Item=item)
+
+    def decide(self, approval_id, status, decided_by):
+        try:
+            self._table.update_item(
+                Key={'approval_id': approval_id},
+                UpdateExpression='SET #status = :status, decided_by = :decided_by',
+                ConditionExpression='attribute_exists(approval_id) AND attribute_not_exists(decided_by)',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={':status': status, ':decided_by': decided_by}
+            )
+        except Exception as error:
+            if getattr(error, 'response', {}).get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+                return False
+            raise
+        return True
+
+    def get(self, approval_id):
+        item = self._table.get_item(Key={'approval_id': approval_id}).get('Item')
+        if item is None:
+            return None
+        return Approval(
+            item['approval_id'], item['household'], item.get('user'), item.get('intent'), item.get('summary'),
+            tuple(item.get('guardians') or ()), item['status'], item.get('decided_by'), item.get('contact')
+        )
+
+
+def store_from_env():
+    spec = os.environ.get('APPROVAL_STORE')
+    if not spec:
+        raise ValueError(
+            'APPROVAL_STORE is not set.  Guardians\' replies reach the SMS gateway, not this function, so approvals '
+            'need a store both can see: sqlite:<path> or dynamodb:<table> (memory only for local runs).'
+        )
+    kind, _, target = spec.partition(':')
+    if kind == 'memory':
+        return InMemoryApprovals()
+    if kind == 'sqlite':
+        return SQLiteApprovals(target)
+    if kind == 'dynamodb':
+        boto3 = lazy_import('boto3')
+        return DynamoDBApprovals(boto3.resource('dynamodb').Table(target))
+    raise ValueError('Unsupported APPROVAL_STORE {}'.format(spec))
+
+
+""" --- Worker --- """
+
+
+class ApprovalWorker(object):
+    """
+    Drains a queue on an asyncio loop, texting all of an approval's guardians concurrently.
+
+    notify(phone, text) is a blocking send; it runs on the loop's executor so one slow guardian does not hold up the
+    others.  A message is deleted from the queue only after its fan out has finished.  on_claim(approval id) is
+    called when the worker takes an approval off the queue and on_done(approval id) once its fan out has finished,
+    whether or not every text went.
+    """
+
+    def __init__(self, queue, notify, concurrency=FAN_OUT_CONCURRENCY, on_claim=None, on_done=None):
+        self._queue = queue
+        self._notify = notify
+        self._concurrency = concurrency
+        self.on_claim = on_claim
+        self.on_done = on_done
+        self.notified = 0
+        self.failed = 0
+
+    async def _receive(self, loop):
+        if self._queue.asynchronous:
+            return await self._queue.receive(POLL_SECONDS)
+        return await loop.run_in_executor(None, self._queue.receive, POLL_SECONDS)
+
+    async def fan_out(self, approval):
+        loop = asyncio.get_event_loop()
+        text = MESSAGE.format(user=approval['user'], summary=approval['summary'], id=approval['id'])
+        guardians = approval['guardians']
+        results = await asyncio.gather(
+            *[loop.run_in_executor(None, self._notify, phone, text) for phone in guardians],
+            return_exceptions=True
+        )
+        for phone, result in zip(guardians, results):
+            if isinstance(result, Exception):
+                self.failed += 1
+                logger.warning('approval %s: notifying %s failed: %s', approval['id'], phone, result)
+            else:
+                self.notified += 1
+
+    async def _handle(self, receipt, body, slots):
+        approval = None
+        try:
+            approval = json.loads(body)
+            if self.on_claim is not None:
+                self.on_claim(approval['id'])
+            await self.fan_out(approval)
+            if self._queue.asynchronous:
+                self._queue.delete(receipt)
+            else:
+                await asyncio.get_event_loop().run_in_executor(None, self._queue.delete, receipt)
+        except Exception:
+            logger.exception('approval fan out failed')
+        finally:
+            slots.release()
+            if approval is not None and self.on_done is not None:
+                self.on_done(approval['id'])
+
+    async def run(self, stop=None):
+        loop = asyncio.get_event_loop()
+        slots = asyncio.Semaphore(self._concurrency)
+        while stop is None or not stop.is_set():
+            received = await self._receive(loop)
+            if received is None:
+                continue
+            await slots.acquire()
+            loop.create_task(self._handle(received[0], received[1], slots))
+
+
+def guardians_from_env():
+    return lambda household: tenants.shared().by_id(household).guardians
+
+
+def notifier_from_env():
+    """
+    A blocking notify(phone, text) over Twilio when it is configured, otherwise one that drops and logs.
+    """
+    return sms.sender_from_env(pool_size=FAN_OUT_CONCURRENCY).send
+
+
+""" --- Service --- """
+
+
+class ApprovalService(object):
+    def __init__(self, queue, store, guardians=None, worker=None, timeout=APPROVAL_TIMEOUT_SECONDS):
+        self._queue = queue
+        self._store = store
+        self._guardians = guardians or guardians_from_env()
+        self._worker = worker
+        self._timeout = timeout
+        # Ids the in-process worker is responsible for and has not finished fanning out: those this service queued
+        # when the queue is exclusive to this container, otherwise those the worker has claimed.
+        self._outstanding = set()
+        self._fanned_out = threading.Condition()
+        if worker is not None:
+            worker.on_done = self._done
+            if not queue.exclusive:
+                worker.on_claim = self._claimed
+
+    def _claimed(self, approval_id):
+        with self._fanned_out:
+            self._outstanding.add(approval_id)
+
+    def _done(self, approval_id):
+        with self._fanned_out:
+            self._outstanding.discard(approval_id)
+            self._fanned_out.notify_all()
+
+    def request(self, household, user_id, intent, summary, contact=None):
+        """
+        Record and queue an approval for the household's guardians and return its id without waiting for anyone to
+        be notified.  Pass the id of a contact to have a YES approve that contact.
+        """
+        guardians = tuple(self._guardians(household))
+        if not guardians:
+            logger.warning('household %s has no guardians to ask for approval', household)
+        approval = Approval(
+            secrets.token_hex(ID_BYTES), household, user_id, intent, summary, guardians, PENDING, None, contact
+        )
+        self._store.create(approval)
+        if self._worker is not None and self._queue.exclusive:
+            with self._fanned_out:
+                self._outstanding.add(approval.approval_id)
+        self._queue.send(json.dumps({
+            'id': approval.approval_id, 'user': user_id, 'summary': summary, 'guardians': list(guardians)
+        }, separators=(',', ':')))
+        return approval.approval_id
+
+    def respond(self, phone, text):
+        """
+        Record a guardian's SMS reply.  Returns the Approval now on file (whose decision may be an earlier
+        guardian's), or None if the text is not a reply to an approval phone was asked about.
+        """
+        parsed = parse_reply(text)
+        if parsed is None:
+            return None
+        approval_id, status = parsed
+        approval = self._store.get(approval_id)
+        if approval is None or phone not in approval.guardians:
+            logger.warning('approval %s: ignoring reply from %s, who was not asked', approval_id, phone)
+            return None
+        if not self._store.decide(approval_id, status, phone):
+            logger.info('approval %s was already decided, ignoring reply from %s', approval_id, phone)
+        elif status == APPROVED and approval.contact:
+            contacts.shared().approve(approval.household, approval.contact)
+        return self._store.get(approval_id)
+
+    def status(self, approval_id, requested_at, now=None):
+        """
+        PENDING, APPROVED, DENIED or, when nobody answered within the timeout, EXPIRED.
+        """
+        approval = self._store.get(approval_id)
+        if approval is not None and approval.decided_by is not None:
+            return approval.status
+        if (now or time.time()) - requested_at > self._timeout:
+            return EXPIRED
+        return PENDING
+
+    def drain(self, timeout=None):
+        """
+        Wait until the in-process worker has fanned out the approvals it is responsible for (see the module
+        docstring).  Returns False on timeout.  With no worker in this container there is nothing to wait for.
+        """
+        if self._worker is None:
+            return True
+        with self._fanned_out:
+            return self._fanned_out.wait_for(lambda: not self._outstanding, timeout)
+
+
+def start_worker_thread(queue_factory, notify):
+    """
+    Run an ApprovalWorker on a new event loop in a daemon thread.  Returns (loop, queue, worker).
+    """
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, name='approval-worker')
+    thread.daemon = True
+    thread.start()
+    queue = queue_factory(loop)
+    worker = ApprovalWorker(queue, notify)
+    asyncio.run_coroutine_threadsafe(worker.run(), loop)
+    return loop, queue, worker
+
+
+_shared = None
+
+
+def shared():
+    """
+    The container-wide approval service over APPROVAL_STORE, raising ValueError if none is set.  The memory and
+    SQLite queues get a worker thread in this container; an SQS queue is left to a separate worker unless
+    APPROVAL_WORKER=inprocess.
+    """
+    global _shared
+    if _shared is None:
+        store = store_from_env()
+        kind = os.environ.get('APPROVAL_QUEUE', 'memory').partition(':')[0]
+        if kind != 'sqs' or os.environ.get('APPROVAL_WORKER') == 'inprocess':
+            _, queue, worker = start_worker_thread(queue_from_env, notifier_from_env())
+        else:
+            queue, worker = queue_from_env(), None
+        _shared = ApprovalService(queue, store, worker=worker)
+    return _shared
+
+
+def main():
+    """
+    Run a standalone worker for the configured queue until interrupted.
+    """
+    logging.basicConfig(level=logging.INFO)
+    if os.environ.get('APPROVAL_QUEUE', 'memory').partition(':')[0] == 'memory':
+        raise SystemExit('APPROVAL_QUEUE must be sqlite:<path> or sqs:<queue url> to run a separate worker')
+    worker = ApprovalWorker(queue_from_env(), notifier_from_env())
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(worker.run())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        loop.close()
+
+
+if __name__ == '__main__':
+    main()
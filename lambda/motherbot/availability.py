@@ -0,0 +1,154 @@
+"""
+Calendar availability stored as bitmaps of half hour slots.
+
+A day is an int whose bit i is set when the half hour starting i * 30 minutes after midnight is free, so bit 20 is
+10:00-10:30 and a whole day fits in 48 bits.  "Free for N minutes from here" becomes a handful of shifts and ANDs
+over the whole day at once, and finding a time that suits several family members is the AND of their days.
+
+Times are 'H:MM' strings as used by the code hooks ('9:30', '16:00').  AvailabilityCalendar keeps such days per
+household member and answers queries across members and over ranges of days.
+"""
+
+import datetime
+
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+FULL_DAY = (1 << SLOTS_PER_DAY) - 1
+
+
+def slot_index(time_string):
+    """
+    Index of the slot starting at time_string.  Raises ValueError for times not on a slot boundary.
+    """
+    hour, minute = map(int, time_string.split(':'))
+    if minute % SLOT_MINUTES or not 0 <= hour < 24 or not 0 <= minute < 60:
+        raise ValueError('{} is not the start of a {} minute slot'.format(time_string, SLOT_MINUTES))
+    return (hour * 60 + minute) // SLOT_MINUTES
+
+
+def slot_time(index):
+    minutes = index * SLOT_MINUTES
+    return '{}:{:02d}'.format(minutes // 60, minutes % 60)
+
+
+def slots_for(minutes):
+    """
+    Number of slots needed to hold an appointment of the given length.
+    """
+    return -(-minutes // SLOT_MINUTES)
+
+
+def window(start, end):
+    """
+    Mask with every slot from start (inclusive) to end (exclusive) set; end may be '24:00'.
+    """
+    first = slot_index(start)
+    last = SLOTS_PER_DAY if end == '24:00' else slot_index(end)
+    if last <= first:
+        return 0
+    return ((1 << (last - first)) - 1) << first
+
+
+def mask_from_times(times):
+    mask = 0
+    for time_string in times:
+        mask |= 1 << slot_index(time_string)
+    return mask
+
+
+def times_from_mask(mask):
+    times = []
+    while mask:
+        lowest = mask & -mask
+        times.append(slot_time(lowest.bit_length() - 1))
+        mask ^= lowest
+    return times
+
+
+def as_mask(availabilities):
+    """
+    Accept either a mask or the list of 'H:MM' strings the code hooks used to keep.
+    """
+    if isinstance(availabilities, int):
+        return availabilities
+    return mask_from_times(availabilities or [])
+
+
+def starts_for_duration(mask, minutes):
+    """
+    Mask of the slots at which a run of free time at least minutes long begins.
+    """
+    starts = mask
+    for offset in range(1, slots_for(minutes)):
+        starts &= mask >> offset
+    return starts
+
+
+def fits(mask, start, minutes):
+    """
+    True if minutes of free time begin at start ('H:MM') in mask; a start between slot boundaries never fits.
+    """
+    try:
+        first = slot_index(start)
+    except ValueError:
+        return False
+    needed = ((1 << slots_for(minutes)) - 1) << first
+    return mask & needed == needed
+
+
+class AvailabilityCalendar(object):
+    """
+    Free time per household member per day.  Days nobody has recorded are treated as fully busy.
+    """
+
+    def __init__(self):
+        self._days = {}
+
+    def set_day(self, member, date, mask):
+        self._days.setdefault(member, {})[date] = mask & FULL_DAY
+
+    def day(self, member, date):
+        return self._days.get(member, {}).get(date, 0)
+
+    def add_free(self, member, date, start, end):
+        self.set_day(member, date, self.day(member, date) | window(start, end))
+
+    def add_busy(self, member, date, start, end):
+        self.set_day(member, date, self.day(member, date) & ~window(start, end))
+
+    def members(self):
+        return sorted(self._days)
+
+    def free(self, date, members):
+        """
+        Slots on date at which every one of members is free.
+        """
+        mask = FULL_DAY
+        for member in members:
+            mask &= self.day(member, date)
+            if not mask:
+                break
+        return mask
+
+    def is_free(self, date, start, minutes, members):
+        return fits(self.free(date, members), start, minutes)
+
+    def free_starts(self, date, minutes, members, within=FULL_DAY):
+        """
+        Start times on date at which all members are free for minutes, limited to starts inside within.
+        """
+        return times_from_mask(starts_for_duration(self.free(date, members), minutes) & within)
+
+    def free_range(self, first_date, last_date, minutes, members, within=FULL_DAY):
+        """
+        Map each date from first_date to last_date (inclusive) on which all members share minutes of free time to
+        the start times of those windows.
+        """
+        found = {}
+        date = first_date
+        while date <= last_date:
+            starts = starts_for_duration(self.free(date, members), minutes) & within
+            if starts:
+                found[date] = times_from_mask(starts)
+            date += datetime.timedelta(days=1)
+        return found
@@ -0,0 +1,385 @@
+"""
+Household calendar: per member event intervals behind a pluggable storage backend.
+
+Events are held in a backend (InMemoryBackend, SQLiteBackend, or DynamoDBBackend over a boto3 Table or the local
+stand-in in motherbot.fakes.dynamodb) and indexed in memory per household member with an IntervalIndex, so conflict
+and free time queries cost O(log n + k) for n events of which k are returned.  A household's events are loaded from
+the backend on first use and again once CALENDAR_CACHE_TTL_SECONDS have passed, which bounds how long an event
+written by another container takes to show up; writes go through to the backend and only rebuild the index of the
+member they touch.
+
+Choose the backend with CALENDAR_STORE: 'memory' (the default), 'sqlite:<path>' or 'dynamodb:<table name>'.  The
+DynamoDB table needs a string partition key 'household' and string sort key 'event_id'.
+
+Times are aware datetimes (naive ones are taken to be in the household time zone) and are stored as epoch seconds.
+Intervals are half open: an event from 10:00 to 11:00 does not conflict with one starting at 11:00.
+"""
+
+import bisect
+import collections
+import datetime
+import os
+import time
+import uuid
+
+from motherbot import availability, clock
+from motherbot.lazy import lazy_import
+
+sqlite3 = lazy_import('sqlite3')
+
+CACHE_TTL_SECONDS = float(os.environ.get('CALENDAR_CACHE_TTL_SECONDS', '60'))
+
+Event = collections.namedtuple('Event', ['event_id', 'member', 'start', 'end', 'title'])
+
+
+def to_epoch(value):
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=clock.HOUSEHOLD_TIMEZONE)
+        return int(value.timestamp())
+    return int(value)
+
+
+def from_epoch(seconds, tz=None):
+    return datetime.datetime.fromtimestamp(seconds, tz or clock.HOUSEHOLD_TIMEZONE)
+
+
+""" --- Index --- """
+
+
+class _Node(object):
+    __slots__ = ('center', 'by_start', 'by_end', 'left', 'right')
+
+    def __init__(self, center, here, left, right):
+        self.center = center
+        self.by_start = sorted(here, key=lambda event: event.start)
+        self.by_end = sorted(here, key=lambda event: event.end, reverse=True)
+        self.left = left
+        self.right = right
+
+
+def _build(events):
+    """
+    Build a centred interval tree over events, which must be sorted by start and have positive length.
+    """
+    if not events:
+        return None
+    center = events[len(events) // 2].start
+    left, here, right = [], [], []
+    for event in events:
+        if event.end <= center:
+            left.append(event)
+        elif event.start > center:
+            right.append(event)
+        else:
+            here.append(event)
+    return _Node(center, here, _build(left), _build(right))
+
+
+class IntervalIndex(object):
+    """
+    Immutable index answering "which events overlap [start, end)" in O(log n + k).
+
+    An event overlaps the query either because it is in progress at start (found by a stabbing query on the centred
+    interval tree) or because it begins inside the query (found by bisecting the start-sorted events).  The two sets
+    are disjoint, so nothing is reported twice.
+    """
+
+    __slots__ = ('_root', '_starts', '_by_start')
+
+    def __init__(self, events):
+        self._by_start = sorted((event for event in events if event.end > event.start), key=lambda event: event.start)
+        self._starts = [event.start for event in self._by_start]
+        self._root = _build(self._by_start)
+
+    def __len__(self):
+        return len(self._by_start)
+
+    def stabbing(self, point):
+        """
+        Events in progress at point.
+        """
+        found = []
+        node = self._root
+        while node is not None:
+            if point < node.center:
+                for event in node.by_start:
+                    if event.start > point:
+                        break
+                    found.append(event)
+                node = node.left
+            else:
+                for event in node.by_end:
+                    if event.end <= point:
+                        break
+                    found.append(event)
+                node = node.right
+        return found
+
+    def overlapping(self, start, end):
+        if end <= start:
+            return []
+        found = self.stabbing(start)
+        found.extend(self._by_start[bisect.bisect_right(self._starts, start):bisect.bisect_left(self._starts, end)])
+        return found
+
+
+""" --- Backends --- """
+
+
+class InMemoryBackend(object):
+    def __init__(self):
+        self._events = {}
+
+    def load(self, household):
+        return list(self._events.get(household, {}).values())
+
+    def put(self, household, event):
+        self._events.setdefault(household, {})[event.event_id] = event
+
+    def delete(self, household, event_id):
+        self._events.get(household, {}).pop(event_id, None)
+
+
+class SQLiteBackend(object):
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS calendar_events ('
+                ' household TEXT NOT NULL, event_id TEXT NOT NULL, member TEXT NOT NULL,'
+                ' start INTEGER NOT NULL, "end" INTEGER NOT NULL, title TEXT,'
+                ' PRIMARY KEY (household, event_id))'
+            )
+            self._connection.execute(
+                'CREATE INDEX IF NOT EXISTS calendar_events_member_start'
+                ' ON calendar_events (household, member, start)'
+            )
+
+    def load(self, household):
+        rows = self._connection.execute(
+            'SELECT event_id, member, start, "end", title FROM calendar_events WHERE household = ?', (household,)
+        )
+        return [Event(*row) for row in rows]
+
+    def put(self, household, event):
+        with self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO calendar_events (household, event_id, member, start, "end", title)'
+                ' VALUES (?, ?, ?, ?, ?, ?)',
+                (household,) + tuple(event)
+            )
+
+    def delete(self, household, event_id):
+        with self._connection:
+            self._connection.execute(
+                'DELETE FROM calendar_events WHERE household = ? AND event_id = ?', (household, event_id)
+            )
+
+
+class DynamoDBBackend(object):
+    """
+    Backend over a boto3 DynamoDB Table resource, or anything with the same put_item/delete_item/query interface.
+    """
+
+    def __init__(self, table):
+        self._table = table
+
+    def load(self, household):
+        events = []
+        request = {
+            'KeyConditionExpression': 'household = :household',
+            'ExpressionAttributeValues': {':household': household},
+        }
+        while True:
+            response = self._table.query(**request)
+            for item in response['Items']:
+                events.append(Event(item['event_id'], item['member'], int(item['start']), int(item['end']),
+                                    item.get('title')))
+            if 'LastEvaluatedKey' not in response:
+                return events
+            request['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def put(self, household, event):
+        item = dict(event._asdict(), household=household)
+        if item['title'] is None:
+            del item['title']
+        self._table.put_item(Item=item)
+
+    def delete(self, household, event_id):
+        self._table.delete_item(Key={'household': household, 'event_id': event_id})
+
+
+def backend_from_env():
+    spec = os.environ.get('CALENDAR_STORE', 'memory')
+    kind, _, target = spec.partition(':')
+    if kind == 'memory':
+        return InMemoryBackend()
+    if kind == 'sqlite':
+        return SQLiteBackend(target)
+    if kind == 'dynamodb':
+        boto3 = lazy_import('boto3')
+        return DynamoDBBackend(boto3.resource('dynamodb').Table(target))
+    raise ValueError('Unsupported CALENDAR_STORE {}'.format(spec))
+
+
+""" --- Calendar --- """
+
+
+class HouseholdCalendar(object):
+    """
+    Event store with per member interval indexes, cached per household for ttl seconds after they were loaded.
+    """
+
+    def __init__(self, backend, ttl=CACHE_TTL_SECONDS, clock=time.monotonic):
+        self._backend = backend
+        self._ttl = ttl
+        self._clock = clock
+        # Household -> (expires, {member: [events, IntervalIndex or None until next needed]}).
+        self._households = {}
+
+    def _members(self, household):
+        entry = self._households.get(household)
+        if entry is not None and entry[0] > self._clock():
+            return entry[1]
+        grouped = {}
+        for event in self._backend.load(household):
+            grouped.setdefault(event.member, []).append(event)
+        members = {member: [events, IntervalIndex(events)] for member, events in grouped.items()}
+        self._households[household] = (self._clock() + self._ttl, members)
+        return members
+
+    def _index(self, household, member):
+        entry = self._members(household).get(member)
+        if entry is None:
+            return None
+        if entry[1] is None:
+            entry[1] = IntervalIndex(entry[0])
+        return entry[1]
+
+    def add_event(self, household, member, start, end, title=None, event_id=None):
+        event = Event(event_id or uuid.uuid4().hex, member, to_epoch(start), to_epoch(end), title)
+        if event.end <= event.start:
+            raise ValueError('Event must end after it starts')
+        self.remove_event(household, event.event_id)
+        self._backend.put(household, event)
+        entry = self._members(household).setdefault(member, [[], None])
+        entry[0].append(event)
+        entry[1] = None
+        return event
+
+    def remove_event(self, household, event_id):
+        for entry in self._members(household).values():
+            kept = [event for event in entry[0] if event.event_id != event_id]
+            if len(kept) != len(entry[0]):
+                self._backend.delete(household, event_id)
+                entry[0] = kept
+                entry[1] = None
+                return True
+        return False
+
+    def refresh(self, household=None):
+        """
+        Drop cached events so they are reloaded from the backend on next use.
+        """
+        if household is None:
+            self._households.clear()
+        else:
+            self._households.pop(household, None)
+
+    def conflicts(self, household, members, start, end):
+        """
+        Events of any of members overlapping [start, end), ordered by start.
+        """
+        start, end = to_epoch(start), to_epoch(end)
+        found = []
+        for member in members:
+            index = self._index(household, member)
+            if index is not None:
+                found.extend(index.overlapping(start, end))
+        found.sort(key=lambda event: (event.start, event.end))
+        return found
+
+    def busy(self, household, members, start, end):
+        """
+        Merged (start, end) epoch second intervals, clipped to [start, end), during which any of members is busy.
+        """
+        start, end = to_epoch(start), to_epoch(end)
+        merged = []
+        for event in self.conflicts(household, members, start, end):
+            interval_start, interval_end = max(event.start, start), min(event.end, end)
+            if merged and interval_start <= merged[-1][1]:
+                if interval_end > merged[-1][1]:
+                    merged[-1][1] = interval_end
+            else:
+                merged.append([interval_start, interval_end])
+        return [tuple(interval) for interval in merged]
+
+    def free_slots(self, household, members, start, end, minutes):
+        """
+        (start, end) datetimes of every gap of at least minutes in [start, end) when all members are free.
+        """
+        tz = start.tzinfo if isinstance(start, datetime.datetime) and start.tzinfo else None
+        start, end = to_epoch(start), to_epoch(end)
+        needed = minutes * 60
+        slots = []
+        cursor = start
+        for busy_start, busy_end in self.busy(household, members, start, end) + [(end, end)]:
+            if busy_start - cursor >= needed:
+                slots.append((from_epoch(cursor, tz), from_epoch(busy_start, tz)))
+            cursor = max(cursor, busy_end)
+        return slots
+
+    def free_mask(self, household, members, date, tz=None):
+        """
+        motherbot.availability bitmap of the half hours on date (in tz, the household zone by default) that no
+        event of any of members touches.  Slots go by the wall clock, so on a day the clocks change the day runs to
+        the next local midnight rather than for 24 hours.
+        """
+        tz = tz or clock.HOUSEHOLD_TIMEZONE
+        day_start = datetime.datetime.combine(date, datetime.time(), tzinfo=tz)
+        day_end = datetime.datetime.combine(date + datetime.timedelta(days=1), datetime.time(), tzinfo=tz)
+        busy = 0
+        for busy_start, busy_end in self.busy(household, members, day_start, day_end):
+            first = _wall_slot(from_epoch(busy_start, tz), date, False)
+            last = _wall_slot(from_epoch(busy_end, tz), date, True)
+            if last > first:
+                busy |= ((1 << (last - first)) - 1) << first
+        return availability.FULL_DAY & ~busy
+
+    def availability(self, household, members, first_date, last_date, tz=None):
+        """
+        An availability.AvailabilityCalendar holding each of members' free_mask for every date from first_date to
+        last_date inclusive, for queries across members and days (free_starts, free_range).
+        """
+        calendar = availability.AvailabilityCalendar()
+        date = first_date
+        while date <= last_date:
+            for member in members:
+                calendar.set_day(member, date, self.free_mask(household, [member], date, tz))
+            date += datetime.timedelta(days=1)
+        return calendar
+
+
+def _wall_slot(moment, date, round_up):
+    """
+    Index of the slot moment falls in on date's wall clock, or of the next one if round_up and it is not on a boundary.
+    """
+    if moment.date() > date:
+        return availability.SLOTS_PER_DAY
+    seconds = moment.hour * 3600 + moment.minute * 60 + moment.second
+    slot_seconds = availability.SLOT_MINUTES * 60
+    return -(-seconds // slot_seconds) if round_up else seconds // slot_seconds
+
+
+_shared = None
+
+
+def shared():
+    """
+    The container-wide calendar over the backend named by CALENDAR_STORE, created on first use.
+    """
+    global _shared
+    if _shared is None:
+        _shared = HouseholdCalendar(backend_from_env())
+    return _shared
@@ -0,0 +1,110 @@
+"""
+Slot values a user resolved recently, carried over to their next requests so they are not asked for them again.
+
+Approved values of the slots naming a friend (Calling, FriendHouse), a place (PublicPlaces) or an event (Events,
+Movies, Concerts) are remembered per Lex userId.  When a later CanICall, CanIGOTO or CanISee turn arrives with none
+of its subject slots filled, the handler offers the entity the user resolved most recently ('Do you mean Sam's
+house?') instead of asking from scratch, even when that entity came from a different intent ('Can I call Sam' then
+'Can I go over there').  Nothing is filled in unless the user says yes.
+
+Entries expire CARRY_OVER_TTL_SECONDS after they were resolved: 300 by default, the bot's idleSessionTTLInSeconds
+(config/bot.json), so a value is only carried while the conversation it came from could still be going on.  Set it
+to 0 to turn carry-over off.  Entries are held per warm container in an LRU of at most CARRY_OVER_USERS users; a user
+whose next turn lands on another container is simply asked again.
+"""
+
+import collections
+import os
+import threading
+import time
+
+TTL_SECONDS = float(os.environ.get('CARRY_OVER_TTL_SECONDS', '300'))
+MAX_USERS = int(os.environ.get('CARRY_OVER_USERS', '4096'))
+
+SLOT_ENTITIES = {
+    'Calling': 'friend',
+    'FriendHouse': 'friend',
+    'PublicPlaces': 'place',
+    'Events': 'event',
+    'Movies': 'event',
+    'Concerts': 'event',
+}
+
+Entry = collections.namedtuple('Entry', ['value', 'slot', 'resolved_at'])
+
+_shared = None
+
+
+class CarryOver(object):
+    """
+    Recently resolved entities by user, each entity holding the last value resolved for it and the slot it came from.
+    """
+
+    def __init__(self, ttl=TTL_SECONDS, size=MAX_USERS, clock=time.monotonic):
+        self._ttl = ttl
+        self._size = size
+        self._clock = clock
+        self._users = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.recalled = 0
+
+    def remember(self, user_id, slots):
+        """
+        Record the carried slots among slots, a dict of slot name to the value the handler accepted.
+        """
+        if self._ttl <= 0:
+            return
+        now = self._clock()
+        with self._lock:
+            entities = self._users.pop(user_id, None) or {}
+            for slot, value in slots.items():
+                entity = SLOT_ENTITIES.get(slot)
+                if entity and value:
+                    entities[entity] = Entry(value, slot, now)
+            if entities:
+                self._users[user_id] = entities
+                while len(self._users) > self._size:
+                    self._users.popitem(last=False)
+
+    def recall(self, user_id, slot_names):
+        """
+        (slot, value) to pre-fill for the user's most recently resolved entity one of slot_names takes, or None.
+
+        The value goes back into the slot it was resolved from when slot_names has it, otherwise into the first of
+        slot_names taking the same entity.
+        """
+        now = self._clock()
+        with self._lock:
+            entities = self._users.get(user_id)
+            if not entities:
+                return None
+            best = None
+            for slot in slot_names:
+                entry = entities.get(SLOT_ENTITIES.get(slot))
+                if entry is None or now - entry.resolved_at >= self._ttl:
+                    continue
+                if best is None or entry.resolved_at > best[1].resolved_at:
+                    best = (slot, entry)
+            if best is None:
+                return None
+            self._users.move_to_end(user_id)
+            self.recalled += 1
+        slot, entry = best
+        return (entry.slot if entry.slot in slot_names else slot), entry.value
+
+    def forget(self, user_id):
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def __len__(self):
+        return len(self._users)
+
+
+def shared():
+    """
+    The container-wide carry-over cache, created on first use.
+    """
+    global _shared
+    if _shared is None:
+        _shared = CarryOver()
+    return _shared
@@ -0,0 +1,32 @@
+"""
+Immutable catalog of the values the booking validators and pricing accept.
+
+Everything here is built once at import time.  Membership checks go through frozensets and positions through
+read-only dicts, so validating a slot or pricing a reservation never rebuilds a list or scans one.
+"""
+
+from types import MappingProxyType
+
+CITIES = frozenset([
+    'new york', 'los angeles', 'chicago', 'houston', 'philadelphia', 'phoenix', 'san antonio', 'san diego', 'dallas',
+    'san jose', 'austin', 'jacksonville', 'san francisco', 'indianapolis', 'columbus', 'fort worth', 'charlotte',
+    'detroit', 'el paso', 'seattle', 'denver', 'washington dc', 'memphis', 'boston', 'nashville', 'baltimore',
+    'portland'
+])
+
+# Order matters: pricing is derived from each type's position.
+CAR_TYPES = ('economy', 'standard', 'midsize', 'full size', 'minivan', 'luxury')
+ROOM_TYPES = ('queen', 'king', 'deluxe')
+
+CAR_TYPE_INDEX = MappingProxyType({car_type: index for index, car_type in enumerate(CAR_TYPES)})
+ROOM_TYPE_INDEX = MappingProxyType({room_type: index for index, room_type in enumerate(ROOM_TYPES)})
+
+APPOINTMENT_DURATIONS = MappingProxyType({'cleaning': 30, 'root canal': 60, 'whitening': 30})
+
+
+def location_cost(location):
+    """
+    Sum of each character's offset from 'a' in the lower-cased location, the basis of every location surcharge.
+    """
+    lowered = location.lower()
+    return sum(map(ord, lowered)) - 97 * len(lowered)
@@ -0,0 +1,59 @@
+"""
+Household wall-clock time for the code hooks.
+
+Lex hands us calendar dates without a zone, and whether a date is "today" depends on where the household lives.
+Instead of rewriting the process-wide TZ variable and calling time.tzset() on every invocation, the household zone
+is resolved once per container when this module is imported and passed explicitly to the datetime calls that need
+it.  Set HOUSEHOLD_TIMEZONE on the function to serve a household outside America/New_York.
+"""
+
+import datetime
+import os
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # Python < 3.9 runtimes
+    from dateutil.tz import gettz as ZoneInfo
+
+DEFAULT_TIMEZONE = 'America/New_York'
+
+_zones = {}
+
+
+def get_timezone(name):
+    """
+    Return the tzinfo for an IANA zone name, loading each zone at most once per container.
+    """
+    zone = _zones.get(name)
+    if zone is None:
+        zone = ZoneInfo(name)
+        if zone is None:
+            raise ValueError('Unknown time zone {}'.format(name))
+        _zones[name] = zone
+    return zone
+
+
+HOUSEHOLD_TIMEZONE = get_timezone(os.environ.get('HOUSEHOLD_TIMEZONE', DEFAULT_TIMEZONE))
+
+
+def now(tz=None):
+    """
+    Return the current time as an aware datetime in tz, the household zone by default.
+    """
+    return datetime.datetime.now(tz or HOUSEHOLD_TIMEZONE)
+
+
+def today(tz=None):
+    """
+    Return the current calendar date in tz, the household zone by default.
+    """
+    return now(tz).date()
+
+
+def next_midnight(tz=None):
+    """
+    Return the POSIX timestamp of the next local midnight in tz, the household zone by default.
+    """
+    tz = tz or HOUSEHOLD_TIMEZONE
+    tomorrow = now(tz).date() + datetime.timedelta(days=1)
+    return datetime.datetime.combine(tomorrow, datetime.time(), tzinfo=tz).timestamp()
@@ -0,0 +1,393 @@
+"""
+Approved contacts directory for the household.
+
+Contacts are partitioned by household and held in memory per warm container.  Each household keeps a phone number
+index (numbers normalised to E.164), a trie over names and name words for prefix matches, and a trigram index for
+fuzzy matches, so resolving what a child said to an approved contact stays sub-millisecond with hundreds of contacts.
+
+The contacts themselves live in a backend (InMemoryContactsBackend, or SQLiteContactsBackend chosen with
+CONTACTS_STORE='sqlite:<path>').  Backends number every change, so after the initial load a household is refreshed
+by applying only the changes made since its cursor, at most every CONTACTS_REFRESH_SECONDS.
+
+CanICall only holds callees to the directory when CONTACTS_STORE is set (see configured).  Without it each container
+starts with an empty in-memory directory, so calls pass through as they did before the directory existed.
+"""
+
+import collections
+import os
+import re
+import threading
+import time
+import uuid
+
+from motherbot.lazy import lazy_import
+
+sqlite3 = lazy_import('sqlite3')
+
+STORE = os.environ.get('CONTACTS_STORE')
+REFRESH_SECONDS = float(os.environ.get('CONTACTS_REFRESH_SECONDS', '60'))
+DEFAULT_COUNTRY_CODE = os.environ.get('DEFAULT_COUNTRY_CODE', '1')
+FUZZY_THRESHOLD = 0.5
+
+Contact = collections.namedtuple('Contact', ['contact_id', 'name', 'phone', 'approved'])
+
+# How resolve matched: the query was a phone number, a whole name, a unique prefix, or a close misspelling.
+Match = collections.namedtuple('Match', ['contact', 'kind', 'score'])
+
+_NON_DIGITS = re.compile(r'\D')
+_NAME_NOISE = re.compile(r"[^\w\s]")
+
+
+def normalize_phone(raw, country_code=None):
+    """
+    Normalise a phone number to E.164 ('+12014317268'), raising ValueError if it cannot be one.
+
+    Numbers without a country code are taken to be in country_code (DEFAULT_COUNTRY_CODE, '1', by default).
+    """
+    value = raw.strip()
+    digits = _NON_DIGITS.sub('', value)
+    if value.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    else:
+        country_code = country_code or DEFAULT_COUNTRY_CODE
+        if country_code == '1' and len(digits) == 11 and digits.startswith('1'):
+            pass
+        else:
+            digits = country_code + digits.lstrip('0')
+
+    if not 8 <= len(digits) <= 15 or digits.startswith('0'):
+        raise ValueError('{} is not a valid phone number'.format(raw))
+    return '+' + digits
+
+
+def normalize_name(name):
+    return ' '.join(_NAME_NOISE.sub(' ', name.lower()).split())
+
+
+def trigrams(text):
+    padded = '  {} '.format(text)
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+class _Trie(object):
+    """
+    Prefix tree whose nodes record the ids of every contact with a key under them.
+    """
+
+    __slots__ = ('_root',)
+
+    def __init__(self):
+        self._root = ({}, set())
+
+    def add(self, key, contact_id):
+        node = self._root
+        for char in key:
+            node = node[0].setdefault(char, ({}, set()))
+            node[1].add(contact_id)
+
+    def remove(self, key, contact_id):
+        node = self._root
+        for char in key:
+            node = node[0].get(char)
+            if node is None:
+                return
+            node[1].discard(contact_id)
+
+    def prefixed(self, prefix):
+        node = self._root
+        for char in prefix:
+            node = node[0].get(char)
+            if node is None:
+                return set()
+        return node[1]
+
+
+class HouseholdContacts(object):
+    """
+    Indexed contacts of one household.
+    """
+
+    def __init__(self):
+        self.contacts = {}
+        self._by_phone = {}
+        self._by_name = {}
+        self._names = _Trie()
+        self._grams = {}
+        self._gram_counts = {}
+        self.cursor = 0
+        self.refreshed = 0.0
+
+    def _keys(self, contact):
+        name = normalize_name(contact.name)
+        words = name.split()
+        return name, set(words) | {name}
+
+    def put(self, contact):
+        self.remove(contact.contact_id)
+        self.contacts[contact.contact_id] = contact
+        if contact.phone:
+            self._by_phone[contact.phone] = contact.contact_id
+        name, keys = self._keys(contact)
+        self._by_name.setdefault(name, set()).add(contact.contact_id)
+        for key in keys:
+            self._names.add(key, contact.contact_id)
+        grams = trigrams(name)
+        self._gram_counts[contact.contact_id] = len(grams)
+        for gram in grams:
+            self._grams.setdefault(gram, set()).add(contact.contact_id)
+
+    def remove(self, contact_id):
+        contact = self.contacts.pop(contact_id, None)
+        if contact is None:
+            return
+        if contact.phone and self._by_phone.get(contact.phone) == contact_id:
+            del self._by_phone[contact.phone]
+        name, keys = self._keys(contact)
+        self._by_name.get(name, set()).discard(contact_id)
+        for key in keys:
+            self._names.remove(key, contact_id)
+        del self._gram_counts[contact_id]
+        for gram in trigrams(name):
+            self._grams.get(gram, set()).discard(contact_id)
+
+    def by_phone(self, raw):
+        try:
+            contact_id = self._by_phone.get(normalize_phone(raw))
+        except ValueError:
+            return None
+        return self.contacts.get(contact_id)
+
+    def by_prefix(self, prefix):
+        return [self.contacts[contact_id] for contact_id in self._names.prefixed(normalize_name(prefix))]
+
+    def fuzzy(self, text, threshold=FUZZY_THRESHOLD):
+        """
+        Contacts whose name shares enough trigrams with text, best first, as (contact, Dice coefficient) pairs.
+        """
+        grams = trigrams(normalize_name(text))
+        shared = collections.Counter()
+        for gram in grams:
+            shared.update(self._grams.get(gram, ()))
+
+        scored = []
+        for contact_id, count in shared.items():
+            score = 2.0 * count / (len(grams) + self._gram_counts[contact_id])
+            if score >= threshold:
+                scored.append((self.contacts[contact_id], score))
+        scored.sort(key=lambda pair: -pair[1])
+        return scored
+
+    def resolve(self, query):
+        """
+        Best single match for what the user said, or None when nothing (or nothing unambiguous) matches.
+        """
+        if _NON_DIGITS.sub('', query) and len(_NON_DIGITS.sub('', query)) >= 7:
+            contact = self.by_phone(query)
+            if contact:
+                return Match(contact, 'phone', 1.0)
+
+        name = normalize_name(query)
+        exact = self._by_name.get(name)
+        if exact and len(exact) == 1:
+            return Match(self.contacts[next(iter(exact))], 'exact', 1.0)
+
+        prefixed = self._names.prefixed(name) if name else ()
+        if len(prefixed) == 1:
+            return Match(self.contacts[next(iter(prefixed))], 'prefix', 1.0)
+
+        candidates = self.fuzzy(name)
+        if candidates and (len(candidates) == 1 or candidates[0][1] > candidates[1][1]):
+            return Match(candidates[0][0], 'fuzzy', candidates[0][1])
+        return None
+
+
+""" --- Backends --- """
+
+
+class InMemoryContactsBackend(object):
+    """
+    Contacts kept in process, with a change log so readers can refresh incrementally.
+    """
+
+    def __init__(self):
+        self._version = 0
+        self._changes = {}
+
+    def save(self, household, contact):
+        self._version += 1
+        self._changes.setdefault(household, {})[contact.contact_id] = (self._version, contact)
+
+    def delete(self, household, contact_id):
+        self._version += 1
+        self._changes.setdefault(household, {})[contact_id] = (self._version, None)
+
+    def changes(self, household, cursor):
+        """
+        Return ([(contact_id, contact or None when deleted)], new cursor) for changes after cursor.
+        """
+        changed = sorted(
+            (version, contact_id, contact) for contact_id, (version, contact) in self._changes.get(household, {}).items()
+            if version > cursor
+        )
+        if not changed:
+            return [], cursor
+        return [(contact_id, contact) for _, contact_id, contact in changed], changed[-1][0]
+
+
+class SQLiteContactsBackend(object):
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS contacts ('
+            ' household TEXT NOT NULL, contact_id TEXT NOT NULL, name TEXT, phone TEXT, approved INTEGER,'
+            ' deleted INTEGER NOT NULL DEFAULT 0, version INTEGER NOT NULL,'
+            ' PRIMARY KEY (household, contact_id))'
+        )
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS contacts_household_version ON contacts (household, version)'
+        )
+
+    def _write(self, statement, parameters):
+        """
+        Run statement with the next version appended to parameters.  The version is taken inside the write
+        transaction, so writers commit in version order and a reader's cursor never passes a change still to land.
+        """
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            try:
+                version = self._connection.execute('SELECT COALESCE(MAX(version), 0) + 1 FROM contacts').fetchone()[0]
+                self._connection.execute(statement, parameters + (version,))
+            except Exception:
+                self._connection.execute('ROLLBACK')
+                raise
+            self._connection.execute('COMMIT')
+
+    def save(self, household, contact):
+        self._write(
+            'INSERT OR REPLACE INTO contacts (household, contact_id, name, phone, approved, deleted, version)'
+            ' VALUES (?, ?, ?, ?, ?, 0, ?)',
+            (household, contact.contact_id, contact.name, contact.phone, int(contact.approved))
+        )
+
+    def delete(self, household, contact_id):
+        self._write(
+            'UPDATE contacts SET deleted = 1, version = ?3 WHERE household = ?1 AND contact_id = ?2',
+            (household, contact_id)
+        )
+
+    def changes(self, household, cursor):
+        rows = self._connection.execute(
+            'SELECT contact_id, name, phone, approved, deleted, version FROM contacts'
+            ' WHERE household = ? AND version > ? ORDER BY version',
+            (household, cursor)
+        ).fetchall()
+        if not rows:
+            return [], cursor
+        changed = [
+            (contact_id, None if deleted else Contact(contact_id, name, phone, bool(approved)))
+            for contact_id, name, phone, approved, deleted, _ in rows
+        ]
+        return changed, rows[-1][-1]
+
+
+def configured():
+    """
+    True when CONTACTS_STORE names the directory to check callees against.
+    """
+    return STORE is not None
+
+
+def backend_from_env():
+    spec = STORE or 'memory'
+    kind, _, target = spec.partition(':')
+    if kind == 'memory':
+        return InMemoryContactsBackend()
+    if kind == 'sqlite':
+        return SQLiteContactsBackend(target)
+    raise ValueError('Unsupported CONTACTS_STORE {}'.format(spec))
+
+
+""" --- Directory --- """
+
+
+class ContactDirectory(object):
+    """
+    Per household contact indexes over a backend, refreshed incrementally.
+    """
+
+    def __init__(self, backend, refresh_seconds=REFRESH_SECONDS, clock=time.monotonic):
+        self._backend = backend
+        self._refresh_seconds = refresh_seconds
+        self._clock = clock
+        self._households = {}
+
+    def household(self, household):
+        """
+        The indexed contacts of household, loaded on first use and brought up to date when they are stale.
+        """
+        contacts = self._households.get(household)
+        now = self._clock()
+        if contacts is None:
+            contacts = self._households[household] = HouseholdContacts()
+            self._apply(household, contacts, now)
+        elif now - contacts.refreshed >= self._refresh_seconds:
+            self._apply(household, contacts, now)
+        return contacts
+
+    def _apply(self, household, contacts, now):
+        changed, contacts.cursor = self._backend.changes(household, contacts.cursor)
+        for contact_id, contact in changed:
+            if contact is None:
+                contacts.remove(contact_id)
+            else:
+                contacts.put(contact)
+        contacts.refreshed = now
+
+    def add(self, household, name, phone, approved=True, contact_id=None):
+        contact = Contact(contact_id or uuid.uuid4().hex, name, normalize_phone(phone) if phone else None, approved)
+        self._backend.save(household, contact)
+        cached = self._households.get(household)
+        if cached is not None:
+            self._apply(household, cached, self._clock())
+        return contact
+
+    def approve(self, household, contact_id):
+        """
+        Mark a contact approved, returning it, or None when the household has no such contact.
+        """
+        contact = self.household(household).contacts.get(contact_id)
+        if contact is None:
+            return None
+        contact = contact._replace(approved=True)
+        self._backend.save(household, contact)
+        self._apply(household, self._households[household], self._clock())
+        return contact
+
+    def remove(self, household, contact_id):
+        self._backend.delete(household, contact_id)
+        cached = self._households.get(household)
+        if cached is not None:
+            self._apply(household, cached, self._clock())
+
+    def resolve(self, household, query):
+        return self.household(household).resolve(query)
+
+    def is_approved(self, household, query):
+        match = self.resolve(household, query)
+        return match is not None and match.contact.approved
+
+
+_shared = None
+
+
+def shared():
+    """
+    The container-wide directory over the backend named by CONTACTS_STORE, created on first use.
+    """
+    global _shared
+    if _shared is None:
+        _shared = ContactDirectory(backend_from_env())
+    return _shared
@@ -0,0 +1,7 @@
+"""
+Code both Lex code hooks share, split so that each handler imports only what it uses.
+
+    motherbot.core.helpers   int and date conversions, try_ex
+    motherbot.core.dialog    the dialog action builders and validation results
+    motherbot.core.travel    car rental and hotel pricing and slot validation (BookTrip)
+"""
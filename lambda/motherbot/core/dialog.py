@@ -0,0 +1,23 @@
+"""
+Helpers to build responses which match the structure of the necessary dialog actions.
+
+The builders live in motherbot.responses, which interns constant prompts and serialises responses from templates.
+"""
+
+from motherbot import responses
+
+elicit_slot = responses.elicit_slot
+confirm_intent = responses.confirm_intent
+close = responses.close
+delegate = responses.delegate
+build_response_card = responses.response_card
+
+VALID = {'isValid': True}
+
+
+def build_validation_result(is_valid, violated_slot, message_content):
+    return {
+        'isValid': is_valid,
+        'violatedSlot': violated_slot,
+        'message': responses.message(message_content)
+    }
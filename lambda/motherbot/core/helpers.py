@@ -0,0 +1,52 @@
+"""
+Small conversions used by the intent handlers.
+"""
+
+import datetime
+
+from motherbot.dates import DateMemo, parse_date
+
+
+def safe_int(n):
+    """
+    Safely convert n value to int.
+    """
+    if n is not None:
+        return int(n)
+    return n
+
+
+def parse_int(n):
+    try:
+        return int(n)
+    except ValueError:
+        return float('nan')
+
+
+def try_ex(func):
+    """
+    Call passed in function in try block. If KeyError is encountered return None.
+    This function is intended to be used to safely access dictionary.
+
+    Note that this function would have negative impact on performance.
+    """
+
+    try:
+        return func()
+    except KeyError:
+        return None
+
+
+def isvalid_date(date, dates=None):
+    return (dates or DateMemo()).parse(date) is not None
+
+
+def get_day_difference(later_date, earlier_date, dates=None):
+    dates = dates or DateMemo()
+    return abs(dates.parse(later_date) - dates.parse(earlier_date)).days
+
+
+def add_days(date, number_of_days):
+    new_date = parse_date(date)
+    new_date += datetime.timedelta(days=number_of_days)
+    return new_date.strftime('%Y-%m-%d')
@@ -0,0 +1,91 @@
+"""
+Car rental and hotel reservations: pricing and slot validation for the BookTrip intents.
+"""
+
+from motherbot import catalog, metrics, pricing, validation
+from motherbot.core.dialog import VALID, build_validation_result
+
+
+@metrics.timed('pricing')
+def generate_car_price(location, days, age, car_type):
+    """
+    Generates a number within a reasonable range that might be expected for a flight.
+    The price is fixed for a given pair of locations.
+    """
+
+    return pricing.car_price(location, days, age, car_type)
+
+
+@metrics.timed('pricing')
+def generate_hotel_price(location, nights, room_type):
+    """
+    Generates a number within a reasonable range that might be expected for a hotel.
+    The price is fixed for a pair of location and roomType.
+    """
+
+    return pricing.hotel_price(location, nights, room_type)
+
+
+def isvalid_car_type(car_type):
+    return car_type.lower() in catalog.CAR_TYPE_INDEX
+
+
+def isvalid_city(city):
+    return city.lower() in catalog.CITIES
+
+
+def isvalid_room_type(room_type):
+    return room_type.lower() in catalog.ROOM_TYPE_INDEX
+
+
+BOOK_CAR_RULES = [
+    validation.member(
+        'PickUpCity', catalog.CITIES,
+        'We currently do not support {} as a valid destination.  Can you try a different city?'
+    ),
+    validation.date('PickUpDate', 'I did not understand your departure date.  When would you like to pick up your car rental?'),
+    validation.future('PickUpDate', 'Reservations must be scheduled at least one day in advance.  Can you try a different date?'),
+    validation.date('ReturnDate', 'I did not understand your return date.  When would you like to return your car rental?'),
+    validation.after(
+        'ReturnDate', 'PickUpDate',
+        'Your return date must be after your pick up date.  Can you try a different return date?'
+    ),
+    validation.within_days(
+        'ReturnDate', 'PickUpDate', 30,
+        'You can reserve a car for up to thirty days.  Can you try a different return date?'
+    ),
+    validation.int_range(
+        'DriverAge', 18, None,
+        'Your driver must be at least eighteen to rent a car.  Can you provide the age of a different driver?'
+    ),
+    validation.member(
+        'CarType', catalog.CAR_TYPES,
+        'I did not recognize that model.  What type of car would you like to rent?  '
+        'Popular cars are economy, midsize, or luxury'
+    ),
+]
+
+BOOK_HOTEL_RULES = [
+    validation.member(
+        'Location', catalog.CITIES,
+        'We currently do not support {} as a valid destination.  Can you try a different city?'
+    ),
+    validation.date('CheckInDate', 'I did not understand your check in date.  When would you like to check in?'),
+    validation.future('CheckInDate', 'Reservations must be scheduled at least one day in advance.  Can you try a different date?'),
+    validation.int_range(
+        'Nights', 1, 30,
+        'You can make a reservations for from one to thirty nights.  How many nights would you like to stay for?'
+    ),
+    validation.member(
+        'RoomType', catalog.ROOM_TYPES,
+        'I did not recognize that room type.  Would you like to stay in a queen, king, or deluxe room?'
+    ),
+]
+
+# Compiled once per container; see motherbot.validation.
+validate_book_car = metrics.timed('validate_book_car')(
+    validation.compile_validator('validate_book_car', BOOK_CAR_RULES, build_validation_result, VALID.copy)
+)
+validate_hotel = metrics.timed('validate_hotel')(
+    validation.compile_validator('validate_hotel', BOOK_HOTEL_RULES, build_validation_result, VALID.copy)
+)
@@ -0,0 +1,55 @@
+"""
+Date slot parsing shared by the validators.
+
+Lex normalises AMAZON.DATE slot values to YYYY-MM-DD, so parse_date tries date.fromisoformat first and only falls
+back to dateutil (loaded on first use) for anything else.  DateMemo wraps parse_date for the lifetime of a single
+request so that a slot value consulted by several checks is parsed exactly once.
+"""
+
+import datetime
+
+from motherbot.lazy import lazy_import
+
+dateutil_parser = lazy_import('dateutil.parser')
+
+ISO_DATE_LENGTH = len('YYYY-MM-DD')
+
+
+def parse_date(value):
+    """
+    Parse a slot value into a datetime.date, raising ValueError if it is not a date.
+    """
+    if len(value) == ISO_DATE_LENGTH:
+        try:
+            return datetime.date.fromisoformat(value)
+        except ValueError:
+            pass
+
+    try:
+        return dateutil_parser.parse(value).date()
+    except OverflowError as e:
+        raise ValueError(str(e))
+
+
+class DateMemo(object):
+    """
+    Per request memo of parsed slot values.  parse returns None for values which are not dates.
+    """
+
+    __slots__ = ('_parsed',)
+
+    def __init__(self):
+        self._parsed = {}
+
+    def parse(self, value):
+        try:
+            return self._parsed[value]
+        except KeyError:
+            pass
+
+        try:
+            parsed = parse_date(value)
+        except ValueError:
+            parsed = None
+        self._parsed[value] = parsed
+        return parsed
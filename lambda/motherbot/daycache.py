@@ -0,0 +1,57 @@
+"""
+A cache of values that stay the same for the rest of the household's day.
+
+Response card options such as "the next five weekdays" only change when the date does, so a warm container can build
+them once a day instead of on every elicitation.  DayCache holds such values until the next local midnight in the
+household time zone and then drops them all at once.  Checking for expiry is one comparison against time.time(), so
+lookups never touch the time zone database; the next midnight is only worked out again when the day rolls over.
+
+Cached values are shared by every invocation that reads them, so callers must not modify them.  The cache holds at
+most max_entries values and starts over when it is full; keys that vary with user input should be bounded by what
+the input can be.
+"""
+
+import time
+
+from motherbot import clock
+
+
+class DayCache(object):
+    def __init__(self, max_entries=256, tz=None, timer=time.time, midnight=clock.next_midnight):
+        self._max_entries = max_entries
+        self._tz = tz
+        self._timer = timer
+        self._midnight = midnight
+        self._entries = {}
+        self._expires = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        """
+        The value cached under key today, or build() cached under it.
+        """
+        if self._timer() >= self._expires:
+            self._entries.clear()
+            self._expires = self._midnight(self._tz)
+        try:
+            value = self._entries[key]
+        except KeyError:
+            pass
+        else:
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = build()
+        if len(self._entries) >= self._max_entries:
+            self._entries.clear()
+        self._entries[key] = value
+        return value
+
+    def clear(self):
+        self._entries.clear()
+        self._expires = 0.0
+
+    def __len__(self):
+        return len(self._entries)
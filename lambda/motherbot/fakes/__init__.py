@@ -0,0 +1,6 @@
+"""
+In-process stand-ins for the AWS and third party services the code hooks talk to.
+
+They implement just enough of each service's interface for the motherbot modules to run against them locally and in
+the replay harness.  Nothing here is needed in a deployed function.
+"""
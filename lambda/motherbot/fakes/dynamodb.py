@@ -0,0 +1,142 @@
+"""
+Local stand-in for a DynamoDB table accessed through the boto3 Table resource.
+
+Supports put_item (with an attribute_not_exists ConditionExpression), update_item ('SET a = :a, #b = :b', with a
+ConditionExpression of attribute_exists/attribute_not_exists terms joined by AND), get_item, delete_item, query on the
+partition key (KeyConditionExpression of the form 'attr = :value') with Limit/ExclusiveStartKey pagination, and scan.  Numbers come back as Decimal, as they do from
+boto3.
+"""
+
+import copy
+import re
+from decimal import Decimal
+
+_CONDITION = re.compile(r'^\s*#?(\w+)\s*=\s*(:\w+)\s*$')
+_NOT_EXISTS = re.compile(r'^\s*attribute_not_exists\(\s*(\w+)\s*\)\s*$')
+_EXISTS_TERM = re.compile(r'^\s*attribute_(not_)?exists\(\s*(#?\w+)\s*\)\s*$')
+_SET_CLAUSE = re.compile(r'^\s*(#?\w+)\s*=\s*(:\w+)\s*$')
+
+
+class ConditionalCheckFailedException(Exception):
+    """
+    Raised like botocore's ClientError, with the error code under response['Error']['Code'].
+    """
+
+    def __init__(self):
+        super(ConditionalCheckFailedException, self).__init__('The conditional request failed')
+        self.response = {'Error': {'Code': 'ConditionalCheckFailedException'}}
+
+
+def _to_dynamo(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (int, float)):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {key: _to_dynamo(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_to_dynamo(item) for item in value]
+    return value
+
+
+class FakeDynamoTable(object):
+    """
+    A table keyed on partition_key and, optionally, sort_key.
+    """
+
+    def __init__(self, name, partition_key, sort_key=None):
+        self.name = name
+        self.partition_key = partition_key
+        self.sort_key = sort_key
+        self._partitions = {}
+        self.calls = []
+
+    def _key(self, item):
+        return item[self.sort_key] if self.sort_key else None
+
+    def put_item(self, Item, ConditionExpression=None):
+        self.calls.append('put_item')
+        item = _to_dynamo(copy.deepcopy(Item))
+        if ConditionExpression is not None:
+            match = _NOT_EXISTS.match(ConditionExpression)
+            if not match:
+                raise ValueError('Unsupported ConditionExpression: {}'.format(ConditionExpression))
+            existing = self._partitions.get(item[self.partition_key], {}).get(self._key(item))
+            if existing is not None and match.group(1) in existing:
+                raise ConditionalCheckFailedException()
+        self._partitions.setdefault(item[self.partition_key], {})[self._key(item)] = item
+        return {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeValues, ConditionExpression=None,
+                    ExpressionAttributeNames=None):
+        self.calls.append('update_item')
+        names = ExpressionAttributeNames or {}
+        partition = self._partitions.setdefault(Key[self.partition_key], {})
+        existing = partition.get(self._key(Key))
+        if ConditionExpression is not None:
+            for term in re.split(r'\s+AND\s+', ConditionExpression):
+                match = _EXISTS_TERM.match(term)
+                if not match:
+                    raise ValueError('Unsupported ConditionExpression: {}'.format(ConditionExpression))
+                present = existing is not None and names.get(match.group(2), match.group(2)) in existing
+                if present == bool(match.group(1)):
+                    raise ConditionalCheckFailedException()
+
+        if not UpdateExpression.startswith('SET '):
+            raise ValueError('Unsupported UpdateExpression: {}'.format(UpdateExpression))
+        item = existing if existing is not None else _to_dynamo(copy.deepcopy(Key))
+        for clause in UpdateExpression[4:].split(','):
+            match = _SET_CLAUSE.match(clause)
+            if not match:
+                raise ValueError('Unsupported UpdateExpression: {}'.format(UpdateExpression))
+            item[names.get(match.group(1), match.group(1))] = _to_dynamo(ExpressionAttributeValues[match.group(2)])
+        partition[self._key(Key)] = item
+        return {}
+
+    def get_item(self, Key):
+        self.calls.append('get_item')
+        item = self._partitions.get(Key[self.partition_key], {}).get(self._key(Key))
+        return {'Item': copy.deepcopy(item)} if item is not None else {}
+
+    def delete_item(self, Key):
+        self.calls.append('delete_item')
+        self._partitions.get(Key[self.partition_key], {}).pop(self._key(Key), None)
+        return {}
+
+    def query(self, KeyConditionExpression, ExpressionAttributeValues, ExpressionAttributeNames=None, Limit=None,
+              ExclusiveStartKey=None):
+        self.calls.append('query')
+        match = _CONDITION.match(KeyConditionExpression)
+        if not match:
+            raise ValueError('Unsupported KeyConditionExpression: {}'.format(KeyConditionExpression))
+        attribute = (ExpressionAttributeNames or {}).get('#' + match.group(1), match.group(1))
+        if attribute != self.partition_key:
+            raise ValueError('Query condition must be on the partition key {}'.format(self.partition_key))
+
+        partition = self._partitions.get(ExpressionAttributeValues[match.group(2)], {})
+        return self._page(partition, Limit, ExclusiveStartKey)
+
+    def scan(self, Limit=None, ExclusiveStartKey=None):
+        self.calls.append('scan')
+        items = {}
+        for partition_value, partition in sorted(self._partitions.items()):
+            for sort_value, item in partition.items():
+                items[(partition_value, sort_value)] = item
+        return self._page(items, Limit, ExclusiveStartKey, composite=True)
+
+    def _page(self, items, limit, exclusive_start_key, composite=False):
+        keys = sorted(items, key=lambda key: (key is not None, key))
+        if exclusive_start_key is not None:
+            start = self._key(exclusive_start_key)
+            if composite:
+                start = (exclusive_start_key[self.partition_key], start)
+            keys = [key for key in keys if key > start]
+
+        page = keys[:limit] if limit else keys
+        response = {'Items': [copy.deepcopy(items[key]) for key in page], 'Count': len(page)}
+        if limit and len(keys) > limit:
+            last = items[page[-1]]
+            response['LastEvaluatedKey'] = {self.partition_key: last[self.partition_key]}
+            if self.sort_key:
+                response['LastEvaluatedKey'][self.sort_key] = last[self.sort_key]
+        return response
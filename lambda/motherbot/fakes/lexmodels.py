@@ -0,0 +1,79 @@
+"""
+Local stand-in for the Lex V1 model building API accessed through the boto3 'lex-models' client.
+
+Serves get_bot, get_intent and get_slot_type from bot definitions in the exportlexbot format (config/bot.json), each
+call optionally taking latency seconds like a network round trip.  With rate_limit set, calls beyond rate_limit in any
+one second fail with a ThrottlingException, as the service throttles; unknown names or versions fail with a
+NotFoundException.  Errors are raised like botocore's ClientError, with the code under response['Error']['Code'].
+Thread safe, and calls are counted per (operation, name, version) so callers can check what was fetched and how often.
+"""
+
+import collections
+import copy
+import threading
+import time
+
+
+class LexModelsError(Exception):
+    def __init__(self, code, message):
+        super(LexModelsError, self).__init__('{}: {}'.format(code, message))
+        self.response = {'Error': {'Code': code, 'Message': message}}
+
+
+class FakeLexModelsClient(object):
+    def __init__(self, definitions=(), latency=0.0, rate_limit=0, clock=time.monotonic):
+        self._latency = latency
+        self._rate_limit = rate_limit
+        self._clock = clock
+        self._recent = collections.deque()
+        self._bots = {}
+        self._intents = {}
+        self._slot_types = {}
+        self._lock = threading.Lock()
+        self.calls = collections.Counter()
+        for definition in definitions:
+            self.add_definition(definition)
+
+    def add_definition(self, definition):
+        """
+        Serve a bot export, including the intents and slot types under its dependencies.
+        """
+        definition = copy.deepcopy(definition)
+        dependencies = definition.pop('dependencies', {})
+        for intent in dependencies.get('intents', []):
+            self._intents[(intent['name'], intent['version'])] = intent
+        for slot_type in dependencies.get('slotTypes', []):
+            self._slot_types[(slot_type['name'], slot_type['version'])] = slot_type
+        self._bots[(definition['name'], definition['version'])] = definition
+
+    def _call(self, operation, store, name, version):
+        with self._lock:
+            self.calls[(operation, name, version)] += 1
+            throttled = False
+            if self._rate_limit:
+                # Calls accepted in the last second; throttled calls do not count against the limit.
+                now = self._clock()
+                while self._recent and self._recent[0] <= now - 1.0:
+                    self._recent.popleft()
+                throttled = len(self._recent) >= self._rate_limit
+                if not throttled:
+                    self._recent.append(now)
+        if self._latency:
+            time.sleep(self._latency)
+        if throttled:
+            raise LexModelsError('ThrottlingException', 'Rate exceeded')
+        found = store.get((name, version))
+        if found is None:
+            raise LexModelsError('NotFoundException', 'Could not find {} {} version {}'.format(operation, name, version))
+        response = copy.deepcopy(found)
+        response['ResponseMetadata'] = {'HTTPStatusCode': 200}
+        return response
+
+    def get_bot(self, name, versionOrAlias):
+        return self._call('get_bot', self._bots, name, versionOrAlias)
+
+    def get_intent(self, name, version):
+        return self._call('get_intent', self._intents, name, version)
+
+    def get_slot_type(self, name, version):
+        return self._call('get_slot_type', self._slot_types, name, version)
@@ -0,0 +1,109 @@
+"""
+Local stand-in for the Lex V1 runtime's PostText.
+
+FakeLexRuntimeServer listens on an ephemeral localhost port and accepts POST /bot/<bot>/alias/<alias>/user/<user>/text
+signed with Signature Version 4 (only the presence of the signature is checked), recording every text it is sent.
+Replies come from reply(bot, user_id, text), which by default echoes the text back as an ElicitIntent message.  It
+speaks HTTP/1.1 keep-alive so connection reuse can be observed through the connections counter, and handshake delays
+every new connection by that many seconds, standing in for the TCP and TLS setup a real endpoint costs.  Point
+LexRuntimeClient (or LEX_RUNTIME_URL) at server.url.
+
+    with FakeLexRuntimeServer(latency=0.02, handshake=0.03) as server:
+        client = LexRuntimeClient('us-east-1', 'AKID', 'secret', endpoint=server.url)
+"""
+
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_TEXT_PATH = re.compile(r'^/bot/([^/]+)/alias/([^/]+)/user/([^/]+)/text$')
+
+
+def echo(bot_name, user_id, text):
+    return {'dialogState': 'ElicitIntent', 'message': 'You said: {}'.format(text), 'messageFormat': 'PlainText'}
+
+
+class FakeLexRuntimeServer(object):
+    def __init__(self, reply=echo, latency=0.0, handshake=0.0):
+        self.reply = reply
+        self.latency = latency
+        self.handshake = handshake
+        self.texts = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self._server.server_address[1])
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-lex-runtime')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handler_class(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # Headers and body go out as two writes; with Nagle on, the body would wait out the client's delayed ACK.
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                BaseHTTPRequestHandler.setup(self)
+                with fake._lock:
+                    fake.connections += 1
+                if fake.handshake:
+                    time.sleep(fake.handshake)
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload, error_type=None):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                if error_type:
+                    self.send_header('x-amzn-ErrorType', error_type)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+                match = _TEXT_PATH.match(self.path)
+                if not match:
+                    return self._reply(404, {'message': 'Not found'}, 'NotFoundException')
+                if not (self.headers.get('Authorization') or '').startswith('AWS4-HMAC-SHA256 Credential=') \
+                        or not self.headers.get('X-Amz-Date'):
+                    return self._reply(
+                        403, {'message': 'Missing Authentication Token'}, 'MissingAuthenticationTokenException'
+                    )
+                if not payload.get('inputText'):
+                    return self._reply(400, {'message': 'inputText is required'}, 'BadRequestException')
+
+                if fake.latency:
+                    time.sleep(fake.latency)
+                bot_name, _, user_id = match.groups()
+                with fake._lock:
+                    fake.texts.append((user_id, payload['inputText'], payload.get('requestAttributes')))
+                self._reply(200, fake.reply(bot_name, user_id, payload['inputText']))
+
+        return Handler
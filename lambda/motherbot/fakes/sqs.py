@@ -0,0 +1,88 @@
+"""
+Local stand-in for an SQS queue accessed through the boto3 client.
+
+Supports create_queue, get_queue_url, send_message, receive_message (MaxNumberOfMessages, WaitTimeSeconds long
+polling and VisibilityTimeout) and delete_message.  Received messages that are not deleted become visible again once
+their visibility timeout runs out, as they do in SQS.  Thread safe, so a worker can long poll while the code hook
+sends.
+"""
+
+import collections
+import threading
+import time
+import uuid
+
+DEFAULT_VISIBILITY_TIMEOUT = 30
+
+
+class FakeSqsClient(object):
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._queues = {}
+        self._changed = threading.Condition()
+        self.calls = []
+
+    def create_queue(self, QueueName, Attributes=None):
+        url = 'https://sqs.local/000000000000/{}'.format(QueueName)
+        with self._changed:
+            if url not in self._queues:
+                visibility = int((Attributes or {}).get('VisibilityTimeout', DEFAULT_VISIBILITY_TIMEOUT))
+                # visible: deque of (message id, body); in_flight: receipt -> (visible again at, message id, body)
+                self._queues[url] = (collections.deque(), {}, visibility)
+        return {'QueueUrl': url}
+
+    def get_queue_url(self, QueueName):
+        url = 'https://sqs.local/000000000000/{}'.format(QueueName)
+        if url not in self._queues:
+            raise KeyError('The specified queue does not exist: {}'.format(QueueName))
+        return {'QueueUrl': url}
+
+    def send_message(self, QueueUrl, MessageBody):
+        self.calls.append('send_message')
+        message_id = str(uuid.uuid4())
+        with self._changed:
+            self._queues[QueueUrl][0].append((message_id, MessageBody))
+            self._changed.notify_all()
+        return {'MessageId': message_id}
+
+    def _requeue_expired(self, queue):
+        visible, in_flight, _ = queue
+        now = self._clock()
+        for receipt in [receipt for receipt, entry in in_flight.items() if entry[0] <= now]:
+            _, message_id, body = in_flight.pop(receipt)
+            visible.appendleft((message_id, body))
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0, VisibilityTimeout=None):
+        self.calls.append('receive_message')
+        deadline = time.monotonic() + WaitTimeSeconds
+        with self._changed:
+            queue = self._queues[QueueUrl]
+            visible, in_flight, default_visibility = queue
+            while True:
+                self._requeue_expired(queue)
+                if visible:
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return {}
+                self._changed.wait(min(remaining, 0.25))
+
+            visibility = default_visibility if VisibilityTimeout is None else VisibilityTimeout
+            messages = []
+            while visible and len(messages) < MaxNumberOfMessages:
+                message_id, body = visible.popleft()
+                receipt = uuid.uuid4().hex
+                in_flight[receipt] = (self._clock() + visibility, message_id, body)
+                messages.append({'MessageId': message_id, 'ReceiptHandle': receipt, 'Body': body})
+        return {'Messages': messages}
+
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        self.calls.append('delete_message')
+        with self._changed:
+            self._queues[QueueUrl][1].pop(ReceiptHandle, None)
+        return {}
+
+    def approximate_depth(self, QueueUrl):
+        with self._changed:
+            visible, in_flight, _ = self._queues[QueueUrl]
+            return len(visible) + len(in_flight)
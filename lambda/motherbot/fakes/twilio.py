@@ -0,0 +1,110 @@
+"""
+Local stand-in for the Twilio Messages API.
+
+FakeTwilioServer listens on an ephemeral localhost port and accepts
+POST /2010-04-01/Accounts/<sid>/Messages.json with HTTP basic auth, recording every message it is sent.  It speaks
+HTTP/1.1 keep-alive so connection reuse can be observed through the connections counter.  Point TwilioClient (or
+TWILIO_API_URL) at server.url.
+
+    with FakeTwilioServer('AC123', 'token') as server:
+        client = TwilioClient('AC123', 'token', api_url=server.url)
+"""
+
+import base64
+import json
+import re
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+_MESSAGES_PATH = re.compile(r'^/2010-04-01/Accounts/(\w+)/Messages\.json$')
+
+
+class FakeTwilioServer(object):
+    def __init__(self, account_sid, auth_token, latency=0.0, fail_next=()):
+        self.account_sid = account_sid
+        self.auth_token = auth_token
+        self.latency = latency
+        # Statuses to answer the next requests with instead of accepting them, e.g. [429] to exercise retries.
+        self.fail_next = list(fail_next)
+        self.messages = []
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}'.format(self._server.server_address[1])
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='fake-twilio')
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _handler_class(self):
+        fake = self
+        expected_auth = 'Basic ' + base64.b64encode(
+            '{}:{}'.format(self.account_sid, self.auth_token).encode('utf-8')
+        ).decode('ascii')
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                BaseHTTPRequestHandler.setup(self)
+                with fake._lock:
+                    fake.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                form = parse_qs(self.rfile.read(length).decode('utf-8'))
+                match = _MESSAGES_PATH.match(self.path)
+                if not match or match.group(1) != fake.account_sid:
+                    return self._reply(404, {'code': 20404, 'message': 'Not found'})
+                if self.headers.get('Authorization') != expected_auth:
+                    return self._reply(401, {'code': 20003, 'message': 'Authenticate'})
+
+                if fake.latency:
+                    threading.Event().wait(fake.latency)
+                with fake._lock:
+                    failure = fake.fail_next.pop(0) if fake.fail_next else None
+                if failure:
+                    return self._reply(failure, {'code': failure, 'message': 'Injected failure'})
+
+                message = {
+                    'sid': 'SM' + uuid.uuid4().hex,
+                    'to': form.get('To', [None])[0],
+                    'from': form.get('From', [None])[0],
+                    'body': form.get('Body', [None])[0],
+                    'status': 'queued',
+                }
+                with fake._lock:
+                    fake.messages.append(message)
+                self._reply(201, message)
+
+        return Handler
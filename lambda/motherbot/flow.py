@@ -0,0 +1,182 @@
+"""
+Table driven state machines for multi-turn dialog flows.
+
+A Flow declares the transitions of one intent's dialog the way IntentRouter declares handlers: each transition names
+the state it leaves, the confirmation status it answers, which slots must be filled or empty, the state it moves to
+and the function building the response.  The first time the flow runs, the transitions are compiled into a dict keyed
+on (state, confirmationStatus, filled slot bitmask), so a turn is one slot validation, one dict lookup and one
+response builder however many transitions the flow has.  Transitions are tried in the order they were declared and
+the first that matches wins; with stacked decorators that is the one nearest the function.
+
+The state is kept in a single session attribute holding the state's short name, and removed in the initial state so
+sessions at rest carry nothing.  A response builder may move the flow somewhere other than its transition's target
+by assigning turn.state.
+"""
+
+from motherbot import responses
+
+CONFIRMATION_STATUSES = ('None', 'Confirmed', 'Denied')
+INITIAL = ''
+STAY = object()
+
+
+class NoTransitionError(Exception):
+    """
+    Raised when a turn matches none of a flow's transitions.
+    """
+
+    def __init__(self, flow, key):
+        super(NoTransitionError, self).__init__('Flow {} has no transition for {}'.format(flow, key))
+        self.key = key
+
+
+class Transition(object):
+    __slots__ = ('state', 'confirmation', 'filled', 'empty', 'target', 'action')
+
+    def __init__(self, state, confirmation, filled, empty, target, action):
+        self.state = state
+        self.confirmation = confirmation
+        self.filled = filled
+        self.empty = empty
+        self.target = target
+        self.action = action
+
+    def matches(self, state, confirmation, mask):
+        return (self.state is None or state == self.state) \
+            and (self.confirmation is None or confirmation == self.confirmation) \
+            and mask & self.filled == self.filled and not mask & self.empty
+
+
+class Turn(object):
+    """
+    One DialogCodeHook invocation as seen by a flow's response builders.
+    """
+
+    __slots__ = ('request', 'intent_name', 'slots', 'session_attributes', 'confirmation_status', 'filled', 'state',
+                 'dates')
+
+    def __init__(self, request, session_attributes, state, filled, dates):
+        self.request = request
+        self.intent_name = request['currentIntent']['name']
+        self.slots = request['currentIntent']['slots']
+        self.session_attributes = session_attributes
+        self.confirmation_status = request['currentIntent']['confirmationStatus']
+        self.filled = filled
+        self.state = state
+        self.dates = dates
+
+
+class Flow(object):
+    """
+    The dialog of one intent over its slots, with its state kept under attribute in sessionAttributes.
+
+    validator, if given, is called as validator(slots, dates) before the transition and returns a validation result;
+    on an invalid slot the flow clears it and elicits it again without changing state.  legacy maps a session
+    attribute written by an earlier version of the handler to {value: state}, so sessions in flight across a
+    deployment keep their place.
+    """
+
+    def __init__(self, name, slots, attribute, states=(INITIAL,), validator=None, legacy=None):
+        self.name = name
+        self.attribute = attribute
+        self._bits = tuple((1 << index, slot) for index, slot in enumerate(slots))
+        self.slot_names = tuple(slots)
+        self._states = frozenset(states) | {INITIAL}
+        self._validator = validator
+        self._legacy = legacy
+        self._transitions = []
+        self._table = None
+
+    def mask(self, *slots):
+        """
+        Bitmask for the named slots, as in the keys of the transition table.
+        """
+        mask = 0
+        for slot in slots:
+            mask |= 1 << self.slot_names.index(slot)
+        return mask
+
+    def on(self, state=None, confirmation=None, filled=(), empty=(), to=STAY):
+        """
+        Decorator declaring a transition to the wrapped response builder; None for state or confirmation matches any.
+        """
+        if state is not None and state not in self._states:
+            raise ValueError('Flow {} has no state {!r}'.format(self.name, state))
+        if to is not STAY and to not in self._states:
+            raise ValueError('Flow {} has no state {!r}'.format(self.name, to))
+        if confirmation is not None and confirmation not in CONFIRMATION_STATUSES:
+            raise ValueError('Unknown confirmation status {!r}'.format(confirmation))
+
+        def register(action):
+            self._transitions.append(Transition(state, confirmation, self.mask(*filled), self.mask(*empty), to, action))
+            self._table = None
+            return action
+
+        return register
+
+    def compile(self):
+        """
+        Build the (state, confirmationStatus, filled slot bitmask) -> transition table.
+        """
+        table = {}
+        for state in self._states:
+            for confirmation in CONFIRMATION_STATUSES:
+                for mask in range(1 << len(self.slot_names)):
+                    for transition in self._transitions:
+                        if transition.matches(state, confirmation, mask):
+                            table[(state, confirmation, mask)] = transition
+                            break
+        self._table = table
+        return table
+
+    def state(self, session_attributes):
+        state = session_attributes.get(self.attribute)
+        if state is None and self._legacy:
+            attribute, states = self._legacy
+            state = states.get(session_attributes.get(attribute))
+        # An unknown state (say from a flow since redeclared) starts the dialog over rather than failing the turn.
+        return state if state in self._states else INITIAL
+
+    def save(self, session_attributes, state):
+        if self._legacy:
+            session_attributes.pop(self._legacy[0], None)
+        if state == INITIAL:
+            session_attributes.pop(self.attribute, None)
+        else:
+            session_attributes[self.attribute] = state
+
+    def filled(self, slots):
+        mask = 0
+        for bit, slot in self._bits:
+            if slots.get(slot):
+                mask |= bit
+        return mask
+
+    def run(self, intent_request, session_attributes, dates=None):
+        """
+        Validate the slots, take the transition for this turn and return its response.
+        """
+        table = self._table if self._table is not None else self.compile()
+        slots = intent_request['currentIntent']['slots']
+        if self._validator is not None:
+            result = self._validator(slots, dates)
+            if not result['isValid']:
+                slots[result['violatedSlot']] = None
+                return responses.elicit_slot(
+                    session_attributes, intent_request['currentIntent']['name'], slots, result['violatedSlot'],
+                    result['message']
+                )
+
+        turn = Turn(intent_request, session_attributes, self.state(session_attributes), self.filled(slots), dates)
+        key = (turn.state, turn.confirmation_status, turn.filled)
+        transition = table.get(key)
+        if transition is None:
+            raise NoTransitionError(self.name, key)
+        if transition.target is not STAY:
+            turn.state = transition.target
+        response = transition.action(turn)
+        self.save(session_attributes, turn.state)
+        return response
+
+    def __len__(self):
+        return len(self._table if self._table is not None else self.compile())
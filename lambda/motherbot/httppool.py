@@ -0,0 +1,115 @@
+"""
+Small keep-alive HTTP connection pool on top of http.client.
+
+Outbound calls from a warm container (Twilio, the Lex runtime) reuse pooled connections instead of paying a TCP and
+TLS handshake per request.  The pool is thread safe and bounded.  An idle connection the server has closed is thrown
+away before it is used rather than retried after a request on it fails: the calls made through the pool are POSTs,
+and once any of a request has been written the pool cannot know whether the server acted on it, so it never sends a
+request twice.  A request that fails before anything was written raises RequestNotSent, which is safe to retry.
+"""
+
+import http.client
+import select
+import threading
+from urllib.parse import urlsplit
+
+
+class RequestNotSent(OSError):
+    """
+    The connection could not be opened, so nothing reached the server and the request can be sent again.
+    """
+
+
+class HttpResponse(object):
+    __slots__ = ('status', 'headers', 'body')
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class ConnectionPool(object):
+    """
+    Up to size persistent connections to the host of base_url.
+    """
+
+    def __init__(self, base_url, size=4, timeout=5.0):
+        parts = urlsplit(base_url)
+        self.base_path = parts.path.rstrip('/')
+        self._connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self._host = parts.hostname
+        self._port = parts.port
+        self._timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self.connections_opened = 0
+
+    def _connect(self):
+        with self._lock:
+            self.connections_opened += 1
+        return self._connection_class(self._host, self._port, timeout=self._timeout)
+
+    def _acquire(self):
+        self._slots.acquire()
+        with self._lock:
+            while self._idle:
+                connection = self._idle.pop()
+                if not _dropped(connection):
+                    return connection
+                connection.close()
+        return self._connect()
+
+    def _release(self, connection, reusable):
+        if reusable:
+            with self._lock:
+                self._idle.append(connection)
+        else:
+            connection.close()
+        self._slots.release()
+
+    def request(self, method, path, body=None, headers=None):
+        """
+        Send a request for base path + path and return an HttpResponse with the body read in full.
+
+        Raises RequestNotSent when the connection could not be opened.  Any later failure, a timeout included, is
+        raised as it is: the server may have the request, so whether to send it again is the caller's decision.
+        """
+        connection = self._acquire()
+        reusable = False
+        try:
+            if connection.sock is None:
+                try:
+                    connection.connect()
+                except OSError as error:
+                    connection.close()
+                    raise RequestNotSent('could not connect to {}: {}'.format(self._host, error)) from error
+            try:
+                connection.request(method, self.base_path + path, body=body, headers=headers or {})
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                raise
+            reusable = not response.will_close
+            return HttpResponse(response.status, dict(response.getheaders()), data)
+        finally:
+            self._release(connection, reusable)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+def _dropped(connection):
+    """
+    True if an idle connection is readable: the server has closed it (or sent something unasked), so it is not reused.
+    """
+    try:
+        readable, _, _ = select.select([connection.sock], [], [], 0)
+    except (OSError, ValueError):
+        return True
+    return bool(readable)
@@ -0,0 +1,192 @@
+"""
+Idempotent fulfillment: a retried FulfillmentCodeHook gets the response of the first one instead of fulfilling again.
+
+Lex, and API Gateway in front of it, retry an invocation that timed out or failed in transit, and the retry carries
+the same event.  Each fulfillment is keyed on (userId, intent, slot values, turn id), where the turn id is the
+'turnId' request attribute the client sends with each turn (the SMS gateway uses the Twilio message sid).  A repeated
+key is answered with the stored response without running the handler, so the booking and approval backends behind
+it are not called twice.  A turn without a turnId is always fulfilled: nothing else in a Lex V1 event tells a retry
+from the user asking for the same thing again.
+
+Responses are kept in an LRU of IDEMPOTENCY_CACHE_SIZE keys in this container and, for retries that land on another
+container, in the store named by IDEMPOTENCY_STORE:
+
+    memory             this container only (the default)
+    sqlite:<path>      table fulfillments
+    dynamodb:<table>   keyed on request_key, with expires_at as the table's TTL attribute
+
+Either way a response is kept for IDEMPOTENCY_TTL_SECONDS.  A fulfillment that raises is not kept, so its retry runs
+again.  Two copies of a request running at the same moment on different containers are not held back; Lex only
+retries once the first copy has failed or timed out.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import threading
+import time
+
+from motherbot import responses
+from motherbot.lazy import lazy_import
+
+sqlite3 = lazy_import('sqlite3')
+
+CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', '1024'))
+TTL_SECONDS = float(os.environ.get('IDEMPOTENCY_TTL_SECONDS', '300'))
+
+FULFILLMENT = 'FulfillmentCodeHook'
+
+_shared = None
+
+
+def request_key(intent_request):
+    """
+    Digest of (userId, intent, slot values, turn id) identifying one fulfillment and its retries, or None when the
+    request carries no turnId.
+    """
+    intent = intent_request['currentIntent']
+    turn_id = (intent_request.get('requestAttributes') or {}).get('turnId')
+    if not turn_id:
+        return None
+    identity = json.dumps([intent_request['userId'], intent['name'], intent['slots'], turn_id], sort_keys=True)
+    return hashlib.sha256(identity.encode('utf-8')).hexdigest()
+
+
+""" --- Stores --- """
+
+
+class SQLiteFulfillments(object):
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS fulfillments ('
+                ' request_key TEXT PRIMARY KEY, response TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+
+    def get(self, key, now):
+        row = self._connection.execute(
+            'SELECT response FROM fulfillments WHERE request_key = ? AND expires_at > ?', (key, now)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, response, expires_at):
+        with self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO fulfillments (request_key, response, expires_at) VALUES (?, ?, ?)',
+                (key, response, expires_at)
+            )
+
+
+class DynamoDBFulfillments(object):
+    """
+    Fulfillments table keyed on request_key.  DynamoDB's TTL deletes expired items some time after they expire, so
+    expiry is checked on read as well.
+    """
+
+    def __init__(self, table):
+        self._table = table
+
+    def get(self, key, now):
+        item = self._table.get_item(Key={'request_key': key}).get('Item')
+        if item is None or item['expires_at'] <= now:
+            return None
+        return item['response']
+
+    def put(self, key, response, expires_at):
+        self._table.put_item(Item={'request_key': key, 'response': response, 'expires_at': int(expires_at) + 1})
+
+
+def store_from_env():
+    spec = os.environ.get('IDEMPOTENCY_STORE', 'memory')
+    kind, _, target = spec.partition(':')
+    if kind == 'memory':
+        return None
+    if kind == 'sqlite':
+        return SQLiteFulfillments(target)
+    if kind == 'dynamodb':
+        boto3 = lazy_import('boto3')
+        return DynamoDBFulfillments(boto3.resource('dynamodb').Table(target))
+    raise ValueError('Unsupported IDEMPOTENCY_STORE {}'.format(spec))
+
+
+""" --- Fulfillments --- """
+
+
+class Fulfillments(object):
+    """
+    Responses of recent fulfillments by request_key, in an LRU in front of an optional shared store.
+    """
+
+    def __init__(self, store=None, size=CACHE_SIZE, ttl=TTL_SECONDS, clock=time.time):
+        self._store = store
+        self._size = size
+        self._ttl = ttl
+        self._clock = clock
+        self._recent = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _remember(self, key, response, expires_at):
+        with self._lock:
+            self._recent[key] = (response, expires_at)
+            self._recent.move_to_end(key)
+            while len(self._recent) > self._size:
+                self._recent.popitem(last=False)
+
+    def _recall(self, key, now):
+        with self._lock:
+            found = self._recent.get(key)
+            if found is not None:
+                if found[1] > now:
+                    self._recent.move_to_end(key)
+                    return found[0]
+                del self._recent[key]
+        if self._store is None:
+            return None
+        stored = self._store.get(key, now)
+        if stored is None:
+            return None
+        response = json.loads(stored)
+        self._remember(key, response, now + self._ttl)
+        return response
+
+    def fulfill(self, intent_request, handle):
+        """
+        handle(intent_request), or the response it gave before if this request is a retry of a fulfillment.  Dialog
+        code hook turns, and turns without a turnId, are always handled.
+        """
+        if intent_request['invocationSource'] != FULFILLMENT or self._ttl <= 0:
+            return handle(intent_request)
+
+        key = request_key(intent_request)
+        if key is None:
+            return handle(intent_request)
+        now = self._clock()
+        response = self._recall(key, now)
+        if response is not None:
+            self.hits += 1
+            return response
+
+        self.misses += 1
+        response = handle(intent_request)
+        expires_at = self._clock() + self._ttl
+        self._remember(key, response, expires_at)
+        if self._store is not None:
+            self._store.put(key, responses.dumps(response), expires_at)
+        return response
+
+    def __len__(self):
+        return len(self._recent)
+
+
+def shared():
+    """
+    The container-wide fulfillment cache over the store named by IDEMPOTENCY_STORE, created on first use.
+    """
+    global _shared
+    if _shared is None:
+        _shared = Fulfillments(store_from_env())
+    return _shared
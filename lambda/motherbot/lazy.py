@@ -0,0 +1,35 @@
+"""
+Deferred imports for modules which only a few intents need.
+
+lazy_import returns a module object straight away but postpones executing the module until one of its attributes is
+first accessed, so the cost of importing it moves out of the cold start and onto the first request that uses it.
+After that first access the object is the ordinary, fully loaded module.
+"""
+
+import importlib.util
+import sys
+
+
+def lazy_import(name):
+    """
+    Return the module called name, executing it on first attribute access rather than now.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ImportError('No module named {}'.format(name), name=name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+
+    # Mirror the regular import system so that a later `import package.child` sees the same object.
+    parent, _, child = name.rpartition('.')
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
@@ -0,0 +1,118 @@
+"""
+Lex V1 runtime PostText over a motherbot.httppool keep-alive connection pool.
+
+A warm container keeps its connections to runtime.lex.<region>.amazonaws.com open between invocations, so a text
+after the first skips the TCP and TLS handshakes.  Requests are signed with Signature Version 4 from the function's
+credentials (AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY and AWS_SESSION_TOKEN, which Lambda sets).
+
+PostText moves the conversation on, so only requests Lex never acted on are retried with backoff: throttled ones and
+ones whose connection could not be opened, never a timeout or a 5xx.  LEX_RUNTIME_URL points the client at another
+endpoint, such as the local stand-in in motherbot.fakes.lexruntime.
+"""
+
+import datetime
+import hashlib
+import hmac
+import json
+import os
+import time
+from urllib.parse import quote, urlsplit
+
+from motherbot.httppool import ConnectionPool, RequestNotSent
+
+SERVICE = 'lex'
+RETRY_STATUSES = frozenset([429])
+
+
+class LexRuntimeError(Exception):
+    def __init__(self, status, code, detail):
+        super(LexRuntimeError, self).__init__('Lex runtime responded {} {}: {}'.format(status, code, detail))
+        self.status = status
+        self.response = {'Error': {'Code': code, 'Message': detail}}
+
+
+def _hmac(key, text):
+    return hmac.new(key, text.encode('utf-8'), hashlib.sha256).digest()
+
+
+def sign(method, host, path, body, region, access_key, secret_key, session_token=None, now=None):
+    """
+    Headers carrying a Signature Version 4 signature for a JSON request to the Lex runtime.
+    """
+    now = now or datetime.datetime.utcnow()
+    amz_date = now.strftime('%Y%m%dT%H%M%SZ')
+    day = amz_date[:8]
+    headers = {'content-type': 'application/json', 'host': host, 'x-amz-date': amz_date}
+    if session_token:
+        headers['x-amz-security-token'] = session_token
+    signed = ';'.join(sorted(headers))
+    canonical = '\n'.join([
+        method,
+        # Every service but S3 signs the path encoded a second time.
+        quote(quote(path, safe='/-_.~'), safe='/-_.~'),
+        '',
+        ''.join('{}:{}\n'.format(name, headers[name]) for name in sorted(headers)),
+        signed,
+        hashlib.sha256(body).hexdigest(),
+    ])
+    scope = '{}/{}/{}/aws4_request'.format(day, region, SERVICE)
+    to_sign = '\n'.join(['AWS4-HMAC-SHA256', amz_date, scope, hashlib.sha256(canonical.encode('utf-8')).hexdigest()])
+    key = _hmac(_hmac(_hmac(_hmac(('AWS4' + secret_key).encode('utf-8'), day), region), SERVICE), 'aws4_request')
+    signature = hmac.new(key, to_sign.encode('utf-8'), hashlib.sha256).hexdigest()
+    headers['authorization'] = 'AWS4-HMAC-SHA256 Credential={}/{}, SignedHeaders={}, Signature={}'.format(
+        access_key, scope, signed, signature
+    )
+    return headers
+
+
+class LexRuntimeClient(object):
+    def __init__(self, region, access_key, secret_key, session_token=None, endpoint=None, pool_size=2, retries=2):
+        self._region = region
+        self._credentials = (access_key, secret_key, session_token)
+        self._retries = retries
+        endpoint = endpoint or 'https://runtime.lex.{}.amazonaws.com'.format(region)
+        self._host = urlsplit(endpoint).netloc
+        self.pool = ConnectionPool(endpoint, size=pool_size)
+
+    def post_text(self, bot_name, bot_alias, user_id, text, session_attributes=None, request_attributes=None):
+        """
+        Send the user's text to the bot and return Lex's PostText response.
+        """
+        path = '/bot/{}/alias/{}/user/{}/text'.format(bot_name, bot_alias, user_id)
+        payload = {'inputText': text}
+        if session_attributes:
+            payload['sessionAttributes'] = session_attributes
+        if request_attributes:
+            payload['requestAttributes'] = request_attributes
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+        for attempt in range(self._retries + 1):
+            headers = sign('POST', self._host, self.pool.base_path + path, body, self._region, *self._credentials)
+            try:
+                response = self.pool.request('POST', path, body=body, headers=headers)
+            except RequestNotSent:
+                if attempt == self._retries:
+                    raise
+                time.sleep(0.05 * 2 ** attempt)
+                continue
+            if response.status in RETRY_STATUSES and attempt < self._retries:
+                time.sleep(0.05 * 2 ** attempt)
+                continue
+            if response.status >= 300:
+                code = response.headers.get('x-amzn-ErrorType', '').partition(':')[0] or str(response.status)
+                raise LexRuntimeError(response.status, code, response.body[:200])
+            return json.loads(response.body.decode('utf-8'))
+
+    def close(self):
+        self.pool.close()
+
+
+def client_from_env():
+    region = os.environ.get('AWS_REGION', 'us-east-1')
+    return LexRuntimeClient(
+        region,
+        os.environ.get('AWS_ACCESS_KEY_ID', ''),
+        os.environ.get('AWS_SECRET_ACCESS_KEY', ''),
+        os.environ.get('AWS_SESSION_TOKEN'),
+        endpoint=os.environ.get('LEX_RUNTIME_URL')
+    )
@@ -0,0 +1,115 @@
+"""
+Structured, sampled logging for the code hooks.
+
+configure() sets the root logger's level from LOG_LEVEL (or the AWS_LAMBDA_LOG_LEVEL the runtime provides; INFO by
+default) and has its handlers write each record as one line of JSON.  Log calls should pass %-style arguments rather
+than pre-formatted strings, so a message below the level costs a level check and nothing more.
+
+Wrapping lambda_handler with @logged adds the invocation's userId, intent and invocation source to every line it
+logs, and emits one summary line per invocation with the handler's duration and the dialog action it returned:
+
+    {"level":"INFO","message":"invoke","userId":"kid","intent":"CanICall","source":"DialogCodeHook",
+     "durationMs":0.052,"dialogAction":"Delegate"}
+
+When DEBUG is below the configured level, a LOG_DEBUG_SAMPLE_RATE fraction of invocations (1% by default) is logged
+at DEBUG in full, with "sampled":true on its lines, which keeps enough detail to debug with at a fraction of the
+CloudWatch ingestion.
+"""
+
+import functools
+import json
+import logging
+import os
+import sys
+import time
+
+from motherbot.lazy import lazy_import
+
+random = lazy_import('random')
+
+LEVEL = (os.environ.get('LOG_LEVEL') or os.environ.get('AWS_LAMBDA_LOG_LEVEL') or 'INFO').upper()
+DEBUG_SAMPLE_RATE = float(os.environ.get('LOG_DEBUG_SAMPLE_RATE', '0.01'))
+
+# Fields of the invocation in progress, added to every line.  Lambda runs one invocation at a time per container.
+_context = {}
+_encoder = json.JSONEncoder(separators=(',', ':'), default=str)
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats a record as a single JSON object: level, message, the invocation context and any extra={'fields': {}}.
+    """
+
+    def format(self, record):
+        payload = {'level': record.levelname, 'message': record.getMessage()}
+        payload.update(_context)
+        fields = record.__dict__.get('fields')
+        if fields:
+            payload.update(fields)
+        if record.exc_info:
+            payload['exception'] = self.formatException(record.exc_info)
+        return _encoder.encode(payload)
+
+
+def configure(level=None):
+    """
+    Set the root logger's level and make its handlers (the Lambda runtime's, or a new stdout one) write JSON lines.
+    """
+    root = logging.getLogger()
+    root.setLevel(level or LEVEL)
+    if not root.handlers:
+        root.addHandler(logging.StreamHandler(sys.stdout))
+    for handler in root.handlers:
+        if not isinstance(handler.formatter, JsonFormatter):
+            handler.setFormatter(JsonFormatter())
+    return root
+
+
+def _begin(event, context):
+    _context.clear()
+    _context['userId'] = event.get('userId')
+    _context['intent'] = event.get('currentIntent', {}).get('name')
+    _context['source'] = event.get('invocationSource')
+    request_id = getattr(context, 'aws_request_id', None)
+    if request_id:
+        _context['requestId'] = request_id
+
+
+def logged(handler):
+    """
+    Decorate lambda_handler to log in the invocation's context, sample DEBUG, and summarise each invocation.
+    """
+    root = logging.getLogger()
+
+    @functools.wraps(handler)
+    def wrapper(event, context):
+        _begin(event, context)
+        level = None
+        if DEBUG_SAMPLE_RATE and not root.isEnabledFor(logging.DEBUG) and random.random() < DEBUG_SAMPLE_RATE:
+            level = root.level
+            root.setLevel(logging.DEBUG)
+            _context['sampled'] = True
+
+        start = time.perf_counter()
+        try:
+            response = handler(event, context)
+        except Exception:
+            root.exception('invoke failed', extra={'fields': {'durationMs': _elapsed_ms(start)}})
+            raise
+        finally:
+            if level is not None:
+                root.setLevel(level)
+
+        if root.isEnabledFor(logging.INFO):
+            dialog_action = response.get('dialogAction') if isinstance(response, dict) else None
+            root.info('invoke', extra={'fields': {
+                'durationMs': _elapsed_ms(start),
+                'dialogAction': dialog_action.get('type') if dialog_action else None
+            }})
+        return response
+
+    return wrapper
+
+
+def _elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000.0, 3)
@@ -0,0 +1,267 @@
+"""
+In-process latency histograms and CloudWatch Embedded Metric Format output.
+
+Code is timed with the timed() decorator or the timer() context manager.  Each timing goes into a histogram kept for
+the life of the container and into the current invocation's samples.  @flushed on lambda_handler writes those samples
+to stdout as one EMF JSON line at the end of each invocation, dimensioned by intent, and CloudWatch turns them into
+metrics (with p50/p99 statistics) without a PutMetricData call:
+
+    {"_aws":{"Timestamp":...,"CloudWatchMetrics":[{"Namespace":"MotherBot","Dimensions":[["Intent"]],
+     "Metrics":[{"Name":"dispatch","Unit":"Milliseconds"},...]}]},"Intent":"BookCar","dispatch":[0.21],...}
+
+Every METRICS_SUMMARY_SECONDS the line also carries a "latency" property with the container's histogram percentiles,
+which can be queried in CloudWatch Logs Insights.  Set METRICS_ENABLED=0 to turn timing and output off.
+"""
+
+import functools
+import json
+import math
+import os
+import sys
+import time
+
+NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'MotherBot')
+ENABLED = os.environ.get('METRICS_ENABLED', '1').lower() not in ('0', 'false', 'no')
+SUMMARY_SECONDS = float(os.environ.get('METRICS_SUMMARY_SECONDS', '60'))
+
+# Values are recorded in whole microseconds; below 2 ** SUB_BUCKET_BITS they are exact, above it each power of two
+# range is split into 2 ** (SUB_BUCKET_BITS - 1) buckets, so a value is off by at most 1/64 (about 1.5%).
+SUB_BUCKET_BITS = 7
+
+_encoder = json.JSONEncoder(separators=(',', ':'))
+
+
+def bucket_index(value):
+    if value < (1 << SUB_BUCKET_BITS):
+        return value
+    shift = value.bit_length() - SUB_BUCKET_BITS
+    return (shift << (SUB_BUCKET_BITS - 1)) + (value >> shift)
+
+
+def bucket_value(index):
+    """
+    The highest value which falls into bucket index.
+    """
+    if index < (1 << SUB_BUCKET_BITS):
+        return index
+    shift = (index >> (SUB_BUCKET_BITS - 1)) - 1
+    return ((index - (shift << (SUB_BUCKET_BITS - 1)) + 1) << shift) - 1
+
+
+class Histogram(object):
+    """
+    HDR-style log-linear histogram of microsecond values with a bounded relative error and O(1) record.
+    """
+
+    __slots__ = ('counts', 'count', 'total', 'min', 'max')
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    def record(self, value):
+        value = int(value)
+        index = bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, pct):
+        """
+        The value at or below which pct percent of the recorded values fall, or None if nothing was recorded.
+        """
+        if not self.count:
+            return None
+        rank = max(1, int(math.ceil(pct / 100.0 * self.count)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(bucket_value(index), self.max)
+        return self.max
+
+    def merge(self, other):
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        self.max = max(self.max, other.max)
+
+    def summary(self):
+        """
+        count, mean, p50, p90, p99 and max, in milliseconds.
+        """
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'meanMs': round(self.total / 1000.0 / self.count, 3),
+            'p50Ms': self.percentile(50) / 1000.0,
+            'p90Ms': self.percentile(90) / 1000.0,
+            'p99Ms': self.percentile(99) / 1000.0,
+            'maxMs': self.max / 1000.0,
+        }
+
+
+class Metrics(object):
+    """
+    Container-wide histograms keyed on (intent, name), plus the samples of the invocation in progress.
+    """
+
+    def __init__(self, namespace=NAMESPACE, stream=None, clock=time.perf_counter, wall_clock=time.time,
+                 summary_seconds=SUMMARY_SECONDS):
+        self.namespace = namespace
+        self._stream = stream
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._summary_seconds = summary_seconds
+        self._last_summary = None
+        self.histograms = {}
+        self.intent = None
+        self._samples = {}
+        self._declarations = {}
+
+    def record(self, name, seconds):
+        microseconds = seconds * 1e6
+        key = (self.intent, name)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram()
+        histogram.record(microseconds)
+        samples = self._samples.get(name)
+        if samples is None:
+            self._samples[name] = [round(microseconds / 1000.0, 3)]
+        else:
+            samples.append(round(microseconds / 1000.0, 3))
+
+    def timer(self, name):
+        return _Timer(self, name)
+
+    def timed(self, name):
+        """
+        Decorator timing each call of the wrapped function under name.
+        """
+        def decorate(func):
+            if not ENABLED:
+                return func
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = self._clock()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(name, self._clock() - start)
+
+            return wrapper
+
+        return decorate
+
+    def begin(self, intent):
+        self.intent = intent
+        self._samples = {}
+
+    def emf(self):
+        """
+        The EMF line for the invocation in progress, or None if nothing was timed.
+
+        The metric declarations only depend on which names were timed, so they are encoded once per set of names and
+        spliced in; only the timestamp, intent and samples are encoded per invocation.
+        """
+        if not self._samples:
+            return None
+        names = tuple(sorted(self._samples))
+        declaration = self._declarations.get(names)
+        if declaration is None:
+            declaration = self._declarations[names] = _encoder.encode([{
+                'Namespace': self.namespace,
+                'Dimensions': [['Intent']],
+                'Metrics': [{'Name': name, 'Unit': 'Milliseconds'} for name in names]
+            }])
+
+        now = self._wall_clock()
+        parts = ['{{"_aws":{{"Timestamp":{},"CloudWatchMetrics":{}}},"Intent":{}'.format(
+            int(now * 1000), declaration, _encoder.encode(self.intent or 'unknown')
+        )]
+        for name in names:
+            parts.append('"{}":[{}]'.format(name, ','.join([repr(value) for value in self._samples[name]])))
+        if self._last_summary is None or now - self._last_summary >= self._summary_seconds:
+            self._last_summary = now
+            parts.append('"latency":' + _encoder.encode(self.snapshot()))
+        return ','.join(parts) + '}'
+
+    def flush(self):
+        """
+        Write the invocation's EMF line and start a new invocation.
+        """
+        line = self.emf()
+        self._samples = {}
+        if line is not None:
+            (self._stream or sys.stdout).write(line + '\n')
+
+    def snapshot(self):
+        """
+        Histogram summaries keyed 'intent/name'.
+        """
+        return {
+            '{}/{}'.format(intent or 'unknown', name): histogram.summary()
+            for (intent, name), histogram in sorted(self.histograms.items(), key=lambda item: (item[0][0] or '', item[0][1]))
+        }
+
+    def reset(self):
+        self.histograms = {}
+        self._samples = {}
+        self._last_summary = None
+
+    def flushed(self, handler):
+        """
+        Decorate lambda_handler to time it as 'handler' and flush the invocation's metrics when it returns.
+        """
+        if not ENABLED:
+            return handler
+
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            self.begin(event.get('currentIntent', {}).get('name'))
+            start = self._clock()
+            try:
+                return handler(event, context)
+            finally:
+                self.record('handler', self._clock() - start)
+                self.flush()
+
+        return wrapper
+
+
+class _Timer(object):
+    __slots__ = ('_metrics', '_name', '_start')
+
+    def __init__(self, metrics, name):
+        self._metrics = metrics
+        self._name = name
+
+    def __enter__(self):
+        self._start = self._metrics._clock()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if ENABLED:
+            self._metrics.record(self._name, self._metrics._clock() - self._start)
+        return False
+
+
+# The container-wide registry the handlers use.
+registry = Metrics()
+timed = registry.timed
+timer = registry.timer
+flushed = registry.flushed
+snapshot = registry.snapshot
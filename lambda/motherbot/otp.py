@@ -0,0 +1,179 @@
+"""
+One time passcodes for verifying a new friend's phone number.
+
+start() texts a code and returns a token for the conversation's sessionAttributes; the user types the code in on a
+later turn and verify() checks it against that token.  The token carries the code's expiry, the wrong guesses so far
+and a keyed hash of the code, sealed with OTP_SECRET, so whichever container takes the next turn can check it and no
+container has to remember anything.  OTP_SECRET is required: shared() refuses to start without it.
+
+Sends and guesses are also rate limited per phone number within each container, which bounds what replaying an old
+token can buy.
+"""
+
+import collections
+import hashlib
+import hmac
+import os
+import secrets
+import time
+
+from motherbot import sms
+
+CODE_LENGTH = int(os.environ.get('OTP_CODE_LENGTH', '6'))
+CODE_TTL_SECONDS = int(os.environ.get('OTP_TTL_SECONDS', '300'))
+MAX_ATTEMPTS = 5
+SENDS_PER_WINDOW = 3
+SEND_WINDOW_SECONDS = 600
+GUESSES_PER_WINDOW = 10
+
+# Outcomes of start() and verify().
+SENT = 'sent'
+RATE_LIMITED = 'rate_limited'
+FAILED = 'failed'
+VERIFIED = 'verified'
+INVALID = 'invalid'
+EXPIRED = 'expired'
+LOCKED = 'locked'
+
+MESSAGE = 'Your MotherBot verification code is {}'
+
+
+class ExpiringStore(object):
+    """
+    Dict whose entries expire ttl seconds after they were last set.
+
+    Every entry has the same ttl, so insertion order is expiry order: expired entries are purged from the front of an
+    OrderedDict, making get and set O(1) amortised.
+    """
+
+    def __init__(self, ttl, clock=time.monotonic):
+        self._ttl = ttl
+        self._clock = clock
+        self._entries = collections.OrderedDict()
+
+    def _purge(self, now):
+        entries = self._entries
+        while entries:
+            key = next(iter(entries))
+            if entries[key][0] > now:
+                break
+            del entries[key]
+
+    def set(self, key, value):
+        now = self._clock()
+        self._purge(now)
+        self._entries.pop(key, None)
+        self._entries[key] = (now + self._ttl, value)
+
+    def get(self, key, default=None):
+        self._purge(self._clock())
+        entry = self._entries.get(key)
+        return default if entry is None else entry[1]
+
+    def replace(self, key, value):
+        """
+        Update the value of a live entry without extending its expiry.
+        """
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries[key] = (entry[0], value)
+
+    def __len__(self):
+        self._purge(self._clock())
+        return len(self._entries)
+
+
+class RateLimiter(object):
+    """
+    Allows at most limit events per key in a fixed window that opens with the key's first event.
+    """
+
+    def __init__(self, limit, window, clock=time.monotonic):
+        self._limit = limit
+        self._counts = ExpiringStore(window, clock)
+
+    def allow(self, key):
+        count = self._counts.get(key)
+        if count is None:
+            self._counts.set(key, 1)
+            return True
+        if count >= self._limit:
+            return False
+        self._counts.replace(key, count + 1)
+        return True
+
+
+class OtpService(object):
+    def __init__(self, sender, secret, code_length=CODE_LENGTH, ttl=CODE_TTL_SECONDS, max_attempts=MAX_ATTEMPTS,
+                 sends_per_window=SENDS_PER_WINDOW, send_window=SEND_WINDOW_SECONDS,
+                 guesses_per_window=GUESSES_PER_WINDOW, clock=time.time):
+        self._sender = sender
+        self._secret = secret
+        self._code_length = code_length
+        self._ttl = ttl
+        self._max_attempts = max_attempts
+        self._clock = clock
+        self._sends = RateLimiter(sends_per_window, send_window, time.monotonic)
+        self._guesses = RateLimiter(guesses_per_window, send_window, time.monotonic)
+
+    def _mac(self, *parts):
+        message = ':'.join(str(part) for part in parts).encode('utf-8')
+        return hmac.new(self._secret, message, hashlib.sha256).hexdigest()
+
+    def _token(self, phone, expires, attempts, digest):
+        return '{}.{}.{}.{}'.format(expires, attempts, digest, self._mac(phone, expires, attempts, digest))
+
+    def start(self, phone):
+        """
+        Text a fresh code to phone (E.164).  Returns (SENT, token), or (RATE_LIMITED, None) or (FAILED, None) when
+        nothing was sent.
+        """
+        if not self._sends.allow(phone):
+            return RATE_LIMITED, None
+        code = str(secrets.randbelow(10 ** self._code_length)).zfill(self._code_length)
+        try:
+            self._sender.send(phone, MESSAGE.format(code))
+        except (sms.SmsError, OSError):
+            return FAILED, None
+        expires = int(self._clock()) + self._ttl
+        return SENT, self._token(phone, expires, 0, self._mac(phone, code, expires))
+
+    def verify(self, phone, code, token):
+        """
+        Check a code typed in for phone against the token start() returned.  Returns (outcome, token): VERIFIED,
+        INVALID with the token to keep, EXPIRED (or never sent, or tampered with) or LOCKED.
+        """
+        try:
+            expires, attempts, digest, seal = token.split('.')
+            expires, attempts = int(expires), int(attempts)
+        except (AttributeError, ValueError):
+            return EXPIRED, None
+        if not hmac.compare_digest(seal, self._mac(phone, expires, attempts, digest)) or expires <= self._clock():
+            return EXPIRED, None
+        if attempts >= self._max_attempts or not self._guesses.allow(phone):
+            return LOCKED, None
+
+        candidate = ''.join(char for char in code or '' if char.isdigit())
+        if hmac.compare_digest(digest, self._mac(phone, candidate, expires)):
+            return VERIFIED, None
+
+        attempts += 1
+        if attempts >= self._max_attempts:
+            return LOCKED, None
+        return INVALID, self._token(phone, expires, attempts, digest)
+
+
+_shared = None
+
+
+def shared():
+    """
+    The container-wide OTP service, sending through Twilio when it is configured.
+    """
+    global _shared
+    if _shared is None:
+        secret = os.environ.get('OTP_SECRET')
+        if not secret:
+            raise ValueError('OTP_SECRET must be set to verify phone numbers')
+        _shared = OtpService(sms.sender_from_env(), secret.encode('utf-8'))
+    return _shared
@@ -0,0 +1,92 @@
+"""
+Pricing for car rental and hotel reservations.
+
+Prices are a pure function of the normalised inputs, (location, days, under-25 driver, car type) for cars and
+(location, nights, room type) for hotels, so quotes are memoised in a bounded LRU cache shared by all invocations in
+a warm container.  Size it with the PRICING_CACHE_SIZE environment variable (0 disables caching); cache_stats reports
+hits and misses.  quote_car_grid and quote_hotel_grid price a whole grid of options in one call, computing the
+location surcharge once for the grid rather than once per option.
+"""
+
+import functools
+import os
+
+from motherbot import catalog
+
+CACHE_SIZE = int(os.environ.get('PRICING_CACHE_SIZE', '1024'))
+
+YOUNG_DRIVER_AGE = 25
+YOUNG_DRIVER_MULTIPLIER = 1.10
+
+
+def car_price(location, days, age, car_type):
+    """
+    Price a car rental.  Unknown car types are priced as economy.
+    """
+    return _car_price(location.lower(), days, age < YOUNG_DRIVER_AGE, catalog.CAR_TYPE_INDEX.get(car_type.lower(), 0))
+
+
+def hotel_price(location, nights, room_type):
+    """
+    Price a hotel stay.  Raises KeyError for an unknown room type.
+    """
+    return _hotel_price(location.lower(), nights, catalog.ROOM_TYPE_INDEX[room_type.lower()])
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _car_price(location, days, young_driver, car_type_index):
+    age_multiplier = YOUNG_DRIVER_MULTIPLIER if young_driver else 1
+    return days * ((100 + catalog.location_cost(location)) + ((car_type_index * 50) * age_multiplier))
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _hotel_price(location, nights, room_type_index):
+    return nights * (100 + catalog.location_cost(location) + (100 + room_type_index))
+
+
+def quote_car_grid(location, day_counts, age, car_types=catalog.CAR_TYPES):
+    """
+    Price every combination of rental length and car type for one location and driver.
+
+    Returns {days: {car_type: price}}, with prices identical to car_price for the same inputs.
+    """
+    base_cost = 100 + catalog.location_cost(location.lower())
+    age_multiplier = YOUNG_DRIVER_MULTIPLIER if age < YOUNG_DRIVER_AGE else 1
+    surcharges = [
+        (car_type, (catalog.CAR_TYPE_INDEX.get(car_type.lower(), 0) * 50) * age_multiplier) for car_type in car_types
+    ]
+    return {
+        days: {car_type: days * (base_cost + surcharge) for car_type, surcharge in surcharges} for days in day_counts
+    }
+
+
+def quote_hotel_grid(location, night_counts, room_types=catalog.ROOM_TYPES):
+    """
+    Price every combination of stay length and room type for one location.
+
+    Returns {nights: {room_type: price}}, with prices identical to hotel_price for the same inputs.  Raises KeyError
+    for an unknown room type.
+    """
+    base_cost = 100 + catalog.location_cost(location.lower())
+    surcharges = [(room_type, 100 + catalog.ROOM_TYPE_INDEX[room_type.lower()]) for room_type in room_types]
+    return {
+        nights: {room_type: nights * (base_cost + surcharge) for room_type, surcharge in surcharges}
+        for nights in night_counts
+    }
+
+
+def cache_stats():
+    """
+    Return hit/miss counters and occupancy of the car and hotel price caches.
+    """
+    return {'car': _cache_info(_car_price), 'hotel': _cache_info(_hotel_price)}
+
+
+def clear_cache():
+    _car_price.cache_clear()
+    _hotel_price.cache_clear()
+
+
+def _cache_info(cached):
+    info = cached.cache_info()
+    return {'hits': info.hits, 'misses': info.misses, 'size': info.currsize, 'maxSize': info.maxsize}
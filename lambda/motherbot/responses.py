@@ -0,0 +1,108 @@
+"""
+Builders for the dialog action responses the code hooks return, and their JSON form.
+
+Prompts that never change are interned with constant(): the message object is built once per container and shared by
+every response that uses it.  message() returns the interned object for a known prompt and a new one otherwise, so
+handlers can pass any text through it.  Interned objects are shared, so nothing may modify them.
+
+The Lambda runtime serialises whatever dict a handler returns.  Code that needs the wire form itself (the idempotency
+store, which keeps each turn's response) uses dumps(), a compact json.dumps through one shared encoder.
+"""
+
+import json
+
+PLAIN_TEXT = 'PlainText'
+GENERIC_CARD = 'application/vnd.amazonaws.card.generic'
+
+# Builders that take a response card include the key even when there is no card; None omits it.
+NO_CARD = object()
+
+_encode = json.JSONEncoder(separators=(',', ':')).encode
+
+# content -> interned message.
+_interned = {}
+
+
+def constant(content):
+    """
+    The interned PlainText message object for content.
+    """
+    interned = _interned.get(content)
+    if interned is None:
+        interned = _interned[content] = {'contentType': PLAIN_TEXT, 'content': content}
+    return interned
+
+
+def message(content):
+    """
+    A PlainText message object: the interned one if content is a known constant, otherwise a new one.
+    """
+    return _interned.get(content) or {'contentType': PLAIN_TEXT, 'content': content}
+
+
+def elicit_slot(session_attributes, intent_name, slots, slot_to_elicit, message, response_card=NO_CARD):
+    action = {
+        'type': 'ElicitSlot',
+        'intentName': intent_name,
+        'slots': slots,
+        'slotToElicit': slot_to_elicit,
+        'message': message
+    }
+    if response_card is not NO_CARD:
+        action['responseCard'] = response_card
+    return {'sessionAttributes': session_attributes, 'dialogAction': action}
+
+
+def confirm_intent(session_attributes, intent_name, slots, message, response_card=NO_CARD):
+    action = {
+        'type': 'ConfirmIntent',
+        'intentName': intent_name,
+        'slots': slots,
+        'message': message
+    }
+    if response_card is not NO_CARD:
+        action['responseCard'] = response_card
+    return {'sessionAttributes': session_attributes, 'dialogAction': action}
+
+
+def close(session_attributes, fulfillment_state, message):
+    return {
+        'sessionAttributes': session_attributes,
+        'dialogAction': {
+            'type': 'Close',
+            'fulfillmentState': fulfillment_state,
+            'message': message
+        }
+    }
+
+
+def delegate(session_attributes, slots):
+    return {
+        'sessionAttributes': session_attributes,
+        'dialogAction': {
+            'type': 'Delegate',
+            'slots': slots
+        }
+    }
+
+
+def response_card(title, subtitle, options):
+    """
+    A generic response card showing up to five options as buttons.
+    """
+    return {
+        'contentType': GENERIC_CARD,
+        'version': 1,
+        'genericAttachments': [{
+            'title': title,
+            'subTitle': subtitle,
+            'buttons': None if options is None else options[:5]
+        }]
+    }
+
+
+def dumps(response):
+    """
+    Compact JSON for a code hook response.
+    """
+    return _encode(response)
@@ -0,0 +1,103 @@
+"""
+Table driven intent routing for the Lex code hooks.
+
+Handlers register against an intent name with the IntentRouter.intent decorator, so dispatching a request is a
+single dict lookup regardless of how many intents the bot grows.  Requests for intents nobody registered go to the
+fallback handler.  Each dispatch is timed and accumulated per intent so the handlers that dominate the Lambda
+duration can be read back with IntentRouter.stats().
+"""
+
+import time
+
+FALLBACK = '<fallback>'
+
+
+class UnsupportedIntentError(Exception):
+    """
+    Raised by the default fallback handler when a request names an intent with no registered handler.
+    """
+
+    def __init__(self, intent_name):
+        super(UnsupportedIntentError, self).__init__('Intent with name {} not supported'.format(intent_name))
+        self.intent_name = intent_name
+
+
+def unsupported_intent(intent_request):
+    raise UnsupportedIntentError(intent_request['currentIntent']['name'])
+
+
+class IntentRouter(object):
+    """
+    Registry mapping intent names to their handler functions.
+    """
+
+    def __init__(self, fallback=unsupported_intent, clock=time.perf_counter):
+        self._handlers = {}
+        self._fallback = fallback
+        self._clock = clock
+        self._timings = {}
+
+    def intent(self, intent_name):
+        """
+        Decorator registering the wrapped function as the handler for intent_name.
+        """
+        def register(handler):
+            if intent_name in self._handlers:
+                raise ValueError('Intent {} already has a handler registered'.format(intent_name))
+            self._handlers[intent_name] = handler
+            return handler
+
+        return register
+
+    def fallback(self, handler):
+        """
+        Decorator replacing the handler used for intents which are not registered.
+        """
+        self._fallback = handler
+        return handler
+
+    def handler_for(self, intent_name):
+        return self._handlers.get(intent_name, self._fallback)
+
+    def intents(self):
+        return sorted(self._handlers)
+
+    def dispatch(self, intent_request):
+        intent_name = intent_request['currentIntent']['name']
+        handler = self._handlers.get(intent_name)
+        if handler is None:
+            handler = self._fallback
+            intent_name = FALLBACK
+
+        start = self._clock()
+        try:
+            return handler(intent_request)
+        finally:
+            self._record(intent_name, self._clock() - start)
+
+    def _record(self, intent_name, elapsed):
+        counter = self._timings.get(intent_name)
+        if counter is None:
+            # [count, total seconds, max seconds]
+            counter = self._timings[intent_name] = [0, 0.0, 0.0]
+        counter[0] += 1
+        counter[1] += elapsed
+        if elapsed > counter[2]:
+            counter[2] = elapsed
+
+    def stats(self):
+        """
+        Return per intent timing counters accumulated since the container started (or since reset_stats).
+        """
+        return {
+            intent_name: {
+                'count': count,
+                'totalMs': total * 1000.0,
+                'meanMs': total * 1000.0 / count,
+                'maxMs': maximum * 1000.0
+            }
+            for intent_name, (count, total, maximum) in self._timings.items()
+        }
+
+    def reset_stats(self):
+        self._timings.clear()
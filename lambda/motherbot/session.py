@@ -0,0 +1,147 @@
+"""
+Compact codec for records kept in Lex sessionAttributes.
+
+Session attributes travel with every turn and Lex caps their total size, so reservations are stored with one letter
+field names, without null fields and behind a version tag:
+
+    1:{"t":"Hotel","l":"chicago","d":"2030-06-03","n":2,"r":"king"}
+    1z:<base64 of the zlib compressed JSON>
+
+Compression is only applied when SESSION_COMPRESSION is enabled on the function and it actually makes the value
+shorter.  Values written before the codec existed (plain JSON objects) are still decoded.  decode returns a
+LazyRecord which only parses the stored string the first time a field is read, so handlers can load history they
+rarely consult for free.
+"""
+
+import os
+from collections.abc import Mapping
+
+from motherbot.lazy import lazy_import
+
+base64 = lazy_import('base64')
+json = lazy_import('json')
+zlib = lazy_import('zlib')
+
+VERSION = '1'
+PLAIN_PREFIX = VERSION + ':'
+COMPRESSED_PREFIX = VERSION + 'z:'
+
+COMPRESS = os.environ.get('SESSION_COMPRESSION', '').lower() in ('1', 'true', 'yes')
+
+FIELD_KEYS = {
+    'ReservationType': 't',
+    'Location': 'l',
+    'CheckInDate': 'd',
+    'Nights': 'n',
+    'RoomType': 'r',
+    'PickUpCity': 'c',
+    'PickUpDate': 'p',
+    'ReturnDate': 'e',
+    'DriverAge': 'a',
+    'CarType': 'k',
+}
+FIELD_NAMES = {key: name for name, key in FIELD_KEYS.items()}
+
+_encoder = None
+
+
+class SessionCodecError(ValueError):
+    """
+    Raised when a session attribute cannot be decoded.
+    """
+
+
+def encode(fields, compress=None):
+    """
+    Encode a flat dict of reservation fields into a session attribute string.
+    """
+    compact = {}
+    for name, value in fields.items():
+        if value is not None:
+            compact[FIELD_KEYS.get(name, name)] = value
+    body = _compact_encoder().encode(compact)
+
+    if compress if compress is not None else COMPRESS:
+        packed = COMPRESSED_PREFIX + base64.b64encode(zlib.compress(body.encode('utf-8'), 9)).decode('ascii')
+        if len(packed) < len(PLAIN_PREFIX) + len(body):
+            return packed
+    return PLAIN_PREFIX + body
+
+
+def _compact_encoder():
+    # json.dumps builds a new encoder whenever separators are passed; build ours once, on first use.
+    global _encoder
+    if _encoder is None:
+        _encoder = json.JSONEncoder(separators=(',', ':'))
+    return _encoder
+
+
+def decode_now(value):
+    """
+    Decode a session attribute string into a dict keyed by the full field names.
+    """
+    try:
+        if value.startswith(PLAIN_PREFIX):
+            compact = json.loads(value[len(PLAIN_PREFIX):])
+        elif value.startswith(COMPRESSED_PREFIX):
+            compact = json.loads(zlib.decompress(base64.b64decode(value[len(COMPRESSED_PREFIX):])).decode('utf-8'))
+        elif value.startswith('{'):
+            # Written before the codec existed.
+            return json.loads(value)
+        else:
+            raise SessionCodecError('Unrecognised session attribute format: {!r}'.format(value[:16]))
+    except (ValueError, zlib.error) as e:
+        if isinstance(e, SessionCodecError):
+            raise
+        raise SessionCodecError('Could not decode session attribute: {}'.format(e))
+
+    return {FIELD_NAMES.get(key, key): field for key, field in compact.items()}
+
+
+def decode(value):
+    """
+    Wrap a session attribute string in a LazyRecord, or return None when the attribute is unset.
+    """
+    if not value:
+        return None
+    return LazyRecord(value)
+
+
+class LazyRecord(Mapping):
+    """
+    Read-only mapping over an encoded record which is decoded on first access.
+
+    Known fields that were null when the record was encoded read back as None rather than raising KeyError.
+    """
+
+    __slots__ = ('_raw', '_fields')
+
+    def __init__(self, raw):
+        self._raw = raw
+        self._fields = None
+
+    @property
+    def raw(self):
+        return self._raw
+
+    def _decoded(self):
+        if self._fields is None:
+            self._fields = decode_now(self._raw)
+        return self._fields
+
+    def __getitem__(self, name):
+        fields = self._decoded()
+        if name in fields:
+            return fields[name]
+        if name in FIELD_KEYS:
+            return None
+        raise KeyError(name)
+
+    def __iter__(self):
+        return iter(self._decoded())
+
+    def __len__(self):
+        return len(self._decoded())
+
+    def __repr__(self):
+        return 'LazyRecord({!r})'.format(self._raw)
@@ -0,0 +1,105 @@
+"""
+Outbound SMS through the Twilio Messages API.
+
+TwilioClient posts messages over a motherbot.httppool connection pool, so a warm container reuses its connection to
+Twilio instead of paying a TCP and TLS handshake per text.  SmsSender sends from the function's number and waits for
+Twilio to accept the message: Lambda freezes the process as soon as the handler returns, so a text left to a
+background thread would only go out when the container is next thawed, if ever.
+
+Configure with TWILIO_ACCOUNT_SID, TWILIO_AUTH_TOKEN and TWILIO_FROM_NUMBER.  TWILIO_API_URL points the client at
+another endpoint, such as the local stand-in in motherbot.fakes.twilio.
+"""
+
+import base64
+import json
+import logging
+import os
+import time
+from urllib.parse import urlencode
+
+from motherbot.httppool import ConnectionPool, RequestNotSent
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = 'https://api.twilio.com'
+# Sending a message is not idempotent: only a refusal Twilio gives before acting on it is retried, never a 5xx.
+RETRY_STATUSES = frozenset([429])
+
+
+class SmsError(Exception):
+    def __init__(self, status, detail):
+        super(SmsError, self).__init__('Twilio responded {}: {}'.format(status, detail))
+        self.status = status
+
+
+class TwilioClient(object):
+    def __init__(self, account_sid, auth_token, api_url=DEFAULT_API_URL, pool_size=4, retries=2):
+        self._path = '/2010-04-01/Accounts/{}/Messages.json'.format(account_sid)
+        credentials = '{}:{}'.format(account_sid, auth_token).encode('utf-8')
+        self._headers = {
+            'Authorization': 'Basic ' + base64.b64encode(credentials).decode('ascii'),
+            'Content-Type': 'application/x-www-form-urlencoded',
+            'Connection': 'keep-alive',
+        }
+        self._retries = retries
+        self.pool = ConnectionPool(api_url, size=pool_size)
+
+    def send(self, to, from_, body):
+        """
+        Send one message and return the message resource Twilio created.
+        """
+        payload = urlencode({'To': to, 'From': from_, 'Body': body})
+        for attempt in range(self._retries + 1):
+            try:
+                response = self.pool.request('POST', self._path, body=payload, headers=self._headers)
+            except RequestNotSent:
+                if attempt == self._retries:
+                    raise
+                time.sleep(0.05 * 2 ** attempt)
+                continue
+            if response.status in RETRY_STATUSES and attempt < self._retries:
+                time.sleep(0.05 * 2 ** attempt)
+                continue
+            if response.status >= 300:
+                raise SmsError(response.status, response.body[:200])
+            return json.loads(response.body.decode('utf-8'))
+
+
+class SmsSender(object):
+    """
+    Sends texts from one number, blocking until Twilio has accepted each.
+    """
+
+    def __init__(self, client, from_number):
+        self._client = client
+        self._from = from_number
+        self.sent = 0
+
+    def send(self, to, body):
+        """
+        Send body to to, raising SmsError (or the connection's OSError) if it could not be handed to Twilio.
+        """
+        self._client.send(to, self._from, body)
+        self.sent += 1
+
+
+class NullSmsSender(object):
+    """
+    Used when Twilio is not configured: drops messages, logging that it did so (never what they said).
+    """
+
+    sent = 0
+
+    def send(self, to, body):
+        logger.warning('Twilio is not configured, dropping SMS to %s', to)
+
+
+def sender_from_env(pool_size=4):
+    account_sid = os.environ.get('TWILIO_ACCOUNT_SID')
+    auth_token = os.environ.get('TWILIO_AUTH_TOKEN')
+    from_number = os.environ.get('TWILIO_FROM_NUMBER')
+    if not (account_sid and auth_token and from_number):
+        return NullSmsSender()
+    api_url = os.environ.get('TWILIO_API_URL', DEFAULT_API_URL)
+    client = TwilioClient(account_sid, auth_token, api_url, pool_size=pool_size)
+    return SmsSender(client, from_number)
@@ -0,0 +1,400 @@
+"""
+Inbound SMS for the bots: the Twilio webhook, delivered through API Gateway, answered with TwiML.
+
+This is the preprocessing layer between Twilio and Lex that the README describes, which the bot first used from
+awslabs/amazon-lex-twilio-integration.  Each webhook is checked against its X-Twilio-Signature with TWILIO_AUTH_TOKEN.
+Without a token every webhook is rejected, unless TWILIO_SKIP_SIGNATURE=1 opts out of the check for local runs.
+Webhooks that pass are handled as follows:
+
+    a guardian's reply to an approval text ('YES 1f0c93ab52d7e640') is recorded with motherbot.approvals and
+    acknowledged;
+    anything else goes to the bot named by BOT_NAME and BOT_ALIAS through PostText (motherbot.lexruntime), over a
+    connection pool kept open across invocations, and the bot's messages come back as the TwiML reply.
+
+The Lex userId is the sender's number in E.164 without the '+', and the first part's MessageSid is passed as the
+turnId request attribute, so a webhook Twilio retries is fulfilled once (motherbot.idempotency).
+
+A long text can arrive as several webhooks a moment apart, one per part, and each is a turn of its own unless
+SMS_BURST_WINDOW_SECONDS is set (it is 0, off, by default).  With a window, parts from one sender arriving within it
+of the first are collapsed: the first part's invocation waits out the window, takes every part that has arrived and
+sends them to Lex as one text, and the other parts' invocations return an empty TwiML response at once.  Lambda runs
+one invocation per container at a time, so the parts only meet in a store every container sees, named by
+SMS_BURST_STORE:
+
+    memory             this process only, for local runs (the default)
+    sqlite:<path>      table sms_bursts
+    dynamodb:<table>   keyed on sender, with sort key part
+
+shared() ignores the window, with a warning, when the store is memory: each part would land in a different container
+and only wait out the window for nothing.
+"""
+
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from urllib.parse import parse_qsl
+from xml.sax.saxutils import escape
+
+from motherbot import approvals, lexruntime
+from motherbot.contacts import normalize_phone
+from motherbot.lazy import lazy_import
+
+sqlite3 = lazy_import('sqlite3')
+
+logger = logging.getLogger(__name__)
+
+BOT_NAME = os.environ.get('BOT_NAME', 'MotherBot')
+BOT_ALIAS = os.environ.get('BOT_ALIAS', '$LATEST')
+BURST_WINDOW_SECONDS = float(os.environ.get('SMS_BURST_WINDOW_SECONDS', '0'))
+SKIP_SIGNATURE = os.environ.get('TWILIO_SKIP_SIGNATURE', '').lower() in ('1', 'true', 'yes')
+
+# A burst whose first part is older than this was left behind by an invocation that failed; the next part starts over.
+STALE_BURST_SECONDS = 30.0
+
+LEAD = '#lead'
+TWIML_TYPE = 'application/xml'
+EMPTY_TWIML = '<?xml version="1.0" encoding="UTF-8"?><Response/>'
+
+_shared = None
+
+
+class WebhookError(ValueError):
+    """
+    Raised when a request is not a valid Twilio webhook; status is the HTTP status to answer with.
+    """
+
+    def __init__(self, status, message):
+        super(WebhookError, self).__init__(message)
+        self.status = status
+
+
+class InboundSms(object):
+    __slots__ = ('sid', 'sender', 'to', 'body', 'received_at')
+
+    def __init__(self, sid, sender, to, body, received_at):
+        self.sid = sid
+        self.sender = sender
+        self.to = to
+        self.body = body
+        self.received_at = received_at
+
+
+def webhook_params(event):
+    """
+    The form fields of an API Gateway proxy event carrying a Twilio webhook.
+    """
+    body = event.get('body') or ''
+    if event.get('isBase64Encoded'):
+        body = base64.b64decode(body).decode('utf-8')
+    return dict(parse_qsl(body, keep_blank_values=True))
+
+
+def expected_signature(url, params, auth_token):
+    """
+    Twilio's signature for a webhook: HMAC-SHA1 over the URL followed by each field name and value, in name order.
+    """
+    text = url + ''.join(name + params[name] for name in sorted(params))
+    digest = hmac.new(auth_token.encode('utf-8'), text.encode('utf-8'), hashlib.sha1).digest()
+    return base64.b64encode(digest).decode('ascii')
+
+
+def webhook_url(event):
+    """
+    The URL Twilio posted to, as API Gateway saw it.
+    """
+    headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+    path = (event.get('requestContext') or {}).get('path') or event.get('path') or '/'
+    return 'https://{}{}'.format(headers.get('host', ''), path)
+
+
+def twiml(messages):
+    """
+    A TwiML response sending each of messages back to the sender.
+    """
+    if not messages:
+        return EMPTY_TWIML
+    return '<?xml version="1.0" encoding="UTF-8"?><Response>{}</Response>'.format(
+        ''.join('<Message>{}</Message>'.format(escape(message)) for message in messages)
+    )
+
+
+def lex_messages(response):
+    """
+    The texts to send for a PostText response: each message of a composite one, with any response card's buttons
+    listed after them.
+    """
+    message = response.get('message')
+    if not message:
+        messages = []
+    elif response.get('messageFormat') == 'Composite':
+        messages = [part['value'] for part in sorted(json.loads(message)['messages'], key=lambda part: part['group'])]
+    else:
+        messages = [message]
+    card = response.get('responseCard') or {}
+    for attachment in card.get('genericAttachments') or []:
+        buttons = [button['text'] for button in attachment.get('buttons') or []]
+        if buttons:
+            messages.append('Reply with one of: {}'.format(', '.join(buttons)))
+    return messages
+
+
+def http_response(status, body):
+    return {'statusCode': status, 'headers': {'Content-Type': TWIML_TYPE}, 'body': body}
+
+
+""" --- Burst stores --- """
+
+
+class InMemoryBursts(object):
+    def __init__(self, clock=time.time):
+        self._bursts = {}
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def add(self, sms):
+        """
+        Hold one part of a burst.  Returns True if it is the first, whose invocation is to send the burst.
+        """
+        with self._lock:
+            parts = self._bursts.get(sms.sender)
+            if parts and parts[0].received_at > self._clock() - STALE_BURST_SECONDS:
+                parts.append(sms)
+                return False
+            self._bursts[sms.sender] = [sms]
+            return True
+
+    def take(self, sender):
+        """
+        Every part held for sender, in the order they were received, clearing them.
+        """
+        with self._lock:
+            parts = self._bursts.pop(sender, [])
+        return sorted(parts, key=lambda part: (part.received_at, part.sid))
+
+
+class SQLiteBursts(object):
+    def __init__(self, path, clock=time.time):
+        self._clock = clock
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS sms_bursts ('
+            ' sender TEXT NOT NULL, sid TEXT NOT NULL, recipient TEXT, body TEXT NOT NULL, received_at REAL NOT NULL,'
+            ' PRIMARY KEY (sender, sid))'
+        )
+
+    def add(self, sms):
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            try:
+                self._connection.execute(
+                    'DELETE FROM sms_bursts WHERE sender = ? AND received_at <= ?',
+                    (sms.sender, self._clock() - STALE_BURST_SECONDS)
+                )
+                waiting = self._connection.execute(
+                    'SELECT COUNT(*) FROM sms_bursts WHERE sender = ?', (sms.sender,)
+                ).fetchone()[0]
+                self._connection.execute(
+                    'INSERT OR IGNORE INTO sms_bursts (sender, sid, recipient, body, received_at)'
+                    ' VALUES (?, ?, ?, ?, ?)', (sms.sender, sms.sid, sms.to, sms.body, sms.received_at)
+                )
+                self._connection.execute('COMMIT')
+            except Exception:
+                self._connection.execute('ROLLBACK')
+                raise
+        return waiting == 0
+
+    def take(self, sender):
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self._connection.execute(
+                    'SELECT sid, sender, recipient, body, received_at FROM sms_bursts WHERE sender = ?'
+                    ' ORDER BY received_at, sid', (sender,)
+                ).fetchall()
+                self._connection.execute('DELETE FROM sms_bursts WHERE sender = ?', (sender,))
+                self._connection.execute('COMMIT')
+            except Exception:
+                self._connection.execute('ROLLBACK')
+                raise
+        return [InboundSms(*row) for row in rows]
+
+
+class DynamoDBBursts(object):
+    """
+    Bursts table keyed on sender, with sort key part.  A conditional put of the '#lead' item picks the invocation that
+    sends the burst; each part is an item of its own.
+    """
+
+    def __init__(self, table, clock=time.time):
+        self._table = table
+        self._clock = clock
+
+    def _claim(self, sms):
+        try:
+            self._table.put_item(
+                Item={'sender': sms.sender, 'part': LEAD, 'claimed_at': sms.received_at},
+                ConditionExpression='attribute_not_exists(sender)'
+            )
+        except Exception as error:
+            if getattr(error, 'response', {}).get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+                return False
+            raise
+        return True
+
+    def add(self, sms):
+        leader = self._claim(sms)
+        if not leader:
+            lead = self._table.get_item(Key={'sender': sms.sender, 'part': LEAD}).get('Item')
+            if lead is None or float(lead['claimed_at']) <= self._clock() - STALE_BURST_SECONDS:
+                self._table.delete_item(Key={'sender': sms.sender, 'part': LEAD})
+                leader = self._claim(sms)
+        self._table.put_item(Item={
+            'sender': sms.sender, 'part': '{:017.6f}#{}'.format(sms.received_at, sms.sid), 'sid': sms.sid,
+            'recipient': sms.to, 'body': sms.body, 'received_at': sms.received_at,
+        })
+        return leader
+
+    def take(self, sender):
+        # Give up the lead first: a part arriving from here on starts the next burst instead of being left behind.
+        self._table.delete_item(Key={'sender': sender, 'part': LEAD})
+        items = []
+        request = {'KeyConditionExpression': 'sender = :sender', 'ExpressionAttributeValues': {':sender': sender}}
+        while True:
+            page = self._table.query(**request)
+            items.extend(item for item in page['Items'] if item['part'] != LEAD)
+            if 'LastEvaluatedKey' not in page:
+                break
+            request['ExclusiveStartKey'] = page['LastEvaluatedKey']
+        for item in items:
+            self._table.delete_item(Key={'sender': sender, 'part': item['part']})
+        return [InboundSms(item['sid'], sender, item.get('recipient'), item['body'], float(item['received_at']))
+                for item in sorted(items, key=lambda item: item['part'])]
+
+
+def bursts_from_env():
+    spec = os.environ.get('SMS_BURST_STORE', 'memory')
+    kind, _, target = spec.partition(':')
+    if kind == 'memory':
+        return InMemoryBursts()
+    if kind == 'sqlite':
+        return SQLiteBursts(target)
+    if kind == 'dynamodb':
+        boto3 = lazy_import('boto3')
+        return DynamoDBBursts(boto3.resource('dynamodb').Table(target))
+    raise ValueError('Unsupported SMS_BURST_STORE {}'.format(spec))
+
+
+""" --- Gateway --- """
+
+
+class SmsGateway(object):
+    """
+    Turns Twilio webhooks into PostText calls and the bot's answers into TwiML.
+    """
+
+    def __init__(self, lex, bot_name=BOT_NAME, bot_alias=BOT_ALIAS, bursts=None, window=BURST_WINDOW_SECONDS,
+                 auth_token=None, skip_signature=False, url=None, respond=None, clock=time.time, sleep=time.sleep):
+        self._lex = lex
+        self._bot_name = bot_name
+        self._bot_alias = bot_alias
+        self._bursts = bursts if bursts is not None else InMemoryBursts(clock)
+        self._window = window
+        self._auth_token = auth_token
+        self._skip_signature = skip_signature
+        self._url = url
+        self._respond = respond or (lambda phone, text: approvals.shared().respond(phone, text))
+        self._clock = clock
+        self._sleep = sleep
+        self.received = 0
+        self.collapsed = 0
+        self.posted = 0
+        if not auth_token and skip_signature:
+            logger.warning('TWILIO_SKIP_SIGNATURE is set, accepting webhooks without checking their signature')
+        elif not auth_token:
+            logger.error('TWILIO_AUTH_TOKEN is not set, rejecting every webhook')
+
+    def parse(self, event):
+        """
+        The InboundSms an API Gateway proxy event carries, after checking Twilio signed it.
+        """
+        params = webhook_params(event)
+        if self._auth_token:
+            headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+            expected = expected_signature(self._url or webhook_url(event), params, self._auth_token)
+            if not hmac.compare_digest(expected, headers.get('x-twilio-signature', '')):
+                raise WebhookError(403, 'Twilio signature does not match')
+        elif not self._skip_signature:
+            raise WebhookError(403, 'TWILIO_AUTH_TOKEN is not set, so the signature cannot be checked')
+        if not params.get('From') or not params.get('MessageSid') or 'Body' not in params:
+            raise WebhookError(400, 'Not a Twilio message webhook')
+        try:
+            sender = normalize_phone(params['From'])
+        except ValueError:
+            raise WebhookError(400, 'Unrecognised sender {}'.format(params['From']))
+        return InboundSms(params['MessageSid'], sender, params.get('To'), params['Body'], self._clock())
+
+    def handle(self, event):
+        """
+        Answer one webhook with an API Gateway proxy response holding TwiML.
+        """
+        try:
+            sms = self.parse(event)
+        except WebhookError as e:
+            logger.warning('rejected webhook: %s', e)
+            return http_response(e.status, EMPTY_TWIML)
+        self.received += 1
+
+        if approvals.parse_reply(sms.body):
+            decision = self._respond(sms.sender, sms.body)
+            if decision is None:
+                return http_response(200, twiml(['Sorry, I could not find that request.']))
+            if decision.decided_by != sms.sender:
+                return http_response(200, twiml(['Another guardian has already answered that request.']))
+            return http_response(200, twiml(['Thanks, I will let them know.']))
+
+        if self._window > 0:
+            if not self._bursts.add(sms):
+                # Another invocation holds the first part of this burst and will send this part with it.
+                self.collapsed += 1
+                return http_response(200, EMPTY_TWIML)
+            try:
+                self._sleep(self._window)
+            finally:
+                parts = self._bursts.take(sms.sender)
+            text = ' '.join(part.body.strip() for part in parts if part.body.strip())
+            sid = parts[0].sid if parts else sms.sid
+        else:
+            text, sid = sms.body.strip(), sms.sid
+        if not text:
+            return http_response(200, EMPTY_TWIML)
+
+        self.posted += 1
+        response = self._lex.post_text(
+            self._bot_name, self._bot_alias, sms.sender.lstrip('+'), text, request_attributes={'turnId': sid}
+        )
+        return http_response(200, twiml(lex_messages(response)))
+
+
+def shared():
+    """
+    The container-wide gateway, with its Lex runtime connections kept open across invocations.
+    """
+    global _shared
+    if _shared is None:
+        bursts = bursts_from_env()
+        window = BURST_WINDOW_SECONDS
+        if window > 0 and isinstance(bursts, InMemoryBursts):
+            logger.warning('SMS_BURST_WINDOW_SECONDS needs an SMS_BURST_STORE every container sees, sending parts on '
+                           'their own')
+            window = 0
+        _shared = SmsGateway(
+            lexruntime.client_from_env(), bursts=bursts, window=window, auth_token=os.environ.get('TWILIO_AUTH_TOKEN'),
+            skip_signature=SKIP_SIGNATURE, url=os.environ.get('SMS_WEBHOOK_URL')
+        )
+    return _shared
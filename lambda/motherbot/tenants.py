@@ -0,0 +1,282 @@
+"""
+Households served by one deployment, looked up by the Lex userId of whoever is talking to the bot.
+
+Each household has its own time zone, approved public places, call categories, guardians and activity window; its
+contacts and calendar are already partitioned by household id in motherbot.contacts and motherbot.calendar_store.
+The store maps users to households and households to their settings:
+
+    memory             in this container only, filled with put_household() and assign() (the default)
+    sqlite:<path>      tables tenant_households and tenant_users
+    dynamodb:<table>   one table keyed on tenant_key, with 'user#<userId>' and 'household#<id>' items
+
+chosen with TENANT_STORE.  Users the store does not know belong to the household configured on the function itself
+(HOUSEHOLD_ID, HOUSEHOLD_TIMEZONE, GUARDIAN_PHONES, ACTIVITY_WINDOW_MINUTES), so a single household deployment
+needs no store at all.  Settings a household leaves out fall back to the same values.
+
+TenantCache puts the store behind a cache keyed on userId, so resolving a turn's household is one dict lookup.  The
+cache is split into TENANT_CACHE_SHARDS shards, each an LRU of at most TENANT_CACHE_SIZE / shards users with its own
+lock, so concurrent loads for different users do not queue behind each other and eviction only ever walks one small
+shard.  Entries live for TENANT_CACHE_TTL_SECONDS, which bounds how long a settings change takes to reach a warm
+container; invalidate() applies one straight away.
+"""
+
+import collections
+import json
+import os
+import threading
+import time
+
+from motherbot import clock
+from motherbot.contacts import normalize_phone
+from motherbot.lazy import lazy_import
+
+sqlite3 = lazy_import('sqlite3')
+
+CACHE_SIZE = int(os.environ.get('TENANT_CACHE_SIZE', '4096'))
+CACHE_SHARDS = int(os.environ.get('TENANT_CACHE_SHARDS', '16'))
+CACHE_TTL_SECONDS = float(os.environ.get('TENANT_CACHE_TTL_SECONDS', '300'))
+
+# Kinds of callee the WhoCall slot type has always allowed; anyone else has to be an approved contact.
+DEFAULT_CALL_CATEGORIES = ('library', 'theater', 'friends')
+
+# places is None when a household accepts every place the bot's ApprovedPublicPlaces slot type offers.
+Household = collections.namedtuple(
+    'Household', 'household_id timezone places call_categories guardians activity_window_minutes'
+)
+
+
+def default_config():
+    """
+    Settings of the household configured on the function, used for unknown users and for settings left out.
+    """
+    return {
+        'householdId': os.environ.get('HOUSEHOLD_ID', 'default'),
+        'timezone': os.environ.get('HOUSEHOLD_TIMEZONE', clock.DEFAULT_TIMEZONE),
+        'places': None,
+        'callCategories': list(DEFAULT_CALL_CATEGORIES),
+        'guardians': [phone for phone in os.environ.get('GUARDIAN_PHONES', '').split(',') if phone.strip()],
+        'activityWindowMinutes': int(os.environ.get('ACTIVITY_WINDOW_MINUTES', '120')),
+    }
+
+
+def build_household(household_id, config, defaults):
+    """
+    A Household from stored settings, taking anything config leaves out from defaults.
+    """
+    def setting(name):
+        value = config.get(name)
+        return defaults[name] if value is None else value
+
+    places = setting('places')
+    return Household(
+        household_id,
+        clock.get_timezone(setting('timezone')),
+        None if places is None else frozenset(place.lower() for place in places),
+        frozenset(category.lower() for category in setting('callCategories')),
+        tuple(normalize_phone(phone) for phone in setting('guardians')),
+        int(setting('activityWindowMinutes')),
+    )
+
+
+""" --- Stores --- """
+
+
+class InMemoryTenantStore(object):
+    def __init__(self):
+        self._households = {}
+        self._users = {}
+
+    def household_id(self, user_id):
+        return self._users.get(user_id)
+
+    def config(self, household_id):
+        return self._households.get(household_id)
+
+    def put_household(self, household_id, config):
+        self._households[household_id] = dict(config)
+
+    def assign(self, user_id, household_id):
+        self._users[user_id] = household_id
+
+
+class SQLiteTenantStore(object):
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        with self._connection:
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS tenant_households (household_id TEXT PRIMARY KEY, config TEXT NOT NULL)'
+            )
+            self._connection.execute(
+                'CREATE TABLE IF NOT EXISTS tenant_users (user_id TEXT PRIMARY KEY, household_id TEXT NOT NULL)'
+            )
+
+    def household_id(self, user_id):
+        row = self._connection.execute(
+            'SELECT household_id FROM tenant_users WHERE user_id = ?', (user_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def config(self, household_id):
+        row = self._connection.execute(
+            'SELECT config FROM tenant_households WHERE household_id = ?', (household_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_household(self, household_id, config):
+        with self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO tenant_households (household_id, config) VALUES (?, ?)',
+                (household_id, json.dumps(config))
+            )
+
+    def assign(self, user_id, household_id):
+        with self._connection:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO tenant_users (user_id, household_id) VALUES (?, ?)', (user_id, household_id)
+            )
+
+
+class DynamoDBTenantStore(object):
+    """
+    Store over a boto3 DynamoDB Table resource, or anything with the same get_item/put_item interface.
+    """
+
+    def __init__(self, table):
+        self._table = table
+
+    def household_id(self, user_id):
+        item = self._table.get_item(Key={'tenant_key': 'user#' + user_id}).get('Item')
+        return item['household_id'] if item else None
+
+    def config(self, household_id):
+        item = self._table.get_item(Key={'tenant_key': 'household#' + household_id}).get('Item')
+        return json.loads(item['config']) if item else None
+
+    def put_household(self, household_id, config):
+        self._table.put_item(Item={'tenant_key': 'household#' + household_id, 'config': json.dumps(config)})
+
+    def assign(self, user_id, household_id):
+        self._table.put_item(Item={'tenant_key': 'user#' + user_id, 'household_id': household_id})
+
+
+def store_from_env():
+    spec = os.environ.get('TENANT_STORE', 'memory')
+    kind, _, target = spec.partition(':')
+    if kind == 'memory':
+        return InMemoryTenantStore()
+    if kind == 'sqlite':
+        return SQLiteTenantStore(target)
+    if kind == 'dynamodb':
+        boto3 = lazy_import('boto3')
+        return DynamoDBTenantStore(boto3.resource('dynamodb').Table(target))
+    raise ValueError('Unsupported TENANT_STORE {}'.format(spec))
+
+
+""" --- Cache --- """
+
+
+class _Shard(object):
+    __slots__ = ('entries', 'lock')
+
+    def __init__(self):
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+
+class TenantCache(object):
+    """
+    userId -> Household over a store, as sharded LRUs whose entries expire ttl seconds after they were loaded.
+    """
+
+    def __init__(self, store, defaults=None, size=CACHE_SIZE, shards=CACHE_SHARDS, ttl=CACHE_TTL_SECONDS,
+                 clock=time.monotonic):
+        self._store = store
+        self._defaults = defaults or default_config()
+        self._ttl = ttl
+        self._clock = clock
+        # A power of two number of shards, so picking one is a mask of the key's hash.
+        count = 1
+        while count < shards:
+            count *= 2
+        self._mask = count - 1
+        self._shards = [_Shard() for _ in range(count)]
+        self._shard_size = max(1, size // count)
+        # Household id -> (expires, Household), so every member of a household shares one object.
+        self._households = {}
+        self._households_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def household(self, user_id):
+        """
+        The Household user_id belongs to.
+        """
+        shard = self._shards[hash(user_id) & self._mask]
+        entry = shard.entries.get(user_id)
+        if entry is not None and entry[0] > self._clock():
+            self.hits += 1
+            try:
+                shard.entries.move_to_end(user_id)
+            except KeyError:
+                # Evicted by another thread since the get; the entry read is still good for this turn.
+                pass
+            return entry[1]
+
+        self.misses += 1
+        household_id = self._store.household_id(user_id) or self._defaults['householdId']
+        household = self.by_id(household_id)
+        entries = shard.entries
+        with shard.lock:
+            entries.pop(user_id, None)
+            entries[user_id] = (self._clock() + self._ttl, household)
+            while len(entries) > self._shard_size:
+                entries.popitem(last=False)
+        return household
+
+    def by_id(self, household_id):
+        """
+        The Household with household_id, which need not have any users assigned.
+        """
+        now = self._clock()
+        entry = self._households.get(household_id)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        household = build_household(household_id, self._store.config(household_id) or {}, self._defaults)
+        with self._households_lock:
+            self._households[household_id] = (now + self._ttl, household)
+        return household
+
+    def invalidate(self, household_id=None):
+        """
+        Forget household_id's settings and which users belong to it, or everything when household_id is None.
+        """
+        with self._households_lock:
+            if household_id is None:
+                self._households.clear()
+            else:
+                self._households.pop(household_id, None)
+        for shard in self._shards:
+            with shard.lock:
+                if household_id is None:
+                    shard.entries.clear()
+                else:
+                    stale = [user for user, entry in shard.entries.items() if entry[1].household_id == household_id]
+                    for user in stale:
+                        del shard.entries[user]
+
+    def __len__(self):
+        return sum(len(shard.entries) for shard in self._shards)
+
+
+_shared = None
+
+
+def shared():
+    """
+    The container-wide tenant cache over the store named by TENANT_STORE, created on first use.
+    """
+    global _shared
+    if _shared is None:
+        _shared = TenantCache(store_from_env())
+    return _shared
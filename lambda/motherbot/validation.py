@@ -0,0 +1,196 @@
+"""
+Declarative slot validation compiled into flat functions.
+
+A validator is described as an ordered list of rules, each naming the slot it reports as violated:
+
+    member(slot, values, message)          value.lower() must be in values
+    date(slot, message)                    value must parse as a date
+    future(slot, message)                  date must be after today in the household time zone
+    weekday(slot, message)                 date must fall Monday to Friday
+    after(slot, other, message)            date must be after the other slot's date (when both are filled)
+    within_days(slot, other, days, message)  dates at most days apart (when both are filled)
+    int_range(slot, minimum, maximum, message)  whole number within the bounds (either may be None)
+    clock_time(slot, message)              an HH:MM time
+    hour_range(slot, first, last, message) hour of an HH:MM time within first..last
+    minute_in(slot, minutes, message)      minute of an HH:MM time one of minutes
+
+Rules for empty slots are skipped, and messages containing {} are formatted with the slot value.  compile_validator
+turns a rule list into the source of one function, executed once at cold start.  Each slot is read from the slots
+dict once, dates and times are parsed once, and the function returns at the first violated rule, so validating a turn
+runs no closures, loops or try blocks.  Results are built by the handler's own build_validation_result, and fixed
+messages are interned with motherbot.responses.constant.
+"""
+
+import collections
+
+from motherbot import clock, responses
+from motherbot.dates import parse_date
+
+Rule = collections.namedtuple('Rule', 'kind slot message params')
+
+_INT = 'int'
+_DATE = 'date'
+_TIME = 'time'
+_VALUE_KINDS = {
+    'member': None, 'date': _DATE, 'future': _DATE, 'weekday': _DATE, 'after': _DATE, 'within_days': _DATE,
+    'int_range': _INT, 'clock_time': _TIME, 'hour_range': _TIME, 'minute_in': _TIME,
+}
+
+
+def member(slot, values, message):
+    return Rule('member', slot, message, {'values': values})
+
+
+def date(slot, message):
+    return Rule('date', slot, message, {})
+
+
+def future(slot, message):
+    return Rule('future', slot, message, {})
+
+
+def weekday(slot, message):
+    return Rule('weekday', slot, message, {})
+
+
+def after(slot, other, message):
+    return Rule('after', slot, message, {'other': other})
+
+
+def within_days(slot, other, days, message):
+    return Rule('within_days', slot, message, {'other': other, 'days': days})
+
+
+def int_range(slot, minimum, maximum, message):
+    return Rule('int_range', slot, message, {'minimum': minimum, 'maximum': maximum})
+
+
+def clock_time(slot, message):
+    return Rule('clock_time', slot, message, {})
+
+
+def hour_range(slot, first, last, message):
+    return Rule('hour_range', slot, message, {'first': first, 'last': last})
+
+
+def minute_in(slot, minutes, message):
+    return Rule('minute_in', slot, message, {'minutes': frozenset(minutes)})
+
+
+def _parse_date(value):
+    try:
+        return parse_date(value)
+    except ValueError:
+        return None
+
+
+def _parse_clock(value):
+    """
+    (hour, minute) of an HH:MM value, or None.
+    """
+    parts = value.split(':')
+    if len(value) != 5 or len(parts) != 2:
+        return None
+    try:
+        return int(parts[0]), int(parts[1])
+    except ValueError:
+        return None
+
+
+def _to_int(value):
+    return int(value) if value is not None else None
+
+
+def compile_validator(name, rules, result, valid):
+    """
+    Build validator(slots, dates=None) for rules.  result(is_valid, slot, message) builds a violation and valid() the
+    value returned when every rule passes.  dates is an optional DateMemo shared with the rest of the request.
+    """
+    namespace = {
+        'result': result, 'valid': valid, 'today': clock.today, 'parse_date': _parse_date,
+        'parse_clock': _parse_clock, 'to_int': _to_int,
+    }
+    slots = []
+    for rule in rules:
+        for slot in (rule.slot, rule.params.get('other')):
+            if slot and slot not in slots:
+                slots.append(slot)
+    var = {slot: 's{}'.format(index) for index, slot in enumerate(slots)}
+    kinds = {}
+    for rule in rules:
+        kind = _VALUE_KINDS[rule.kind]
+        if kind is not None:
+            kinds.setdefault(rule.slot, kind)
+            if 'other' in rule.params:
+                kinds.setdefault(rule.params['other'], kind)
+
+    lines = [
+        'def {}(slots, dates=None):'.format(name),
+        '    parse = dates.parse if dates is not None else parse_date',
+        '    get = slots.get',
+    ]
+    for slot in slots:
+        read = 'get({!r})'.format(slot)
+        lines.append('    {} = {}'.format(var[slot], 'to_int({})'.format(read) if kinds.get(slot) == _INT else read))
+
+    parsed = set()
+
+    def parsed_value(slot):
+        # Parsed values are computed where a rule first needs them, so earlier violations still return first.
+        target = 'p' + var[slot][1:]
+        if slot not in parsed:
+            parsed.add(slot)
+            parser = 'parse' if kinds[slot] == _DATE else 'parse_clock'
+            lines.append('    {} = {}({}) if {} else None'.format(target, parser, var[slot], var[slot]))
+        return target
+
+    for index, rule in enumerate(rules):
+        value = var[rule.slot]
+        message = 'm{}'.format(index)
+        namespace[message] = rule.message
+        if rule.kind == 'member':
+            namespace['v{}'.format(index)] = frozenset(rule.params['values'])
+            condition = '{0} and {0}.lower() not in v{1}'.format(value, index)
+        elif rule.kind == 'int_range':
+            bounds = []
+            if rule.params['minimum'] is not None:
+                bounds.append('{} < {!r}'.format(value, rule.params['minimum']))
+            if rule.params['maximum'] is not None:
+                bounds.append('{} > {!r}'.format(value, rule.params['maximum']))
+            condition = '{} is not None and ({})'.format(value, ' or '.join(bounds))
+        elif rule.kind in ('after', 'within_days'):
+            mine, theirs = parsed_value(rule.slot), parsed_value(rule.params['other'])
+            if rule.kind == 'after':
+                check = '{} >= {}'.format(theirs, mine)
+            else:
+                check = 'abs({} - {}).days > {!r}'.format(mine, theirs, rule.params['days'])
+            condition = '{} is not None and {} is not None and {}'.format(mine, theirs, check)
+        else:
+            parsed_slot = parsed_value(rule.slot)
+            check = {
+                'date': '{0} is None',
+                'future': '{0} is not None and {0} <= today()',
+                'weekday': '{0} is not None and {0}.weekday() >= 5',
+                'clock_time': '{0} is None',
+                'hour_range': '{0} is not None and ({0}[0] < {1[first]!r} or {0}[0] > {1[last]!r})',
+                'minute_in': '{0} is not None and {0}[1] not in n{2}',
+            }[rule.kind].format(parsed_slot, rule.params, index)
+            if rule.kind == 'minute_in':
+                namespace['n{}'.format(index)] = rule.params['minutes']
+            condition = check if rule.kind not in ('date', 'clock_time') else '{} and {}'.format(value, check)
+
+        if '{}' in rule.message:
+            text = '{}.format({})'.format(message, value)
+        else:
+            # Fixed messages are interned so build_validation_result's responses.message() finds the shared object.
+            responses.constant(rule.message)
+            text = message
+        lines.append('    if {}:'.format(condition))
+        lines.append('        return result(False, {!r}, {})'.format(rule.slot, text))
+
+    lines.append('    return valid()')
+    source = '\n'.join(lines) + '\n'
+    exec(compile(source, '<validator {}>'.format(name), 'exec'), namespace)
+    validator = namespace[name]
+    validator.source = source
+    return validator
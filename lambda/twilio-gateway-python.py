@@ -0,0 +1,21 @@
+"""
+ This Lambda sits behind the API Gateway endpoint Twilio posts incoming SMS to, and passes them on to a Lex bot.
+ The bot is chosen with the BOT_NAME and BOT_ALIAS environment variables; see motherbot.smsgateway for the rest.
+
+"""
+
+from motherbot import logs, metrics, smsgateway
+
+logger = logs.configure()
+
+
+""" --- Main handler --- """
+
+
+@logs.logged
+@metrics.flushed
+def lambda_handler(event, context):
+    """
+    Answer a Twilio webhook, delivered as an API Gateway proxy event, with TwiML.
+    """
+    return smsgateway.shared().handle(event)
@@ -0,0 +1,64 @@
+"""
+Shared setup for the tests: the lambda directory on sys.path, local-only settings and Lex event builders.
+"""
+
+import importlib.util
+import os
+import sys
+
+import pytest
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDA_DIR = os.path.join(REPO_ROOT, 'lambda')
+
+if LAMBDA_DIR not in sys.path:
+    sys.path.insert(0, LAMBDA_DIR)
+
+# Deployments must name these; the tests run everything in one process.
+os.environ.setdefault('APPROVAL_STORE', 'memory')
+os.environ.setdefault('OTP_SECRET', 'test-only')
+
+HANDLERS = {
+    'motherbot': 'lex-motherbot-python',
+    'booktrip': 'lex-booktrip-python',
+    'gateway': 'twilio-gateway-python',
+}
+
+
+def load_handler(name):
+    """
+    Import a handler file by its key in HANDLERS and return the module.
+    """
+    stem = HANDLERS[name]
+    spec = importlib.util.spec_from_file_location(stem.replace('-', '_'), os.path.join(LAMBDA_DIR, stem + '.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def lex_event(intent_name, slots, source='DialogCodeHook', session_attributes=None, confirmation_status='None',
+              user_id='test-user', bot_name='MotherBot', request_attributes=None):
+    """
+    A Lex V1 code hook event.
+    """
+    return {
+        'messageVersion': '1.0',
+        'invocationSource': source,
+        'userId': user_id,
+        'sessionAttributes': session_attributes,
+        'requestAttributes': request_attributes,
+        'bot': {'name': bot_name, 'alias': '$LATEST', 'version': '$LATEST'},
+        'outputDialogMode': 'Text',
+        'currentIntent': {'name': intent_name, 'slots': dict(slots), 'confirmationStatus': confirmation_status},
+        'inputTranscript': ''
+    }
+
+
+@pytest.fixture(scope='session')
+def motherbot():
+    return load_handler('motherbot')
+
+
+@pytest.fixture(scope='session')
+def booktrip():
+    return load_handler('booktrip')
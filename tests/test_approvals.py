@@ -0,0 +1,147 @@
+import threading
+
+import pytest
+
+from conftest import lex_event
+from motherbot import approvals, contacts
+from motherbot.fakes.dynamodb import FakeDynamoTable
+
+MUM = '+12015550101'
+DAD = '+12015550102'
+
+
+class Texts(object):
+    def __init__(self):
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def __call__(self, phone, text):
+        with self._lock:
+            self.sent.append((phone, text))
+
+
+@pytest.fixture(scope='module')
+def texts():
+    return Texts()
+
+
+@pytest.fixture(scope='module')
+def worker(texts):
+    _, queue, worker = approvals.start_worker_thread(approvals.AsyncioQueue, texts)
+    return queue, worker
+
+
+@pytest.fixture
+def service(worker):
+    queue, worker = worker
+    return approvals.ApprovalService(queue, approvals.InMemoryApprovals(), guardians=lambda household: (MUM, DAD),
+                                     worker=worker, timeout=60)
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'dynamodb'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return approvals.InMemoryApprovals()
+    if request.param == 'sqlite':
+        return approvals.SQLiteApprovals(str(tmp_path / 'approvals.db'))
+    return approvals.DynamoDBApprovals(FakeDynamoTable('approvals', 'approval_id'))
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('YES 1f0c93ab52d7e640', ('1f0c93ab52d7e640', approvals.APPROVED)),
+    ('ok: 1F0C93AB52D7E640 thanks', ('1f0c93ab52d7e640', approvals.APPROVED)),
+    ('no 1f0c93ab52d7e640', ('1f0c93ab52d7e640', approvals.DENIED)),
+    ('yes', None),
+    ('maybe 1f0c93ab52d7e640', None),
+    (None, None),
+])
+def test_parse_reply(text, expected):
+    assert approvals.parse_reply(text) == expected
+
+
+def test_first_decision_wins(store):
+    approval = approvals.Approval('a1', 'home', 'kid', 'CanISee', 'can I see Up', (MUM, DAD), approvals.PENDING,
+                                  None, None)
+    store.create(approval)
+    assert store.decide('a1', approvals.DENIED, DAD)
+    assert not store.decide('a1', approvals.APPROVED, MUM)
+    assert not store.decide('missing', approvals.APPROVED, MUM)
+    decided = store.get('a1')
+    assert (decided.status, decided.decided_by, decided.guardians) == (approvals.DENIED, DAD, (MUM, DAD))
+
+
+def test_request_texts_every_guardian(service, texts):
+    approval_id = service.request('home', 'kid', 'CanISee', 'can I see Up')
+    assert service.drain(2)
+    sent = [phone for phone, text in texts.sent if approval_id in text]
+    assert sorted(sent) == [MUM, DAD]
+
+
+def test_replies_decide_once(service):
+    approval_id = service.request('home', 'kid', 'CanIGOTO', 'can I go to the park')
+    assert service.respond('+12015550199', 'YES ' + approval_id) is None
+    assert service.respond(MUM, 'hello') is None
+    assert service.status(approval_id, requested_at=0, now=30) == approvals.PENDING
+
+    assert service.respond(MUM, 'YES ' + approval_id).status == approvals.APPROVED
+    decided = service.respond(DAD, 'NO ' + approval_id)
+    assert (decided.status, decided.decided_by) == (approvals.APPROVED, MUM)
+    assert service.status(approval_id, requested_at=0, now=3600) == approvals.APPROVED
+
+
+def test_unanswered_approvals_expire(service):
+    approval_id = service.request('home', 'kid', 'CanISee', 'can I see Up')
+    assert service.status(approval_id, requested_at=0, now=61) == approvals.EXPIRED
+
+
+def test_yes_approves_the_contact(service, monkeypatch):
+    directory = contacts.ContactDirectory(contacts.InMemoryContactsBackend())
+    monkeypatch.setattr(contacts, '_shared', directory)
+    contact = directory.add('home', 'Sam', '2014317268', approved=False)
+    approval_id = service.request('home', 'kid', 'MeetAFriend', 'can I add Sam', contact.contact_id)
+    service.respond(DAD, 'y ' + approval_id)
+    assert directory.is_approved('home', 'Sam')
+
+
+def test_drain_ignores_approvals_left_on_a_shared_queue(tmp_path):
+    # The worker is never started, as if another container's worker would take everything off the queue.
+    queue = approvals.SQLiteQueue(str(tmp_path / 'queue.db'))
+    service = approvals.ApprovalService(queue, approvals.InMemoryApprovals(), guardians=lambda household: (MUM,),
+                                        worker=approvals.ApprovalWorker(queue, Texts()))
+    service.request('home', 'kid', 'CanISee', 'can I see Up')
+    assert service.drain(0.1)
+
+
+def test_code_hook_reports_the_decision(motherbot, service, monkeypatch):
+    monkeypatch.setattr(approvals, '_shared', service)
+    slots = {'FriendHouse': 'Sam', 'PublicPlaces': None}
+    response = motherbot.lambda_handler(lex_event('CanIGOTO', slots, source='FulfillmentCodeHook'), None)
+    attributes = response['sessionAttributes']
+    assert attributes['approvalStatus'] == approvals.PENDING
+
+    response = motherbot.lambda_handler(lex_event('CanIGOTO', slots, session_attributes=dict(attributes)), None)
+    assert 'have not answered' in response['dialogAction']['message']['content']
+
+    service.respond(MUM, 'NO ' + attributes['approvalId'])
+    response = motherbot.lambda_handler(lex_event('CanIGOTO', slots, session_attributes=dict(attributes)), None)
+    assert response['dialogAction']['fulfillmentState'] == 'Failed'
+    assert 'said no to Sam' in response['dialogAction']['message']['content']
+    assert 'approvalId' not in response['sessionAttributes']
+
+
+def test_code_hook_without_an_approval_store(motherbot, monkeypatch):
+    monkeypatch.setattr(approvals, '_shared', None)
+    monkeypatch.delenv('APPROVAL_STORE')
+    response = motherbot.lambda_handler(
+        lex_event('CanISee', {'Events': None, 'Movies': 'Up', 'Concerts': None}, source='FulfillmentCodeHook'), None
+    )
+    assert response['dialogAction']['fulfillmentState'] == 'Failed'
+    assert response['dialogAction']['message']['content'] == motherbot.APPROVALS_UNAVAILABLE
+
+    pending = {'approvalId': 'a1', 'approvalIntent': 'CanISee', 'approvalSubject': 'Up',
+               'approvalStatus': approvals.PENDING, 'approvalRequested': '0'}
+    response = motherbot.lambda_handler(
+        lex_event('CanISee', {'Events': None, 'Movies': 'Up', 'Concerts': None}, session_attributes=pending), None
+    )
+    assert response['dialogAction']['fulfillmentState'] == 'Failed'
+    assert 'approvalId' not in response['sessionAttributes']
@@ -0,0 +1,53 @@
+import datetime
+
+from motherbot import availability, calendar_store, clock
+
+MONDAY = datetime.date(2026, 3, 2)
+
+
+def test_mask_round_trip_and_fits():
+    mask = availability.mask_from_times(['10:00', '10:30', '16:00'])
+    assert availability.times_from_mask(mask) == ['10:00', '10:30', '16:00']
+    assert availability.fits(mask, '10:00', 60)
+    assert not availability.fits(mask, '10:30', 60)
+    assert not availability.fits(mask, '10:15', 30)
+
+
+def test_starts_for_duration():
+    mask = availability.window('9:00', '11:00')
+    assert availability.times_from_mask(availability.starts_for_duration(mask, 90)) == ['9:00', '9:30']
+
+
+def test_calendar_intersects_members():
+    calendar = availability.AvailabilityCalendar()
+    calendar.add_free('mum', MONDAY, '9:00', '12:00')
+    calendar.add_free('sam', MONDAY, '10:00', '17:00')
+    calendar.add_busy('sam', MONDAY, '10:30', '11:00')
+    assert calendar.free_starts(MONDAY, 60, ['mum', 'sam']) == ['11:00']
+    assert calendar.is_free(MONDAY, '11:00', 60, ['mum', 'sam'])
+    assert not calendar.is_free(MONDAY, '10:00', 60, ['mum', 'sam'])
+
+
+def test_calendar_free_range_skips_days_without_room():
+    calendar = availability.AvailabilityCalendar()
+    tuesday = MONDAY + datetime.timedelta(days=1)
+    wednesday = MONDAY + datetime.timedelta(days=2)
+    for member in ('mum', 'sam'):
+        calendar.add_free(member, MONDAY, '9:00', '10:00')
+        calendar.add_free(member, wednesday, '14:00', '16:00')
+    calendar.add_free('mum', tuesday, '9:00', '17:00')
+    found = calendar.free_range(MONDAY, wednesday, 60, ['mum', 'sam'], within=availability.window('10:00', '17:00'))
+    assert found == {wednesday: ['14:00', '14:30', '15:00']}
+
+
+def test_household_calendar_builds_range_from_events():
+    store = calendar_store.HouseholdCalendar(calendar_store.InMemoryBackend())
+    tz = clock.HOUSEHOLD_TIMEZONE
+    busy_from = datetime.datetime.combine(MONDAY, datetime.time(9), tzinfo=tz)
+    store.add_event('home', 'sam', busy_from, busy_from + datetime.timedelta(hours=8))
+    store.add_event('home', 'mum', busy_from, busy_from + datetime.timedelta(hours=1))
+    calendar = store.availability('home', ['mum', 'sam'], MONDAY, MONDAY + datetime.timedelta(days=1))
+    assert calendar.free_starts(MONDAY, 60, ['mum', 'sam'], within=availability.window('8:00', '18:00')) == [
+        '8:00', '17:00', '17:30'
+    ]
+    assert calendar.is_free(MONDAY + datetime.timedelta(days=1), '9:00', 60, ['mum', 'sam'])
@@ -0,0 +1,78 @@
+import datetime
+import random
+
+import pytest
+
+from motherbot import calendar_store
+from motherbot.fakes.dynamodb import FakeDynamoTable
+
+START = datetime.datetime(2026, 3, 2, 8, tzinfo=datetime.timezone.utc)
+
+
+def at(hour, minute=0):
+    return START.replace(hour=hour, minute=minute)
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'dynamodb'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return calendar_store.InMemoryBackend()
+    if request.param == 'sqlite':
+        return calendar_store.SQLiteBackend(str(tmp_path / 'calendar.db'))
+    return calendar_store.DynamoDBBackend(FakeDynamoTable('calendar', 'household', 'event_id'))
+
+
+def test_index_matches_a_scan():
+    generator = random.Random(3)
+    events = []
+    for number in range(300):
+        start = generator.randint(0, 10000)
+        events.append(calendar_store.Event(str(number), 'sam', start, start + generator.randint(1, 600), None))
+    index = calendar_store.IntervalIndex(events)
+    for _ in range(200):
+        start = generator.randint(-100, 10500)
+        end = start + generator.randint(0, 900)
+        expected = sorted(event.event_id for event in events if event.start < end and event.end > start)
+        assert sorted(event.event_id for event in index.overlapping(start, end)) == expected
+
+
+def test_conflicts_busy_and_free_slots(backend):
+    calendar = calendar_store.HouseholdCalendar(backend)
+    calendar.add_event('home', 'sam', at(9), at(10), 'Swim')
+    calendar.add_event('home', 'mum', at(9, 30), at(11), 'Dentist')
+    calendar.add_event('home', 'mum', at(13), at(14), 'Call')
+
+    assert [event.title for event in calendar.conflicts('home', ['sam', 'mum'], at(10), at(12))] == ['Dentist']
+    assert calendar.conflicts('home', ['sam'], at(10), at(11)) == []
+    assert calendar.busy('home', ['sam', 'mum'], at(8), at(18)) == [
+        (calendar_store.to_epoch(at(9)), calendar_store.to_epoch(at(11))),
+        (calendar_store.to_epoch(at(13)), calendar_store.to_epoch(at(14))),
+    ]
+    assert calendar.free_slots('home', ['sam', 'mum'], at(8), at(15), 90) == [(at(11), at(13))]
+
+
+def test_writes_reach_the_backend(backend):
+    calendar_store.HouseholdCalendar(backend).add_event('home', 'sam', at(9), at(10), event_id='swim')
+    reloaded = calendar_store.HouseholdCalendar(backend)
+    assert [event.event_id for event in reloaded.conflicts('home', ['sam'], at(8), at(12))] == ['swim']
+
+    assert reloaded.remove_event('home', 'swim')
+    assert calendar_store.HouseholdCalendar(backend).conflicts('home', ['sam'], at(8), at(12)) == []
+
+
+def test_cached_household_reloads_after_ttl():
+    backend = calendar_store.InMemoryBackend()
+    now = [0.0]
+    calendar = calendar_store.HouseholdCalendar(backend, ttl=60, clock=lambda: now[0])
+    assert calendar.conflicts('home', ['sam'], at(8), at(12)) == []
+
+    calendar_store.HouseholdCalendar(backend).add_event('home', 'sam', at(9), at(10))
+    assert calendar.conflicts('home', ['sam'], at(8), at(12)) == []
+    now[0] = 61.0
+    assert len(calendar.conflicts('home', ['sam'], at(8), at(12))) == 1
+
+
+def test_rejects_empty_events():
+    calendar = calendar_store.HouseholdCalendar(calendar_store.InMemoryBackend())
+    with pytest.raises(ValueError):
+        calendar.add_event('home', 'sam', at(10), at(10))
@@ -0,0 +1,83 @@
+import pytest
+
+from conftest import lex_event
+from motherbot import carryover
+
+
+@pytest.fixture
+def clock():
+    return [0.0]
+
+
+@pytest.fixture
+def cache(clock):
+    return carryover.CarryOver(ttl=300, size=2, clock=lambda: clock[0])
+
+
+def test_recall_prefers_the_latest_entity(cache, clock):
+    cache.remember('kid', {'Calling': 'Sam', 'Movies': None})
+    clock[0] = 10
+    cache.remember('kid', {'Movies': 'Up'})
+    assert cache.recall('kid', ('Events', 'Movies', 'Concerts')) == ('Movies', 'Up')
+    # A friend resolved for a call is offered as the friend whose house to visit.
+    assert cache.recall('kid', ('FriendHouse', 'PublicPlaces')) == ('FriendHouse', 'Sam')
+    assert cache.recall('kid', ('PublicPlaces',)) is None
+    assert cache.recall('someone else', ('Calling',)) is None
+
+
+def test_entries_expire(cache, clock):
+    cache.remember('kid', {'Calling': 'Sam'})
+    clock[0] = 300
+    assert cache.recall('kid', ('Calling',)) is None
+
+
+def test_least_recent_users_are_dropped(cache):
+    for user in ('a', 'b', 'c'):
+        cache.remember(user, {'Calling': 'Sam'})
+    assert len(cache) == 2
+    assert cache.recall('a', ('Calling',)) is None
+
+
+def test_zero_ttl_turns_carry_over_off():
+    cache = carryover.CarryOver(ttl=0)
+    cache.remember('kid', {'Calling': 'Sam'})
+    assert cache.recall('kid', ('Calling',)) is None
+
+
+def test_code_hooks_ask_before_using_a_carried_value(motherbot, monkeypatch):
+    monkeypatch.setattr(carryover, '_shared', carryover.CarryOver())
+    user = 'carry-over-kid'
+    motherbot.lambda_handler(
+        lex_event('CanIGOTO', {'FriendHouse': 'Sam', 'PublicPlaces': None}, user_id=user), None
+    )
+
+    response = motherbot.lambda_handler(lex_event('CanICall', {'Calling': None}, user_id=user), None)
+    action = response['dialogAction']
+    assert (action['type'], action['slots'], action['message']['content']) == (
+        'ConfirmIntent', {'Calling': 'Sam'}, 'Do you mean Sam?'
+    )
+    attributes = response['sessionAttributes']
+    assert attributes['carriedOver'] == 'Calling'
+
+    denied = motherbot.lambda_handler(
+        lex_event('CanICall', {'Calling': 'Sam'}, session_attributes=dict(attributes), confirmation_status='Denied',
+                  user_id=user), None
+    )
+    assert (denied['dialogAction']['type'], denied['dialogAction']['slots']) == ('ElicitSlot', {'Calling': None})
+    assert 'carriedOver' not in denied['sessionAttributes']
+
+    confirmed = motherbot.lambda_handler(
+        lex_event('CanICall', {'Calling': 'Sam'}, session_attributes=dict(attributes),
+                  confirmation_status='Confirmed', user_id=user), None
+    )
+    assert confirmed['dialogAction'] == {'type': 'Delegate', 'slots': {'Calling': 'Sam'}}
+
+
+def test_can_i_see_remembers_only_its_subject(motherbot, monkeypatch):
+    monkeypatch.setattr(carryover, '_shared', carryover.CarryOver())
+    motherbot.lambda_handler(
+        lex_event('CanISee', {'Events': None, 'Movies': 'Up', 'Concerts': None, 'FriendHouse': 'Sam'},
+                  user_id='see-kid'), None
+    )
+    assert carryover.shared().recall('see-kid', ('Movies',)) == ('Movies', 'Up')
+    assert carryover.shared().recall('see-kid', ('FriendHouse',)) is None
@@ -0,0 +1,71 @@
+import pytest
+
+from motherbot import contacts
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def backend(request, tmp_path):
+    if request.param == 'memory':
+        return contacts.InMemoryContactsBackend()
+    return contacts.SQLiteContactsBackend(str(tmp_path / 'contacts.db'))
+
+
+@pytest.fixture
+def directory(backend):
+    directory = contacts.ContactDirectory(backend)
+    directory.add('home', 'Grandma Rose', '(201) 431-7268', contact_id='rose')
+    directory.add('home', 'Oliver Smith', '+44 20 7946 0958', contact_id='oliver')
+    directory.add('home', 'Olivia Jones', None, approved=False, contact_id='olivia')
+    return directory
+
+
+@pytest.mark.parametrize('raw, expected', [
+    ('(201) 431-7268', '+12014317268'),
+    ('1 201 431 7268', '+12014317268'),
+    ('0044 20 7946 0958', '+442079460958'),
+])
+def test_normalize_phone(raw, expected):
+    assert contacts.normalize_phone(raw) == expected
+
+
+def test_normalize_phone_rejects_short_numbers():
+    with pytest.raises(ValueError):
+        contacts.normalize_phone('12345')
+
+
+@pytest.mark.parametrize('query, contact_id, kind', [
+    ('201-431-7268', 'rose', 'phone'),
+    ('grandma rose', 'rose', 'exact'),
+    ('Rose', 'rose', 'prefix'),
+    ('olivia jones', 'olivia', 'exact'),
+    ('Olivia', 'olivia', 'prefix'),
+    ('Grandma Roes', 'rose', 'fuzzy'),
+])
+def test_resolve(directory, query, contact_id, kind):
+    match = directory.resolve('home', query)
+    assert (match.contact.contact_id, match.kind) == (contact_id, kind)
+
+
+def test_ambiguous_prefix_resolves_to_nothing(directory):
+    assert directory.resolve('home', 'Oli') is None
+
+
+def test_approval_and_removal(directory):
+    assert not directory.is_approved('home', 'Olivia')
+    directory.approve('home', 'olivia')
+    assert directory.is_approved('home', 'Olivia')
+    assert directory.approve('home', 'nobody') is None
+
+    directory.remove('home', 'rose')
+    assert directory.resolve('home', 'Grandma Rose') is None
+    assert directory.resolve('elsewhere', 'Grandma Rose') is None
+
+
+def test_other_containers_see_changes_after_refresh(backend):
+    now = [0.0]
+    reader = contacts.ContactDirectory(backend, refresh_seconds=60, clock=lambda: now[0])
+    assert reader.resolve('home', 'Rose') is None
+    contacts.ContactDirectory(backend).add('home', 'Rose', '2014317268')
+    assert reader.resolve('home', 'Rose') is None
+    now[0] = 60.0
+    assert reader.resolve('home', 'Rose').contact.phone == '+12014317268'
@@ -0,0 +1,123 @@
+import itertools
+
+import pytest
+
+from conftest import lex_event
+from motherbot import flow, session
+
+SLOTS = {
+    'PickUpCity': 'chicago',
+    'PickUpDate': '2030-06-03',
+    'ReturnDate': '2030-06-05',
+    'DriverAge': '30',
+    'CarType': 'midsize',
+}
+HOTEL = '1:{"t":"Hotel","l":"chicago","d":"2030-06-03","n":2,"r":"king"}'
+CAR = '1:{"t":"Car","c":"boston","p":"2030-06-03","e":"2030-06-04","k":"economy"}'
+EMPTY = dict.fromkeys(SLOTS)
+
+
+def old_book_car(auto, confirmation, last, slots):
+    """
+    The dialog turn of BookCar as the handler's if-tree decided it before motherbot.flow: (dialog action type, slot
+    elicited, slots sent back, whether an auto-populate offer is outstanding afterwards).
+    """
+    if confirmation == 'Denied':
+        if auto:
+            return 'ElicitSlot', 'PickUpCity', EMPTY, False
+        return 'Delegate', None, slots, False
+    if confirmation == 'None':
+        if not any(slots.values()) or auto:
+            last = session.decode_now(last) if last else None
+            if last and last['ReservationType'] == 'Hotel':
+                offered = {'PickUpCity': 'chicago', 'PickUpDate': '2030-06-03', 'ReturnDate': '2030-06-05',
+                           'CarType': None, 'DriverAge': None}
+                return 'ConfirmIntent', None, offered, True
+        return 'Delegate', None, slots, auto
+    if auto and not slots['DriverAge']:
+        return 'ElicitSlot', 'DriverAge', slots, False
+    if auto and not slots['CarType']:
+        return 'ElicitSlot', 'CarType', slots, False
+    return 'Delegate', None, slots, False
+
+
+def cases():
+    names = sorted(SLOTS)
+    for attribute, confirmation, last, filled in itertools.product(
+            (None, ('confirmationContext', 'AutoPopulate'), ('carFlow', 'auto')), ('None', 'Confirmed', 'Denied'),
+            (None, HOTEL, CAR), itertools.product((False, True), repeat=len(names))):
+        slots = {name: SLOTS[name] if fill else None for name, fill in zip(names, filled)}
+        yield attribute, confirmation, last, slots
+
+
+def test_flow_matches_the_old_if_tree(booktrip):
+    for attribute, confirmation, last, slots in cases():
+        session_attributes = {}
+        if attribute:
+            session_attributes[attribute[0]] = attribute[1]
+        if last:
+            session_attributes['lastConfirmedReservation'] = last
+        response = booktrip.lambda_handler(
+            lex_event('BookCar', dict(slots), session_attributes=session_attributes, confirmation_status=confirmation,
+                      bot_name='BookTrip'),
+            None
+        )
+        action = response['dialogAction']
+        attributes = response['sessionAttributes']
+        got = (action['type'], action.get('slotToElicit'), action['slots'], attributes.get('carFlow') == 'auto')
+        assert got == old_book_car(attribute is not None, confirmation, last, slots), (attribute, confirmation, last)
+        assert 'confirmationContext' not in attributes
+
+
+def car_flow():
+    car = flow.Flow('Car', ('City', 'Age'), attribute='state', states=(flow.INITIAL, 'offered'))
+
+    @car.on(state='offered', confirmation='Denied', to=flow.INITIAL)
+    def denied(turn):
+        return 'denied'
+
+    @car.on(empty=('Age',))
+    def ask_age(turn):
+        return 'age'
+
+    @car.on(confirmation='None', filled=('City', 'Age'), to='offered')
+    def offer(turn):
+        return 'offer'
+
+    return car
+
+
+def run(car, attributes, confirmation, **slots):
+    request = lex_event('Car', dict({'City': None, 'Age': None}, **slots), confirmation_status=confirmation)
+    return car.run(request, attributes)
+
+
+def test_first_declared_transition_wins_and_state_is_saved():
+    car = car_flow()
+    attributes = {}
+    assert run(car, attributes, 'None', City='x') == 'age'
+    assert attributes == {}
+    assert run(car, attributes, 'None', City='x', Age='30') == 'offer'
+    assert attributes == {'state': 'offered'}
+    assert run(car, attributes, 'Denied') == 'denied'
+    assert attributes == {}
+
+
+def test_unmatched_turns_raise():
+    with pytest.raises(flow.NoTransitionError) as raised:
+        run(car_flow(), {}, 'Confirmed', City='x', Age='30')
+    assert raised.value.key == (flow.INITIAL, 'Confirmed', 0b11)
+
+
+def test_unknown_states_start_over():
+    attributes = {'state': 'retired'}
+    assert run(car_flow(), attributes, 'None', City='x', Age='30') == 'offer'
+    assert attributes == {'state': 'offered'}
+
+
+def test_declaring_unknown_states_fails():
+    car = flow.Flow('Car', ('City',), attribute='state')
+    with pytest.raises(ValueError):
+        car.on(state='offered')
+    with pytest.raises(ValueError):
+        car.on(confirmation='Maybe')
@@ -0,0 +1,99 @@
+import pytest
+
+from conftest import lex_event
+from motherbot import idempotency
+
+
+def fulfillment(turn_id='turn-1', **slots):
+    return lex_event('CanISee', dict({'Events': None, 'Movies': 'Up', 'Concerts': None}, **slots),
+                     source='FulfillmentCodeHook', request_attributes={'turnId': turn_id} if turn_id else None)
+
+
+class Handler(object):
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, intent_request):
+        self.calls += 1
+        return {'dialogAction': {'type': 'Close', 'fulfillmentState': 'Fulfilled'}, 'call': self.calls}
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        return None
+    return idempotency.SQLiteFulfillments(str(tmp_path / 'fulfillments.db'))
+
+
+def test_retries_replay_the_first_response(store):
+    handle = Handler()
+    fulfillments = idempotency.Fulfillments(store)
+    first = fulfillments.fulfill(fulfillment(), handle)
+    assert fulfillments.fulfill(fulfillment(), handle) == first
+    assert handle.calls == 1 and (fulfillments.hits, fulfillments.misses) == (1, 1)
+
+
+def test_retries_on_another_container_replay_from_the_store(tmp_path):
+    store = idempotency.SQLiteFulfillments(str(tmp_path / 'fulfillments.db'))
+    handle = Handler()
+    first = idempotency.Fulfillments(store).fulfill(fulfillment(), handle)
+    assert idempotency.Fulfillments(store).fulfill(fulfillment(), handle) == first
+    assert handle.calls == 1
+
+
+@pytest.mark.parametrize('other', [
+    fulfillment('turn-2'),
+    fulfillment(Movies='Cars'),
+    lex_event('CanISee', {'Events': None, 'Movies': 'Up', 'Concerts': None}, request_attributes={'turnId': 'turn-1'}),
+])
+def test_other_turns_are_fulfilled(store, other):
+    handle = Handler()
+    fulfillments = idempotency.Fulfillments(store)
+    fulfillments.fulfill(fulfillment(), handle)
+    fulfillments.fulfill(other, handle)
+    assert handle.calls == 2
+
+
+def test_turns_without_a_turn_id_are_never_deduplicated(store):
+    handle = Handler()
+    fulfillments = idempotency.Fulfillments(store)
+    assert idempotency.request_key(fulfillment(None)) is None
+    fulfillments.fulfill(fulfillment(None), handle)
+    fulfillments.fulfill(fulfillment(None), handle)
+    assert handle.calls == 2 and len(fulfillments) == 0
+
+
+def test_responses_expire():
+    now = [0.0]
+    handle = Handler()
+    fulfillments = idempotency.Fulfillments(ttl=60, clock=lambda: now[0])
+    fulfillments.fulfill(fulfillment(), handle)
+    now[0] = 61.0
+    fulfillments.fulfill(fulfillment(), handle)
+    assert handle.calls == 2
+
+
+def test_failed_fulfillments_run_again():
+    fulfillments = idempotency.Fulfillments()
+
+    def fail(intent_request):
+        raise RuntimeError('backend down')
+
+    with pytest.raises(RuntimeError):
+        fulfillments.fulfill(fulfillment(), fail)
+    handle = Handler()
+    fulfillments.fulfill(fulfillment(), handle)
+    assert handle.calls == 1
+
+
+def test_handler_queues_one_approval_per_turn(motherbot, monkeypatch):
+    monkeypatch.setattr(idempotency, '_shared', idempotency.Fulfillments())
+    service = motherbot.approvals.shared()
+    queued = []
+    request = service.request
+    monkeypatch.setattr(service, 'request', lambda *args: queued.append(args) or request(*args))
+
+    first = motherbot.lambda_handler(fulfillment('sms-1'), None)
+    assert motherbot.lambda_handler(fulfillment('sms-1'), None) == first
+    motherbot.lambda_handler(fulfillment('sms-2'), None)
+    assert len(queued) == 2
@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+from conftest import REPO_ROOT
+
+sys.path.insert(0, os.path.join(REPO_ROOT, 'tools'))
+
+import lexreplay  # noqa: E402
+
+
+@pytest.mark.parametrize('handler', sorted(lexreplay.HANDLERS))
+def test_generator_covers_every_code_hook(handler):
+    definition = lexreplay.load_definition(handler)
+    generator = lexreplay.EventGenerator(definition, seed=1)
+    seen = set()
+    for event in generator.events(500):
+        seen.add((event['currentIntent']['name'], event['invocationSource']))
+        if event['invocationSource'] == 'FulfillmentCodeHook':
+            assert None not in event['currentIntent']['slots'].values()
+    assert seen == set(generator.intents())
+
+
+@pytest.mark.parametrize('handler', sorted(lexreplay.HANDLERS))
+def test_replay_has_no_failures(handler):
+    events = lexreplay.EventGenerator(lexreplay.load_definition(handler), seed=2).events(300)
+    report = lexreplay.replay(handler, events)
+    assert report['count'] == 300
+    assert report['failures'] == 0, [row['firstFailure'] for row in report['intents'] if row['failures']]
@@ -0,0 +1,65 @@
+import io
+import json
+import logging
+
+import pytest
+
+from conftest import lex_event
+from motherbot import logs
+
+
+@pytest.fixture
+def lines():
+    root = logging.getLogger()
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(logs.JsonFormatter())
+    level = root.level
+    root.addHandler(handler)
+    root.setLevel(logging.INFO)
+    yield lambda: [json.loads(line) for line in stream.getvalue().splitlines()]
+    root.removeHandler(handler)
+    root.setLevel(level)
+
+
+def test_invocation_summary_carries_the_context(lines, monkeypatch):
+    monkeypatch.setattr(logs, 'DEBUG_SAMPLE_RATE', 0.0)
+
+    @logs.logged
+    def handler(event, context):
+        logging.getLogger('motherbot.test').info('routing %s', 'CanICall', extra={'fields': {'step': 1}})
+        logging.getLogger('motherbot.test').debug('not at INFO')
+        return {'dialogAction': {'type': 'Delegate'}}
+
+    handler(lex_event('CanICall', {}, user_id='kid'), None)
+    routed, summary = lines()
+    assert routed == {'level': 'INFO', 'message': 'routing CanICall', 'userId': 'kid', 'intent': 'CanICall',
+                      'source': 'DialogCodeHook', 'step': 1}
+    assert summary['message'] == 'invoke' and summary['dialogAction'] == 'Delegate'
+    assert summary['durationMs'] >= 0
+
+
+def test_sampled_invocations_log_debug(lines, monkeypatch):
+    monkeypatch.setattr(logs, 'DEBUG_SAMPLE_RATE', 1.0)
+
+    @logs.logged
+    def handler(event, context):
+        logging.getLogger('motherbot.test').debug('detail')
+        return {'dialogAction': {'type': 'Close'}}
+
+    handler(lex_event('CanISee', {}), None)
+    assert [(line['level'], line['sampled']) for line in lines()] == [('DEBUG', True), ('INFO', True)]
+    assert logging.getLogger().level == logging.INFO
+
+
+def test_failures_are_logged_and_raised(lines, monkeypatch):
+    monkeypatch.setattr(logs, 'DEBUG_SAMPLE_RATE', 0.0)
+
+    @logs.logged
+    def handler(event, context):
+        raise RuntimeError('boom')
+
+    with pytest.raises(RuntimeError):
+        handler(lex_event('CanISee', {}), None)
+    failed, = lines()
+    assert failed['level'] == 'ERROR' and 'RuntimeError: boom' in failed['exception']
@@ -0,0 +1,35 @@
+import pytest
+
+from motherbot import availability
+
+FREE = ['10:00', '10:30', '11:00', '13:00', '13:30', '14:00', '16:00']
+
+
+@pytest.mark.parametrize('booking', [FREE, availability.mask_from_times(FREE)], ids=['list', 'mask'])
+def test_time_options_from_lists_and_masks(motherbot, booking):
+    options = motherbot.build_options('Time', 'root canal', '2030-06-03', {'2030-06-03': booking})
+    assert [option['value'] for option in options] == ['10:00 a.m.', '10:30 a.m.', '1:00 p.m.', '1:30 p.m.']
+
+
+def test_time_options_are_cached_per_mask(motherbot):
+    booking_map = {'2030-06-03': availability.mask_from_times(FREE)}
+    first = motherbot.build_options('Time', 'cleaning', '2030-06-03', booking_map)
+    assert motherbot.build_options('Time', 'cleaning', '2030-06-03', booking_map) is first
+    assert motherbot.build_options('Time', 'root canal', '2030-06-03', booking_map) is not first
+
+
+@pytest.mark.parametrize('appointment_type, date, booking', [
+    (None, '2030-06-03', FREE),
+    ('cleaning', None, FREE),
+    ('cleaning', '2030-06-04', FREE),
+    ('cleaning', '2030-06-03', 0),
+    ('cleaning', '2030-06-03', []),
+])
+def test_no_time_options(motherbot, appointment_type, date, booking):
+    assert motherbot.build_options('Time', appointment_type, date, {'2030-06-03': booking}) is None
+
+
+def test_date_options_are_five_weekdays(motherbot):
+    options = motherbot.build_options('Date', None, None, {})
+    assert len(options) == 5
+    assert not any(option['text'].endswith(('(Sat)', '(Sun)')) for option in options)
@@ -0,0 +1,123 @@
+import pytest
+
+from conftest import lex_event
+from motherbot import contacts, otp, sms
+from motherbot.fakes.twilio import FakeTwilioServer
+
+PHONE = '+12014317268'
+
+
+@pytest.fixture(scope='module')
+def twilio():
+    with FakeTwilioServer('AC123', 'secret') as server:
+        yield server
+
+
+@pytest.fixture
+def clock():
+    return [1000000.0]
+
+
+@pytest.fixture
+def service(twilio, clock):
+    sender = sms.SmsSender(sms.TwilioClient('AC123', 'secret', api_url=twilio.url, retries=0), '+15550000000')
+    return otp.OtpService(sender, b'test-only', ttl=300, max_attempts=3, clock=lambda: clock[0])
+
+
+def texted_code(twilio, phone=PHONE):
+    message = [message for message in twilio.messages if message['to'] == phone][-1]
+    return message['body'].rsplit(' ', 1)[1]
+
+
+def test_issue_and_verify(twilio, service):
+    outcome, token = service.start(PHONE)
+    assert outcome == otp.SENT
+    code = texted_code(twilio)
+    assert len(code) == otp.CODE_LENGTH and code not in token
+    assert service.verify(PHONE, ' {}-{} '.format(code[:3], code[3:]), token) == (otp.VERIFIED, None)
+
+
+def test_wrong_guesses_count_against_the_token(twilio, service):
+    _, token = service.start(PHONE)
+    code = texted_code(twilio)
+    wrong = '000000' if code != '000000' else '111111'
+
+    outcome, token = service.verify(PHONE, wrong, token)
+    assert outcome == otp.INVALID
+    assert service.verify(PHONE, code, token) == (otp.VERIFIED, None)
+
+    _, token = service.start(PHONE)
+    for _ in range(2):
+        outcome, token = service.verify(PHONE, wrong, token)
+    assert outcome == otp.INVALID
+    assert service.verify(PHONE, wrong, token) == (otp.LOCKED, None)
+
+
+def test_codes_expire(twilio, service, clock):
+    _, token = service.start(PHONE)
+    code = texted_code(twilio)
+    clock[0] += 300
+    assert service.verify(PHONE, code, token) == (otp.EXPIRED, None)
+
+
+@pytest.mark.parametrize('tamper', [
+    lambda token: token.replace('.0.', '.1.', 1),
+    lambda token: str(int(token.split('.', 1)[0]) + 600) + '.' + token.split('.', 1)[1],
+    lambda token: 'garbage',
+    lambda token: None,
+])
+def test_tampered_tokens_are_expired(twilio, service, tamper):
+    _, token = service.start(PHONE)
+    assert service.verify(PHONE, texted_code(twilio), tamper(token)) == (otp.EXPIRED, None)
+
+
+def test_token_is_bound_to_the_phone(twilio, service):
+    _, token = service.start(PHONE)
+    assert service.verify('+12014317269', texted_code(twilio), token) == (otp.EXPIRED, None)
+
+
+def test_sends_are_rate_limited(service):
+    phone = '+12015550100'
+    for _ in range(otp.SENDS_PER_WINDOW):
+        assert service.start(phone)[0] == otp.SENT
+    assert service.start(phone) == (otp.RATE_LIMITED, None)
+
+
+def test_refused_send_fails(twilio, service):
+    twilio.fail_next.append(400)
+    assert service.start('+12015550101') == (otp.FAILED, None)
+
+
+def test_shared_requires_a_secret(monkeypatch):
+    monkeypatch.setattr(otp, '_shared', None)
+    monkeypatch.delenv('OTP_SECRET')
+    with pytest.raises(ValueError):
+        otp.shared()
+
+
+def test_meet_a_friend_verifies_and_adds_an_unapproved_contact(motherbot, twilio, service, monkeypatch):
+    directory = contacts.ContactDirectory(contacts.InMemoryContactsBackend())
+    monkeypatch.setattr(otp, '_shared', service)
+    monkeypatch.setattr(contacts, '_shared', directory)
+    slots = {'Friend': 'Website', 'FriendName': 'Sam', 'FriendPhone': '201 431 7268', 'FriendCode': None}
+
+    response = motherbot.lambda_handler(lex_event('MeetAFriend', slots, user_id='friend-test'), None)
+    assert response['dialogAction']['type'] == 'ElicitSlot'
+    assert response['dialogAction']['slotToElicit'] == 'FriendCode'
+    attributes = response['sessionAttributes']
+    assert attributes['friendPhone'] == PHONE
+
+    slots['FriendCode'] = texted_code(twilio)
+    response = motherbot.lambda_handler(
+        lex_event('MeetAFriend', slots, session_attributes=attributes, user_id='friend-test'), None
+    )
+    assert response['dialogAction']['fulfillmentState'] == 'Fulfilled'
+    assert 'friendCode' not in response['sessionAttributes']
+    household = motherbot.tenants.shared().household('friend-test').household_id
+    match = directory.resolve(household, 'Sam')
+    assert match.contact.phone == PHONE and not match.contact.approved
+
+
+def test_meet_a_friend_without_the_new_slots(motherbot):
+    response = motherbot.lambda_handler(lex_event('MeetAFriend', {'Friend': 'Website'}), None)
+    assert response['dialogAction']['slotToElicit'] == 'FriendName'
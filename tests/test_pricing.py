@@ -0,0 +1,24 @@
+from motherbot import catalog, pricing
+
+
+def test_car_grid_matches_single_quotes():
+    grid = pricing.quote_car_grid('Chicago', [1, 3, 7], 22)
+    assert sorted(grid) == [1, 3, 7]
+    for days, quotes in grid.items():
+        assert sorted(quotes) == sorted(catalog.CAR_TYPES)
+        for car_type, price in quotes.items():
+            assert price == pricing.car_price('Chicago', days, 22, car_type)
+
+
+def test_hotel_grid_matches_single_quotes():
+    grid = pricing.quote_hotel_grid('New York', [2, 5], room_types=('king', 'Deluxe'))
+    for nights, quotes in grid.items():
+        for room_type, price in quotes.items():
+            assert price == pricing.hotel_price('new york', nights, room_type)
+
+
+def test_cache_counts_hits():
+    pricing.clear_cache()
+    pricing.car_price('boston', 2, 30, 'midsize')
+    pricing.car_price('Boston', 2, 40, 'Midsize')
+    assert pricing.cache_stats()['car']['hits'] == 1
@@ -0,0 +1,27 @@
+import json
+
+from motherbot import responses
+
+SLOTS = {'PickUpCity': 'chicago', 'DriverAge': None}
+
+
+def test_constants_are_interned():
+    prompt = responses.constant('How old is the driver?')
+    assert responses.constant('How old is the driver?') is prompt
+    assert responses.message('How old is the driver?') is prompt
+    assert responses.message('Something else') == {'contentType': 'PlainText', 'content': 'Something else'}
+
+
+def test_builders_omit_the_card_only_when_asked():
+    prompt = responses.message('Which type?')
+    assert 'responseCard' not in responses.elicit_slot({}, 'BookCar', SLOTS, 'CarType', prompt)['dialogAction']
+    card = responses.response_card('Type', 'Which type?', [{'text': str(n), 'value': str(n)} for n in range(7)])
+    action = responses.confirm_intent({}, 'BookCar', SLOTS, prompt, card)['dialogAction']
+    assert len(action['responseCard']['genericAttachments'][0]['buttons']) == 5
+    assert responses.elicit_slot({}, 'BookCar', SLOTS, 'CarType', prompt, None)['dialogAction']['responseCard'] is None
+
+
+def test_dumps_is_compact_json():
+    response = responses.close({'note': 'café'}, 'Fulfilled', responses.message('Done'))
+    assert responses.dumps(response) == json.dumps(response, separators=(',', ':'))
+    assert json.loads(responses.dumps(response)) == response
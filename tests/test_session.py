@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from motherbot import session
+
+RESERVATION = {
+    'ReservationType': 'Car',
+    'PickUpCity': 'Chicago',
+    'PickUpDate': '2030-06-03',
+    'ReturnDate': '2030-06-05',
+    'DriverAge': '23',
+    'CarType': 'economy',
+    'CheckInDate': None,
+}
+
+
+@pytest.mark.parametrize('compress', [False, True])
+def test_round_trip(compress):
+    value = session.encode(RESERVATION, compress=compress)
+    decoded = session.decode_now(value)
+    assert decoded == {name: field for name, field in RESERVATION.items() if field is not None}
+
+
+def test_compression_only_when_shorter():
+    assert session.encode({'ReservationType': 'Car'}, compress=True).startswith(session.PLAIN_PREFIX)
+    padded = dict(RESERVATION, Notes='x' * 200)
+    assert session.encode(padded, compress=True).startswith(session.COMPRESSED_PREFIX)
+    assert session.decode_now(session.encode(padded, compress=True))['Notes'] == 'x' * 200
+
+
+def test_decodes_plain_json_written_before_the_codec():
+    assert session.decode_now(json.dumps(RESERVATION)) == RESERVATION
+
+
+def test_lazy_record_reads_unset_known_fields_as_none():
+    record = session.decode(session.encode(RESERVATION))
+    assert record['PickUpCity'] == 'Chicago'
+    assert record['CheckInDate'] is None
+    with pytest.raises(KeyError):
+        record['Unknown']
+    assert session.decode(None) is None
+
+
+@pytest.mark.parametrize('value', ['2:{}', '1:{not json', '1z:!!!'])
+def test_rejects_unreadable_values(value):
+    with pytest.raises(session.SessionCodecError):
+        session.decode_now(value)
@@ -0,0 +1,105 @@
+from urllib.parse import urlencode
+
+import pytest
+
+from motherbot import approvals, smsgateway
+
+TOKEN = 'twilio-token'
+URL = 'https://sms.example.com/twilio'
+
+
+class Lex(object):
+    def __init__(self):
+        self.texts = []
+
+    def post_text(self, bot_name, bot_alias, user_id, text, request_attributes=None):
+        self.texts.append((user_id, text, request_attributes))
+        return {'message': 'Who would you like to call?', 'responseCard': {'genericAttachments': [
+            {'buttons': [{'text': 'Library', 'value': 'library'}, {'text': 'Friends', 'value': 'friends'}]}
+        ]}}
+
+
+def webhook(body='Can I call someone', sid='SM1', token=TOKEN, signature=None, **extra):
+    params = dict({'From': '+12015550123', 'To': '+12014317268', 'MessageSid': sid, 'Body': body}, **extra)
+    headers = {}
+    if token:
+        headers['X-Twilio-Signature'] = signature or smsgateway.expected_signature(URL, params, token)
+    return {'body': urlencode(params), 'headers': headers}
+
+
+def gateway(lex, **kwargs):
+    return smsgateway.SmsGateway(lex, **dict({'auth_token': TOKEN, 'url': URL}, **kwargs))
+
+
+def test_signed_webhooks_reach_the_bot():
+    lex = Lex()
+    response = gateway(lex).handle(webhook())
+    assert response['statusCode'] == 200
+    assert lex.texts == [('12015550123', 'Can I call someone', {'turnId': 'SM1'})]
+    assert response['body'] == ('<?xml version="1.0" encoding="UTF-8"?><Response>'
+                                '<Message>Who would you like to call?</Message>'
+                                '<Message>Reply with one of: Library, Friends</Message></Response>')
+
+
+@pytest.mark.parametrize('event', [
+    webhook(signature='forged'),
+    webhook(token='another-token'),
+    webhook(token=None),
+    dict(webhook(), body=urlencode({'From': '+12015550123', 'MessageSid': 'SM1', 'Body': 'tampered'})),
+])
+def test_unsigned_or_forged_webhooks_are_rejected(event):
+    lex = Lex()
+    assert gateway(lex).handle(event)['statusCode'] == 403
+    assert lex.texts == []
+
+
+def test_without_a_token_every_webhook_is_rejected():
+    lex = Lex()
+    assert gateway(lex, auth_token=None).handle(webhook())['statusCode'] == 403
+    assert gateway(lex, auth_token=None).handle(webhook(token=None))['statusCode'] == 403
+    assert lex.texts == []
+
+
+def test_skipping_the_check_is_explicit():
+    lex = Lex()
+    assert gateway(lex, auth_token=None, skip_signature=True).handle(webhook(token=None))['statusCode'] == 200
+    assert len(lex.texts) == 1
+
+
+def test_shared_gateway_fails_closed(monkeypatch):
+    monkeypatch.setattr(smsgateway, '_shared', None)
+    monkeypatch.setattr(smsgateway, 'SKIP_SIGNATURE', False)
+    monkeypatch.delenv('TWILIO_AUTH_TOKEN', raising=False)
+    assert smsgateway.shared().handle(webhook(token=None))['statusCode'] == 403
+
+
+def test_guardian_replies_are_recorded_not_sent_to_the_bot():
+    lex = Lex()
+    replies = []
+    decided = approvals.Approval('1f0c93ab52d7e640', 'home', 'kid', 'CanISee', 'can I see Up', ('+12015550123',),
+                                 approvals.APPROVED, '+12015550123', None)
+
+    def respond(phone, text):
+        replies.append((phone, text))
+        return decided
+
+    response = gateway(lex, respond=respond).handle(webhook('YES 1f0c93ab52d7e640'))
+    assert replies == [('+12015550123', 'YES 1f0c93ab52d7e640')]
+    assert 'Thanks' in response['body'] and lex.texts == []
+
+
+def test_malformed_webhooks_are_bad_requests():
+    event = webhook()
+    event['body'] = urlencode({'Body': 'hi'})
+    assert gateway(Lex(), auth_token=None, skip_signature=True).handle(event)['statusCode'] == 400
+
+
+def test_bursts_collapse_into_one_text(tmp_path):
+    bursts = smsgateway.SQLiteBursts(str(tmp_path / 'bursts.db'))
+    lex = Lex()
+    second = gateway(lex, bursts=bursts, window=1.0)
+    # The first part's invocation waits out the window; the second part arrives while it does.
+    first = gateway(lex, bursts=bursts, window=1.0, sleep=lambda seconds: second.handle(webhook('two', sid='SM2')))
+    first.handle(webhook('one', sid='SM1'))
+    assert lex.texts == [('12015550123', 'one two', {'turnId': 'SM1'})]
+    assert second.collapsed == 1
@@ -0,0 +1,67 @@
+import pytest
+
+from motherbot import clock, tenants
+from motherbot.fakes.dynamodb import FakeDynamoTable
+
+DEFAULTS = {
+    'householdId': 'default',
+    'timezone': 'America/New_York',
+    'places': None,
+    'callCategories': ['library', 'friends'],
+    'guardians': ['2015550101'],
+    'activityWindowMinutes': 120,
+}
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'dynamodb'])
+def store(request, tmp_path):
+    if request.param == 'memory':
+        store = tenants.InMemoryTenantStore()
+    elif request.param == 'sqlite':
+        store = tenants.SQLiteTenantStore(str(tmp_path / 'tenants.db'))
+    else:
+        store = tenants.DynamoDBTenantStore(FakeDynamoTable('tenants', 'tenant_key'))
+    store.put_household('smiths', {'timezone': 'Europe/London', 'places': ['Park', 'Library'], 'guardians': None})
+    store.assign('kid-1', 'smiths')
+    store.assign('kid-2', 'smiths')
+    return store
+
+
+def test_users_resolve_to_their_household(store):
+    cache = tenants.TenantCache(store, defaults=DEFAULTS)
+    household = cache.household('kid-1')
+    assert household.household_id == 'smiths'
+    assert household.timezone == clock.get_timezone('Europe/London')
+    assert household.places == frozenset(['park', 'library'])
+    # Settings the household leaves out come from the function's own.
+    assert household.guardians == ('+12015550101',)
+    assert household.activity_window_minutes == 120
+    assert cache.household('kid-2') is household
+
+
+def test_unknown_users_get_the_default_household(store):
+    household = tenants.TenantCache(store, defaults=DEFAULTS).household('stranger')
+    assert household.household_id == 'default' and household.places is None
+
+
+def test_entries_expire_and_invalidate(store):
+    now = [0.0]
+    cache = tenants.TenantCache(store, defaults=DEFAULTS, ttl=60, clock=lambda: now[0])
+    assert cache.household('kid-1').places == frozenset(['park', 'library'])
+    store.put_household('smiths', {'places': ['Zoo']})
+    assert cache.household('kid-1').places == frozenset(['park', 'library'])
+    assert cache.hits == 1
+
+    now[0] = 61.0
+    assert cache.household('kid-1').places == frozenset(['zoo'])
+
+    store.put_household('smiths', {'places': ['Pool']})
+    cache.invalidate('smiths')
+    assert cache.household('kid-1').places == frozenset(['pool'])
+
+
+def test_shards_stay_bounded():
+    cache = tenants.TenantCache(tenants.InMemoryTenantStore(), defaults=DEFAULTS, size=32, shards=4)
+    for number in range(500):
+        cache.household('user-{}'.format(number))
+    assert len(cache) <= 32
@@ -0,0 +1,284 @@
+"""
+Build a deployment package for each Lambda function (the Lex code hooks and the SMS gateway), holding only the code
+that function imports.
+
+Each bundle is the handler file plus the motherbot modules reachable from it through import statements, found by
+walking the import graph; modules no import reaches, and the local stand-ins in motherbot.fakes, are left out.  How
+the code ships is chosen with --layout:
+
+    bytecode  the motherbot modules as bytecode only and the handler as source with its bytecode compiled ahead of
+              time, so a cold start compiles nothing (the deployment directory is read only, so the runtime could
+              not cache the bytecode anyway).  The default.
+    smallest  each motherbot module as bytecode (docstrings and asserts stripped) or as source, whichever deflates
+              smaller, and the handler as source only.  Bytecode carries line and column tables and is usually about
+              twice the zipped size of its source, so this is mostly source, and a cold start compiles it.
+    both      source plus bytecode for everything, which keeps source lines in tracebacks.
+
+Bytecode is specific to a Python minor version, so build with the same Python as the functions' runtime; the version
+is written to each bundle's manifest.  Bytecode is compiled as unchecked hash based .pyc files, so it stays valid
+whatever timestamps the zip is extracted with.  For each function the report gives the modules bundled, the
+unpacked and zipped size, and the median time to import the handler in a fresh interpreter, next to the same for
+the whole lambda directory as source, e.g.
+
+    python tools/bundle.py --out build
+    python tools/bundle.py booktrip --runs 21 --layout smallest
+
+Modules loaded with motherbot.lazy.lazy_import('name') are followed like import statements, so a motherbot module
+deferred that way is still bundled.
+"""
+
+import argparse
+import ast
+import json
+import os
+import py_compile
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import zipfile
+import zlib
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDA_DIR = os.path.join(REPO_ROOT, 'lambda')
+PACKAGE = 'motherbot'
+EXCLUDED = ('motherbot.fakes',)
+
+LAYOUTS = ('bytecode', 'smallest', 'both')
+
+HANDLERS = {
+    'motherbot': 'lex-motherbot-python',
+    'booktrip': 'lex-booktrip-python',
+    'gateway': 'twilio-gateway-python',
+}
+
+# Fixed zip entry times, so building the same tree twice gives byte for byte the same archive.
+ZIP_DATE = (2020, 1, 1, 0, 0, 0)
+
+IMPORT_PROBE = """
+import importlib.util, sys, time
+directory, stem = sys.argv[1], sys.argv[2]
+sys.path.insert(0, directory)
+start = time.perf_counter()
+spec = importlib.util.spec_from_file_location(stem.replace('-', '_'), directory + '/' + stem + '.py')
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+print((time.perf_counter() - start) * 1000.0)
+"""
+
+
+def module_path(lambda_dir, name):
+    """
+    Source file of a module in the motherbot package, or None if name is not one.
+    """
+    base = os.path.join(lambda_dir, *name.split('.'))
+    if os.path.isfile(os.path.join(base, '__init__.py')):
+        return os.path.join(base, '__init__.py')
+    if os.path.isfile(base + '.py'):
+        return base + '.py'
+    return None
+
+
+def imported_names(path):
+    """
+    Every module name an import statement or a lazy_import('name') call in path could refer to, including
+    'package.name' for each name imported from a package, since that name may be a submodule.
+    """
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    names = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module)
+            names.update('{}.{}'.format(node.module, alias.name) for alias in node.names)
+        elif (isinstance(node, ast.Call) and getattr(node.func, 'id', None) == 'lazy_import' and node.args
+              and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str)):
+            names.add(node.args[0].value)
+    return names
+
+
+def reachable_modules(lambda_dir, handler_path):
+    """
+    {module name: source path} for the motherbot modules the handler imports, directly or not, and their packages.
+    """
+    found = {}
+    pending = [handler_path]
+    while pending:
+        for name in imported_names(pending.pop()):
+            if name != PACKAGE and not name.startswith(PACKAGE + '.'):
+                continue
+            if any(name == excluded or name.startswith(excluded + '.') for excluded in EXCLUDED):
+                raise ValueError('{} is only for local use and must not be imported by a handler'.format(name))
+            parts = name.split('.')
+            for depth in range(1, len(parts) + 1):
+                module = '.'.join(parts[:depth])
+                path = module_path(lambda_dir, module)
+                if path and module not in found:
+                    found[module] = path
+                    pending.append(path)
+    return found
+
+
+def compile_file(source, target, optimize):
+    py_compile.compile(
+        source, cfile=target, dfile=os.path.basename(source), doraise=True, optimize=optimize,
+        invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH
+    )
+
+
+def cached_path(target):
+    """
+    Where the import system looks for the bytecode of the source file target.
+    """
+    name = os.path.basename(target)[:-3] + '.' + sys.implementation.cache_tag + '.pyc'
+    return os.path.join(os.path.dirname(target), '__pycache__', name)
+
+
+def deflated_size(path):
+    with open(path, 'rb') as f:
+        return len(zlib.compress(f.read()))
+
+
+def stage_module(source, target, layout):
+    """
+    Write the module at source to target as layout asks.  Returns True if it ships as bytecode only.
+    """
+    if layout == 'both':
+        shutil.copy2(source, target)
+        compile_file(source, cached_path(target), 0)
+        return False
+    # A .pyc with no .py next to it is imported directly, whatever optimisation level it was compiled at.
+    compile_file(source, target + 'c', 2)
+    if layout == 'smallest' and deflated_size(source) <= deflated_size(target + 'c'):
+        os.remove(target + 'c')
+        shutil.copy2(source, target)
+        return False
+    return True
+
+
+def build(lambda_dir, stem, out_dir, layout):
+    """
+    Stage the bundle for one handler under out_dir/stem and zip it as out_dir/stem.zip.  Returns the manifest.
+    """
+    staging = os.path.join(out_dir, stem)
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    handler = os.path.join(lambda_dir, stem + '.py')
+    shutil.copy2(handler, os.path.join(staging, stem + '.py'))
+    if layout != 'smallest':
+        compile_file(handler, cached_path(os.path.join(staging, stem + '.py')), 0)
+
+    modules = reachable_modules(lambda_dir, handler)
+    compiled = []
+    for name, source in sorted(modules.items()):
+        target = os.path.join(staging, os.path.relpath(source, lambda_dir))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if stage_module(source, target, layout):
+            compiled.append(name)
+
+    manifest = {
+        'handler': stem + '.lambda_handler',
+        'python': '{}.{}'.format(*sys.version_info[:2]),
+        'modules': sorted(modules),
+        'layout': layout,
+        'bytecode_only': compiled,
+    }
+    with open(os.path.join(staging, 'bundle.json'), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    archive = os.path.join(out_dir, stem + '.zip')
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as bundle:
+        for path in sorted(walk_files(staging)):
+            entry = zipfile.ZipInfo(os.path.relpath(path, staging), ZIP_DATE)
+            entry.compress_type = zipfile.ZIP_DEFLATED
+            entry.external_attr = 0o644 << 16
+            with open(path, 'rb') as f:
+                bundle.writestr(entry, f.read())
+    return manifest
+
+
+def walk_files(directory):
+    for root, _, files in os.walk(directory):
+        for name in files:
+            yield os.path.join(root, name)
+
+
+def tree_size(directory):
+    return sum(os.path.getsize(path) for path in walk_files(directory))
+
+
+def source_tree(lambda_dir, target):
+    """
+    Copy of the lambda directory as it used to be deployed, all source and no bytecode.
+    """
+    shutil.copytree(lambda_dir, target, ignore=shutil.ignore_patterns('__pycache__', '*.pyc'))
+    archive = target + '.zip'
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as bundle:
+        for path in sorted(walk_files(target)):
+            bundle.write(path, os.path.relpath(path, target))
+    return archive
+
+
+def import_ms(directory, stem, runs):
+    """
+    Median milliseconds to import the handler in a fresh interpreter that cannot write bytecode, as in Lambda.
+    """
+    samples = []
+    for _ in range(runs):
+        output = subprocess.check_output(
+            [sys.executable, '-B', '-c', IMPORT_PROBE, directory, stem], stderr=subprocess.DEVNULL,
+            env=dict(os.environ, PYTHONDONTWRITEBYTECODE='1')
+        )
+        samples.append(float(output.decode('utf-8').strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+def print_table(headers, rows):
+    widths = [max(len(str(value)) for value in column) for column in zip(headers, *rows)]
+    line = '  '.join('{:<%d}' % width for width in widths)
+    print(line.format(*headers))
+    print(line.format(*['-' * width for width in widths]))
+    for row in rows:
+        print(line.format(*row))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('handlers', nargs='*', metavar='handler', help='functions to bundle: {} (all by default)'.format(
+        ', '.join(sorted(HANDLERS))))
+    parser.add_argument('--out', default=os.path.join(REPO_ROOT, 'build'), help='directory for the bundles')
+    parser.add_argument('--layout', choices=LAYOUTS, default='bytecode', help='how to ship the code (bytecode)')
+    parser.add_argument('--runs', type=int, default=11, help='fresh interpreters per import time measurement')
+    args = parser.parse_args()
+    unknown = sorted(set(args.handlers) - set(HANDLERS))
+    if unknown:
+        parser.error('unknown handler {}'.format(', '.join(unknown)))
+
+    os.makedirs(args.out, exist_ok=True)
+    scratch = tempfile.mkdtemp(prefix='bundle-')
+    rows = []
+    try:
+        unbundled = os.path.join(scratch, 'lambda')
+        unbundled_zip = source_tree(LAMBDA_DIR, unbundled)
+        for name in args.handlers or sorted(HANDLERS):
+            stem = HANDLERS[name]
+            manifest = build(LAMBDA_DIR, stem, args.out, args.layout)
+            rows.append((name, 'lambda directory as source', '-', '{:.1f}'.format(tree_size(unbundled) / 1024.0),
+                         '{:.1f}'.format(os.path.getsize(unbundled_zip) / 1024.0),
+                         '{:.2f}'.format(import_ms(unbundled, stem, args.runs))))
+            staging = os.path.join(args.out, stem)
+            rows.append((name, os.path.relpath(staging + '.zip'), len(manifest['modules']),
+                         '{:.1f}'.format(tree_size(staging) / 1024.0),
+                         '{:.1f}'.format(os.path.getsize(staging + '.zip') / 1024.0),
+                         '{:.2f}'.format(import_ms(staging, stem, args.runs))))
+    finally:
+        shutil.rmtree(scratch)
+
+    print_table(['function', 'package', 'modules', 'unpacked KB', 'zip KB', 'cold import p50 ms'], rows)
+
+
+if __name__ == '__main__':
+    main()
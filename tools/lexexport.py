@@ -0,0 +1,260 @@
+"""
+Export Lex V1 bot definitions in the format config/exportlexbot.js writes, for one or many bot versions at once.
+
+Fetches each bot version, then every intent the versions use, then every custom slot type those intents use, through
+the model building API.  Each (name, version) is fetched once however many intents or bot versions refer to it, the
+requests run on a bounded pool of threads, and throttling or 5xx errors are retried with jittered exponential
+backoff.  Numbered versions never change, so with --cache-dir they are also kept on disk and later exports only fetch
+what is new; $LATEST and aliases are always fetched.
+
+The output is canonical: intents and slot types under dependencies are ordered by name, response metadata is dropped
+and dates are written the way the JavaScript SDK writes them, so exporting an unchanged bot gives an identical file.
+
+    python tools/lexexport.py MotherBot 1 --out config/bot.json
+    python tools/lexexport.py MotherBot 1 2 3 '$LATEST' --out 'exports/{bot}-{version}.json' --cache-dir .lexcache
+
+--stub serves the API from existing exports instead of AWS (motherbot.fakes.lexmodels), for trying the tool out:
+
+    python tools/lexexport.py MotherBot 1 --stub config/bot.json --latency 0.05 --rate-limit 5
+"""
+
+import argparse
+import concurrent.futures
+import datetime
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAMBDA_DIR = os.path.join(REPO_ROOT, 'lambda')
+
+RETRYABLE = frozenset([
+    'ThrottlingException', 'TooManyRequestsException', 'LimitExceededException', 'RequestLimitExceeded',
+    'ServiceUnavailableException', 'InternalFailureException',
+])
+
+
+def error_code(error):
+    return getattr(error, 'response', {}).get('Error', {}).get('Code')
+
+
+def canonical_value(value):
+    """
+    value with datetimes as the JavaScript SDK's ISO strings ('2017-07-18T01:24:59.188Z').
+    """
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is not None:
+            value = value.astimezone(datetime.timezone.utc)
+        return value.strftime('%Y-%m-%dT%H:%M:%S.') + '{:03d}Z'.format(value.microsecond // 1000)
+    if isinstance(value, dict):
+        return {key: canonical_value(item) for key, item in value.items() if key != 'ResponseMetadata'}
+    if isinstance(value, list):
+        return [canonical_value(item) for item in value]
+    return value
+
+
+def dumps(definition):
+    """
+    The export file contents, indented as config/bot.json always has been.
+    """
+    return json.dumps(definition, indent=3, ensure_ascii=False) + '\n'
+
+
+class DefinitionCache(object):
+    """
+    Fetched definitions by (kind, name, version), in memory and, for numbered versions, in directory.
+    """
+
+    def __init__(self, directory=None):
+        self._directory = directory
+        self._entries = {}
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        # Only numbered versions are immutable; $LATEST and aliases such as 'prod' move, so they are never kept.
+        if not self._directory or not key[2].isdigit():
+            return None
+        return os.path.join(self._directory, '{}-{}-{}.json'.format(*key))
+
+    def get(self, key):
+        with self._lock:
+            found = self._entries.get(key)
+        if found is not None:
+            return found
+        path = self._path(key)
+        if path and os.path.exists(path):
+            with open(path) as f:
+                found = json.load(f)
+            with self._lock:
+                self._entries[key] = found
+        return found
+
+    def put(self, key, definition):
+        with self._lock:
+            self._entries[key] = definition
+        path = self._path(key)
+        if path:
+            scratch = path + '.tmp'
+            with open(scratch, 'w') as f:
+                json.dump(definition, f)
+            os.replace(scratch, path)
+
+
+class Exporter(object):
+    """
+    Fetches bot definitions through a boto3 'lex-models' client, or anything with the same get_* methods.
+    """
+
+    def __init__(self, client, cache=None, concurrency=8, retries=6, backoff=0.2, max_backoff=10.0, sleep=time.sleep):
+        self._client = client
+        self._cache = cache or DefinitionCache()
+        self._concurrency = concurrency
+        self._retries = retries
+        self._backoff = backoff
+        self._max_backoff = max_backoff
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.retried = 0
+        self.cached = 0
+
+    def _call(self, operation, **params):
+        attempt = 0
+        while True:
+            with self._lock:
+                self.requests += 1
+            try:
+                return getattr(self._client, operation)(**params)
+            except Exception as e:
+                if error_code(e) not in RETRYABLE or attempt >= self._retries:
+                    raise
+            with self._lock:
+                self.retried += 1
+            # Full jitter keeps the pool's retries from arriving in step and being throttled again together.
+            self._sleep(random.uniform(0, min(self._max_backoff, self._backoff * 2 ** attempt)))
+            attempt += 1
+
+    def _fetch(self, key):
+        found = self._cache.get(key)
+        if found is not None:
+            with self._lock:
+                self.cached += 1
+            return found
+        kind, name, version = key
+        if kind == 'bot':
+            found = self._call('get_bot', name=name, versionOrAlias=version)
+        elif kind == 'intent':
+            found = self._call('get_intent', name=name, version=version)
+        else:
+            found = self._call('get_slot_type', name=name, version=version)
+        found = canonical_value(found)
+        self._cache.put(key, found)
+        return found
+
+    def _fetch_all(self, pool, keys):
+        """
+        {key: definition} for keys, each fetched once, concurrently on pool.
+        """
+        unique = sorted(set(keys))
+        return dict(zip(unique, pool.map(self._fetch, unique)))
+
+    def export(self, bot_name, versions):
+        """
+        {version: definition with dependencies} for each of versions of bot_name.
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self._concurrency) as pool:
+            bots = self._fetch_all(pool, [('bot', bot_name, version) for version in versions])
+            intents = self._fetch_all(pool, [
+                ('intent', intent['intentName'], intent['intentVersion'])
+                for bot in bots.values() for intent in bot.get('intents') or []
+            ])
+            # Built-in slot types (AMAZON.*) have no version and are not exported.
+            slot_types = self._fetch_all(pool, [
+                ('slotType', slot['slotType'], slot['slotTypeVersion'])
+                for intent in intents.values() for slot in intent.get('slots') or [] if slot.get('slotTypeVersion')
+            ])
+
+        exported = {}
+        for version in versions:
+            bot = dict(bots[('bot', bot_name, version)])
+            used = [intents[('intent', intent['intentName'], intent['intentVersion'])]
+                    for intent in bot.get('intents') or []]
+            types = {}
+            for intent in used:
+                for slot in intent.get('slots') or []:
+                    if slot.get('slotTypeVersion'):
+                        key = ('slotType', slot['slotType'], slot['slotTypeVersion'])
+                        types[key] = slot_types[key]
+            bot['dependencies'] = {
+                'intents': sorted(used, key=lambda intent: intent['name']),
+                'slotTypes': [types[key] for key in sorted(types)],
+            }
+            exported[version] = bot
+        return exported
+
+
+def stub_client(paths, latency, rate_limit):
+    sys.path.insert(0, LAMBDA_DIR)
+    from motherbot.fakes.lexmodels import FakeLexModelsClient
+
+    definitions = []
+    for path in paths:
+        with open(path) as f:
+            definitions.append(json.load(f))
+    return FakeLexModelsClient(definitions, latency=latency, rate_limit=rate_limit)
+
+
+def aws_client(region):
+    import boto3
+    from botocore.config import Config
+
+    # Retries are handled here, with backoff shared across the pool, rather than by botocore per call.
+    return boto3.client('lex-models', region_name=region, config=Config(retries={'max_attempts': 0}))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('bot', help='bot name, e.g. MotherBot')
+    parser.add_argument('versions', nargs='+', help='bot versions or aliases, e.g. 1 2 $LATEST')
+    parser.add_argument('--out', help='file to write, with {bot} and {version} filled in; stdout by default')
+    parser.add_argument('--concurrency', type=int, default=8, help='requests in flight at once')
+    parser.add_argument('--retries', type=int, default=6, help='retries per request when throttled')
+    parser.add_argument('--cache-dir', help='keep numbered versions here and reuse them on later exports')
+    parser.add_argument('--region', default=os.environ.get('AWS_REGION', 'us-east-1'))
+    parser.add_argument('--stub', action='append', metavar='EXPORT', help='serve the API from this export file')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds per stub request')
+    parser.add_argument('--rate-limit', type=int, default=0, help='stub requests per second before throttling')
+    args = parser.parse_args()
+
+    if len(args.versions) > 1 and (not args.out or '{version}' not in args.out):
+        parser.error('exporting several versions needs an --out containing {version}')
+
+    client = stub_client(args.stub, args.latency, args.rate_limit) if args.stub else aws_client(args.region)
+    exporter = Exporter(client, DefinitionCache(args.cache_dir), concurrency=args.concurrency, retries=args.retries)
+    start = time.perf_counter()
+    exported = exporter.export(args.bot, args.versions)
+    elapsed = time.perf_counter() - start
+
+    for version in args.versions:
+        text = dumps(exported[version])
+        if not args.out:
+            sys.stdout.write(text)
+            continue
+        path = args.out.format(bot=args.bot, version=version)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(text)
+
+    sys.stderr.write('{} version(s) of {} in {:.2f}s: {} requests, {} retried, {} from cache\n'.format(
+        len(args.versions), args.bot, elapsed, exporter.requests, exporter.retried, exporter.cached
+    ))
+
+
+if __name__ == '__main__':
+    main()
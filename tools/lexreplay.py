@@ -0,0 +1,307 @@
+"""
+Offline replay harness for the Lex code hooks.
+
+Generates synthetic Lex V1 code hook events (DialogCodeHook and FulfillmentCodeHook) for every intent in a bot
+definition exported with tools/lexexport.py, filling slots from the enumeration values of their slot types, and
+replays them through a handler file in a pool of worker processes.  Each worker stands in for one Lambda container:
+it imports the handler once and then serves its share of the events.  The report gives p50/p95/p99 latency, events
+per second, peak RSS and any invocations that raised or returned something that is not a dialog action.
+
+    python tools/lexreplay.py motherbot --events 5000 --concurrency 4
+    python tools/lexreplay.py booktrip --events 5000 --json
+
+Exits non-zero if any invocation failed, so it can gate a deploy.
+"""
+
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO_ROOT, 'benchmarks'))
+
+from _support import LAMBDA_DIR, load_handler, percentile  # noqa: E402
+
+MOTHERBOT_DEFINITION = os.path.join(REPO_ROOT, 'config', 'bot.json')
+
+# The Lex code hooks, by the keys benchmarks/_support.py knows them by.
+HANDLERS = {
+    'motherbot': 'lex-motherbot-python',
+    'booktrip': 'lex-booktrip-python',
+}
+
+# BookTrip is a Lex console template, so there is no export of it in config/.  This is the subset of the export
+# format the generator reads.
+BOOKTRIP_DEFINITION = {
+    'name': 'BookTrip',
+    'dependencies': {
+        'intents': [
+            {
+                'name': 'BookHotel',
+                'slots': [
+                    {'name': 'Location', 'slotType': 'AMAZON.US_CITY'},
+                    {'name': 'CheckInDate', 'slotType': 'AMAZON.DATE'},
+                    {'name': 'Nights', 'slotType': 'AMAZON.NUMBER'},
+                    {'name': 'RoomType', 'slotType': 'RoomTypeValues', 'slotTypeVersion': '1'},
+                ],
+                'dialogCodeHook': {'messageVersion': '1.0'},
+                'fulfillmentActivity': {'type': 'CodeHook'},
+            },
+            {
+                'name': 'BookCar',
+                'slots': [
+                    {'name': 'PickUpCity', 'slotType': 'AMAZON.US_CITY'},
+                    {'name': 'PickUpDate', 'slotType': 'AMAZON.DATE'},
+                    {'name': 'ReturnDate', 'slotType': 'AMAZON.DATE'},
+                    {'name': 'DriverAge', 'slotType': 'AMAZON.NUMBER'},
+                    {'name': 'CarType', 'slotType': 'CarTypeValues', 'slotTypeVersion': '1'},
+                ],
+                'dialogCodeHook': {'messageVersion': '1.0'},
+                'fulfillmentActivity': {'type': 'CodeHook'},
+            },
+        ],
+        'slotTypes': [
+            {'name': 'RoomTypeValues', 'version': '1',
+             'enumerationValues': [{'value': 'queen'}, {'value': 'king'}, {'value': 'deluxe'}]},
+            {'name': 'CarTypeValues', 'version': '1',
+             'enumerationValues': [{'value': value} for value in
+                                   ('economy', 'standard', 'midsize', 'full size', 'minivan', 'luxury')]},
+        ],
+    },
+}
+
+BUILTIN_VALUES = {
+    'AMAZON.US_CITY': ['chicago', 'boston', 'seattle', 'new york', 'portland', 'springfield'],
+    'AMAZON.US_FIRST_NAME': ['Alex', 'Sam', 'Jordan', 'Riley'],
+    'AMAZON.PhoneNumber': ['2014317268', '+44 20 7946 0958', '555 0100', 'not a number'],
+    'AMAZON.NUMBER': ['123456', '42', '000000'],
+}
+
+
+def load_definition(handler):
+    if handler == 'booktrip':
+        return BOOKTRIP_DEFINITION
+    with open(MOTHERBOT_DEFINITION) as f:
+        return json.load(f)
+
+
+class EventGenerator(object):
+    """
+    Produces Lex V1 code hook events for the intents of a bot definition.
+
+    Dialog events fill a random subset of slots, as Lex does part way through a conversation; fulfillment events fill
+    every slot and are only generated for intents whose fulfillment is a code hook.
+    """
+
+    def __init__(self, definition, seed=0, today=None):
+        self._random = random.Random(seed)
+        self._today = today or datetime.date.today()
+        self._bot_name = definition['name']
+        self._enumerations = {}
+        for slot_type in definition['dependencies'].get('slotTypes', []):
+            values = []
+            for enumeration in slot_type.get('enumerationValues', []):
+                values.append(enumeration['value'])
+                values.extend(enumeration.get('synonyms') or [])
+            self._enumerations[slot_type['name']] = values
+
+        self._templates = []
+        for intent in definition['dependencies']['intents']:
+            slots = [(slot['name'], slot['slotType']) for slot in intent['slots']]
+            if intent.get('dialogCodeHook'):
+                self._templates.append((intent['name'], slots, 'DialogCodeHook'))
+            if (intent.get('fulfillmentActivity') or {}).get('type') == 'CodeHook':
+                self._templates.append((intent['name'], slots, 'FulfillmentCodeHook'))
+
+    def intents(self):
+        return sorted(set((name, source) for name, _, source in self._templates))
+
+    def slot_value(self, slot_type):
+        if slot_type == 'AMAZON.DATE':
+            return (self._today + datetime.timedelta(days=self._random.randint(-2, 45))).isoformat()
+        if slot_type == 'AMAZON.NUMBER':
+            return str(self._random.randint(1, 40))
+        values = self._enumerations.get(slot_type) or BUILTIN_VALUES.get(slot_type)
+        if values:
+            return self._random.choice(values)
+        return 'sample'
+
+    def event(self, user_id=None):
+        intent_name, slots, source = self._random.choice(self._templates)
+        filled = {}
+        for slot_name, slot_type in slots:
+            if source == 'FulfillmentCodeHook' or self._random.random() < 0.6:
+                filled[slot_name] = self.slot_value(slot_type)
+            else:
+                filled[slot_name] = None
+
+        return {
+            'messageVersion': '1.0',
+            'invocationSource': source,
+            'userId': user_id or 'replay-{}'.format(self._random.randint(1, 50)),
+            'sessionAttributes': {},
+            'requestAttributes': None,
+            'bot': {'name': self._bot_name, 'alias': '$LATEST', 'version': '$LATEST'},
+            'outputDialogMode': 'Text',
+            'currentIntent': {
+                'name': intent_name,
+                'slots': filled,
+                'slotDetails': {},
+                'confirmationStatus': 'Confirmed' if source == 'FulfillmentCodeHook' else 'None'
+            },
+            'inputTranscript': ''
+        }
+
+    def events(self, count):
+        return [self.event() for _ in range(count)]
+
+
+def peak_rss_kb():
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def is_dialog_response(response):
+    return isinstance(response, dict) and isinstance(response.get('dialogAction'), dict) \
+        and 'type' in response['dialogAction']
+
+
+def _replay_worker(job):
+    """
+    Serve a share of the events from one process, as a single warm Lambda container would.
+    """
+    lambda_dir, stem, events = job
+    # The handlers write JSON log and EMF metric lines to stdout, which carries the report; send them to stderr.
+    sys.stdout = sys.stderr
+    import_start = time.perf_counter()
+    module = load_handler(stem, lambda_dir)
+    import_seconds = time.perf_counter() - import_start
+
+    latencies = []
+    failures = []
+    start = time.time()
+    for event in events:
+        key = (event['currentIntent']['name'], event['invocationSource'])
+        invoke_start = time.perf_counter()
+        try:
+            response = module.lambda_handler(event, None)
+        except Exception as e:
+            latencies.append((key, time.perf_counter() - invoke_start))
+            failures.append((key, '{}: {}'.format(type(e).__name__, e)))
+            continue
+        latencies.append((key, time.perf_counter() - invoke_start))
+        if not is_dialog_response(response):
+            failures.append((key, 'not a dialog action: {!r}'.format(response)[:200]))
+    end = time.time()
+
+    return {
+        'latencies': latencies,
+        'failures': failures,
+        'start': start,
+        'end': end,
+        'importSeconds': import_seconds,
+        'peakRssKb': peak_rss_kb(),
+    }
+
+
+def summarise(latencies):
+    milliseconds = [latency * 1000.0 for latency in latencies]
+    return {
+        'count': len(milliseconds),
+        'p50Ms': percentile(milliseconds, 50),
+        'p95Ms': percentile(milliseconds, 95),
+        'p99Ms': percentile(milliseconds, 99),
+        'maxMs': max(milliseconds) if milliseconds else float('nan'),
+    }
+
+
+def replay(handler, events, concurrency=1, lambda_dir=LAMBDA_DIR):
+    """
+    Replay events through a handler (a key of HANDLERS or a file stem) using concurrency worker processes.
+    """
+    stem = HANDLERS.get(handler, handler)
+    shares = [events[index::concurrency] for index in range(concurrency)]
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(concurrency) as pool:
+        results = pool.map(_replay_worker, [(lambda_dir, stem, share) for share in shares if share])
+
+    by_intent = {}
+    failures = {}
+    for result in results:
+        for key, latency in result['latencies']:
+            by_intent.setdefault(key, []).append(latency)
+        for key, message in result['failures']:
+            failures.setdefault(key, []).append(message)
+
+    wall_seconds = max(result['end'] for result in results) - min(result['start'] for result in results)
+    report = summarise([latency for latencies in by_intent.values() for latency in latencies])
+    report.update({
+        'handler': stem,
+        'concurrency': concurrency,
+        'eventsPerSecond': len(events) / wall_seconds if wall_seconds else float('inf'),
+        'importMs': max(result['importSeconds'] for result in results) * 1000.0,
+        'peakRssKb': max(result['peakRssKb'] or 0 for result in results) or None,
+        'failures': sum(len(messages) for messages in failures.values()),
+        'intents': [
+            dict(summarise(latencies), intent=intent_name, source=source,
+                 failures=len(failures.get((intent_name, source), [])),
+                 firstFailure=(failures.get((intent_name, source)) or [None])[0])
+            for (intent_name, source), latencies in sorted(by_intent.items())
+        ],
+    })
+    return report
+
+
+def print_report(report):
+    print('{handler}: {count} events, concurrency {concurrency}, {eventsPerSecond:.0f} events/s, '
+          'import {importMs:.1f} ms, peak RSS {peakRssKb} KB'.format(**report))
+    print('latency ms  p50 {p50Ms:.3f}  p95 {p95Ms:.3f}  p99 {p99Ms:.3f}  max {maxMs:.3f}'.format(**report))
+    print()
+    line = '{:<14} {:<20} {:>7} {:>9} {:>9} {:>9} {:>9}'
+    print(line.format('intent', 'source', 'events', 'p50 ms', 'p95 ms', 'p99 ms', 'failures'))
+    for row in report['intents']:
+        print(line.format(row['intent'], row['source'], row['count'], '{:.3f}'.format(row['p50Ms']),
+                          '{:.3f}'.format(row['p95Ms']), '{:.3f}'.format(row['p99Ms']), row['failures']))
+    for row in report['intents']:
+        if row['firstFailure']:
+            print('  {} {}: {}'.format(row['intent'], row['source'], row['firstFailure']))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('handler', choices=sorted(HANDLERS), help='code hook to replay events through')
+    parser.add_argument('--events', type=int, default=2000, help='number of events to generate')
+    parser.add_argument('--concurrency', type=int, default=1, help='worker processes, one per simulated container')
+    parser.add_argument('--seed', type=int, default=0, help='seed for event generation')
+    parser.add_argument('--definition', help='bot definition JSON (defaults to config/bot.json for motherbot)')
+    parser.add_argument('--lambda-dir', default=LAMBDA_DIR, help='directory holding the handler files')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    if args.definition:
+        with open(args.definition) as f:
+            definition = json.load(f)
+    else:
+        definition = load_definition(args.handler)
+
+    events = EventGenerator(definition, seed=args.seed).events(args.events)
+    report = replay(args.handler, events, args.concurrency, args.lambda_dir)
+
+    if args.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+        print_report(report)
+    return 1 if report['failures'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())